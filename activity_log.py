@@ -0,0 +1,127 @@
+"""Foydalanuvchi faoliyatini fon rejimida (write-behind) yozish.
+
+Handlerlar hodisani xotiradagi navbatga qo'yadi, alohida thread esa ularni
+partiyalab (hajm yoki vaqt bo'yicha) bitta tranzaksiyada executemany bilan
+SQLite'ga yozadi. log() event loop'da chaqiriladi, shuning uchun hech qachon
+kutmaydi: navbat to'la bo'lsa hodisa tashlanadi va `dropped` da sanaladi.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+import db
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = int(os.getenv('ACTIVITY_BATCH_SIZE', 200))
+FLUSH_INTERVAL = float(os.getenv('ACTIVITY_FLUSH_INTERVAL', 1.0))
+MAX_PENDING = int(os.getenv('ACTIVITY_MAX_PENDING', 10000))
+# Tashlangan hodisalar haqida har shuncha hodisada bir marta ogohlantirish
+DROP_LOG_EVERY = 1000
+
+_STOP = object()
+
+
+class ActivitySink:
+    """Chegaralangan navbat + partiyalab yozuvchi thread"""
+
+    def __init__(self, batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL,
+                 max_pending: int = MAX_PENDING):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='activity-sink', daemon=True)
+                self._thread.start()
+
+    def log(self, user_id: int, username: str, first_name: str, activity: str, subject: str = None,
+            timestamp: str = None):
+        """Hodisani navbatga qo'yish (bloklamaydi)"""
+        if self._thread is None:
+            self.start()
+        row = (user_id, username, first_name, activity, subject, timestamp or datetime.now().isoformat())
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % DROP_LOG_EVERY == 1:
+                logger.warning(f"Activity navbati to'la, hodisalar tashlanmoqda (jami {self.dropped})")
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+        # To'xtashda qolgan hamma hodisalarni yozib chiqish
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            db.log_activities(batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            logger.error(f"Activity partiyasini yozishda xatolik ({len(batch)} ta): {e}")
+
+    def shutdown(self, timeout: float = 10.0):
+        """Navbatni bo'shatib, thread'ni to'xtatish"""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+
+sink = ActivitySink()
+atexit.register(sink.shutdown)
+
+
+def log(user_id: int, username: str, first_name: str, activity: str, subject: str = None, timestamp: str = None):
+    """Standart sink orqali faoliyatni loglash"""
+    sink.log(user_id, username, first_name, activity, subject, timestamp)
+
+
+def shutdown():
+    sink.shutdown()
@@ -0,0 +1,309 @@
+"""Foydalanuvchi xatolari tarixiga qarab savol tanlash (spaced repetition ruhida).
+
+Har bir (foydalanuvchi, fan) uchun xotirada ixcham indeks: savollar bo'yicha
+ko'rilganlar/xatolar soni (array('H')) va og'irliklar ustida Fenwick daraxti.
+  - ko'rilmagan savol: og'irlik UNSEEN_WEIGHT;
+  - ko'rilgan: SEEN_WEIGHT + ERROR_WEIGHT * (xato + 0.5) / (ko'rilgan + 1) -
+    ko'p adashilgan savollar tez-tez, yaxshi bilinganlari kamroq chiqadi;
+  - oxirgi COOLDOWN soniyada javob berilganlar RECENT_FACTOR ga kamaytiriladi.
+
+Javob yozilganda faqat bitta og'irlik o'zgaradi - O(log n). Test boshlashda k ta
+savol qaytarmasdan tanlanadi - O(k log n). Indeks (user, fan) uchun bir marta
+user_question_stats jadvalidan quriladi va LRU keshda turadi; natijalar jadvalga
+fonda (write-behind) yoziladi. Bitta foydalanuvchi doim bitta workerda bo'lgani
+uchun (cluster.py) indeks jarayon xotirasida izchil qoladi.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import db
+import storage
+
+logger = logging.getLogger(__name__)
+
+ADAPTIVE_SELECTION = os.getenv('ADAPTIVE_SELECTION', '1') != '0'
+UNSEEN_WEIGHT = 1.0
+SEEN_WEIGHT = 0.25
+ERROR_WEIGHT = 2.0
+RECENT_FACTOR = 0.1
+# Javob berilgan savol shuncha vaqt "yaqinda ko'rilgan" hisoblanadi (soniya)
+COOLDOWN = float(os.getenv('ADAPTIVE_COOLDOWN', 3600))
+# Xotirada saqlanadigan (user, fan) indekslari soni
+MAX_INDEXES = int(os.getenv('ADAPTIVE_MAX_INDEXES', 4096))
+FLUSH_INTERVAL = float(os.getenv('ADAPTIVE_FLUSH_INTERVAL', 2.0))
+COUNTER_MAX = 0xFFFF
+
+
+def weight(seen: int, wrong: int, recent: bool) -> float:
+    if seen == 0:
+        w = UNSEEN_WEIGHT
+    else:
+        w = SEEN_WEIGHT + ERROR_WEIGHT * (wrong + 0.5) / (seen + 1)
+    return w * RECENT_FACTOR if recent else w
+
+
+class FenwickTree:
+    """Og'irliklar prefiks yig'indisi: yangilash va qidirish O(log n)"""
+    __slots__ = ('n', 'tree', 'top')
+
+    def __init__(self, weights):
+        n = len(weights)
+        self.n = n
+        tree = array('d', [0.0]) + array('d', weights)
+        # Chiziqli qurish: har bir tugun o'z qiymatini ota tuguniga qo'shadi
+        for i in range(1, n + 1):
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+        self.tree = tree
+        self.top = 1 << (n.bit_length() - 1) if n else 0
+
+    def add(self, index: int, delta: float):
+        i = index + 1
+        tree = self.tree
+        n = self.n
+        while i <= n:
+            tree[i] += delta
+            i += i & -i
+
+    def total(self) -> float:
+        s = 0.0
+        i = self.n
+        tree = self.tree
+        while i > 0:
+            s += tree[i]
+            i -= i & -i
+        return s
+
+    def find(self, x: float) -> int:
+        """Prefiks yig'indisi x dan katta bo'lgan eng kichik indeks"""
+        pos = 0
+        step = self.top
+        tree = self.tree
+        while step:
+            nxt = pos + step
+            if nxt <= self.n and tree[nxt] <= x:
+                pos = nxt
+                x -= tree[nxt]
+            step >>= 1
+        return min(pos, self.n - 1)
+
+
+class UserIndex:
+    """Bitta foydalanuvchining bitta fan bo'yicha statistikasi va og'irliklari"""
+    __slots__ = ('version', 'seen', 'wrong', 'recent', 'weights', 'tree')
+
+    def __init__(self, version: int, size: int, rows, now: float, index_of: Callable[[int], Optional[int]]):
+        self.version = version
+        self.seen = array('H', bytes(2 * size))
+        self.wrong = array('H', bytes(2 * size))
+        # bank indeksi -> oxirgi javob vaqti (faqat COOLDOWN ichidagilar, vaqt tartibida)
+        self.recent: Dict[int, float] = {}
+        for qid, seen, wrong, last_seen in sorted(rows, key=lambda r: r[3] or 0):
+            index = index_of(qid)
+            if index is None:
+                continue  # bankdan o'chirilgan savol
+            self.seen[index] = min(seen, COUNTER_MAX)
+            self.wrong[index] = min(wrong, COUNTER_MAX)
+            if last_seen and now - last_seen < COOLDOWN:
+                self.recent[index] = last_seen
+        self.weights = array('d', (self._weight(i) for i in range(size)))
+        self.tree = FenwickTree(self.weights)
+
+    def _weight(self, index: int) -> float:
+        return weight(self.seen[index], self.wrong[index], index in self.recent)
+
+    def _update(self, index: int):
+        new = self._weight(index)
+        self.tree.add(index, new - self.weights[index])
+        self.weights[index] = new
+
+    def record(self, index: int, is_correct: bool, now: float):
+        if self.seen[index] < COUNTER_MAX:
+            self.seen[index] += 1
+            if not is_correct:
+                self.wrong[index] += 1
+        self.recent.pop(index, None)
+        self.recent[index] = now
+        self._update(index)
+
+    def expire(self, now: float):
+        """COOLDOWN o'tgan savollarning to'liq og'irligini qaytarish"""
+        recent = self.recent
+        while recent:
+            index = next(iter(recent))
+            if now - recent[index] < COOLDOWN:
+                break
+            del recent[index]
+            self._update(index)
+
+    def sample(self, k: int, rng: random.Random) -> List[int]:
+        """k ta turli indeks, og'irlikka proporsional, qaytarmasdan - O(k log n).
+
+        Avval oddiy rad etish: takror chiqqan indeks qayta tortiladi (daraxt
+        o'zgarmaydi). Birinchi takrordan keyin tanlanganlar og'irligi daraxtdan
+        olib turiladi - tanlanganlar og'irlikning katta qismi bo'lsa ham tsikl
+        cho'zilmaydi; oxirida og'irliklar qaytariladi.
+        """
+        tree = self.tree
+        k = min(k, tree.n)
+        weights = self.weights
+        picked: List[int] = []
+        chosen = set()
+        total = tree.total()
+        removed = False
+        while len(picked) < k and total > 0:
+            index = tree.find(rng.random() * total)
+            if index in chosen:
+                if not removed:
+                    removed = True
+                    for i in picked:
+                        tree.add(i, -weights[i])
+                        total -= weights[i]
+                    continue
+                # Suzuvchi nuqta xatoligi: nol og'irlikli joy - keyingi bo'sh indeks
+                index = next(i for i in range(tree.n) if i not in chosen)
+            if removed:
+                tree.add(index, -weights[index])
+                total -= weights[index]
+            chosen.add(index)
+            picked.append(index)
+        if removed:
+            for index in picked:
+                tree.add(index, weights[index])
+        if len(picked) < k:
+            # Og'irliklar tugab qolsa (nazariy holat) - qolganini tekis tanlash
+            rest = [i for i in range(tree.n) if i not in chosen]
+            picked.extend(rng.sample(rest, k - len(picked)))
+        return picked
+
+
+class AdaptiveSelector:
+    """(user_id, fan) indekslari keshi va natijalarni write-behind yozish"""
+
+    def __init__(self, max_indexes: int = MAX_INDEXES, flush_interval: float = FLUSH_INTERVAL,
+                 rng: Optional[random.Random] = None):
+        self.max_indexes = max_indexes
+        self.flush_interval = flush_interval
+        self.rng = rng or random.Random()
+        self._indexes: 'OrderedDict[Tuple[int, str], UserIndex]' = OrderedDict()
+        # (user_id, subject, qid, xato, vaqt) - hali DB'ga yozilmagan natijalar
+        self._pending: List[tuple] = []
+        self._inflight: List[tuple] = []
+        self._flush_task = None
+        # Indeks o'qilayotganda natijalar ikki marta hisoblanmasligi uchun: preload
+        # o'qish+qurishni yozish bilan bir vaqtda qilmaydi (_flush_lock); sinxron o'qish
+        # esa _write_lock ostida oxirgi yozilgan partiya raqamini (_written) ham oladi
+        self._flush_lock = asyncio.Lock()
+        self._write_lock = threading.Lock()
+        self._seq = 0
+        self._inflight_seq = 0
+        self._written = 0
+
+    def _build(self, user_id: int, bank, rows, written: int) -> UserIndex:
+        index = UserIndex(bank.version, len(bank), rows, time.time(), bank.index_of)
+        # DB'ga hali yozilmagan natijalar ham hisobga olinadi; yozilayotgan partiya
+        # o'qishdan oldin commit bo'lgan bo'lsa, u rows ichida allaqachon bor
+        unwritten = self._pending if self._inflight_seq <= written else self._inflight + self._pending
+        for uid, subject, qid, wrong, at in unwritten:
+            position = bank.index_of(qid) if uid == user_id and subject == bank.subject else None
+            if position is not None:
+                index.record(position, not wrong, at)
+        key = (user_id, bank.subject)
+        self._indexes[key] = index
+        self._indexes.move_to_end(key)
+        while len(self._indexes) > self.max_indexes:
+            self._indexes.popitem(last=False)
+        return index
+
+    def _cached(self, user_id: int, bank) -> Optional[UserIndex]:
+        key = (user_id, bank.subject)
+        index = self._indexes.get(key)
+        if index is None or index.version != bank.version:
+            return None
+        self._indexes.move_to_end(key)
+        return index
+
+    def _read(self, user_id: int, subject: str):
+        """Statistika va o'qish paytida oxirgi commit bo'lgan partiya raqami"""
+        with self._write_lock:
+            return db.get_user_question_stats(user_id, subject), self._written
+
+    async def preload(self, user_id: int, bank):
+        """Indeksni event loop'dan tashqarida o'qib qurish (test boshlashdan oldin)"""
+        if self._cached(user_id, bank) is None:
+            # Yozish tugashini kutamiz: o'qish va qurish paytida partiya yozilmaydi
+            async with self._flush_lock:
+                if self._cached(user_id, bank) is None:
+                    rows, written = await storage.run(self._read, user_id, bank.subject)
+                    self._build(user_id, bank, rows, written)
+
+    def index_for(self, user_id: int, bank) -> UserIndex:
+        index = self._cached(user_id, bank)
+        if index is None:
+            index = self._build(user_id, bank, *self._read(user_id, bank.subject))
+        return index
+
+    def sample_indices(self, user_id: int, bank, k: int) -> List[int]:
+        index = self.index_for(user_id, bank)
+        index.expire(time.time())
+        return index.sample(k, self.rng)
+
+    def record(self, user_id: int, bank, bank_index: int, is_correct: bool):
+        """Javob natijasi: og'irlikni yangilash va DB'ga yozish navbatiga qo'yish"""
+        now = time.time()
+        qid = bank.questions[bank_index]['id']
+        index = self._cached(user_id, bank)
+        if index is not None:
+            index.record(bank_index, is_correct, now)
+        self._pending.append((user_id, bank.subject, qid, 0 if is_correct else 1, now))
+
+    def stats(self) -> Dict[str, int]:
+        return {'indexes': len(self._indexes), 'pending': len(self._pending)}
+
+    # --- write-behind ---
+    def _write(self, seq: int, rows: List[tuple]):
+        with self._write_lock:
+            db.record_question_results(rows)
+            self._written = seq
+
+    async def flush(self):
+        async with self._flush_lock:
+            rows, self._pending = self._pending, []
+            if not rows:
+                return
+            self._seq += 1
+            self._inflight, self._inflight_seq = rows, self._seq
+            try:
+                await storage.run(self._write, self._seq, rows)
+            except Exception as e:
+                logger.error(f"Savol statistikasini saqlashda xatolik: {e}")
+                self._pending = rows + self._pending
+            finally:
+                self._inflight = []
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def shutdown(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
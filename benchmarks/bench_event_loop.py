@@ -0,0 +1,97 @@
+"""Event loop kechikishi (lag) benchmarki: sinxron db va async storage.
+
+Bir vaqtda N ta "handler" statistika va foydalanuvchilar ro'yxatini so'raydi,
+parallel ishlayotgan ticker esa event loop qancha kechikayotganini o'lchaydi.
+
+    python benchmarks/bench_event_loop.py --rows 200000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import storage  # noqa: E402
+
+TICK = 0.005
+
+
+def setup_db(path: str, rows: int, users: int):
+    db.close_connections()
+    db.DB_PATH = path
+    db.init_db()
+    activities = ('bot_started', 'test_started', 'test_completed')
+    chunk = []
+    for i in range(rows):
+        uid = i % users
+        chunk.append((uid, f'user{uid}', f'User {uid}', activities[i % 3], 'airlaw', '2025-01-01T00:00:00'))
+        if len(chunk) == 10000:
+            db.log_activities(chunk)
+            chunk = []
+    if chunk:
+        db.log_activities(chunk)
+
+
+async def lag_monitor(samples: list, stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        samples.append(time.perf_counter() - start - TICK)
+
+
+async def sync_handler():
+    # Eski yo'l: handler ichida to'g'ridan-to'g'ri sqlite3
+    db.get_stats_summary()
+    db.get_all_users()
+
+
+async def async_handler():
+    await storage.get_stats_summary()
+    await storage.get_all_users()
+
+
+async def scenario(handler, concurrency: int):
+    samples = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(lag_monitor(samples, stop))
+    await asyncio.sleep(TICK * 2)
+    start = time.perf_counter()
+    await asyncio.gather(*(handler() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+    return elapsed, samples
+
+
+def report(name: str, elapsed: float, samples: list):
+    samples = sorted(samples) or [0.0]
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{name:<8} wall={elapsed * 1000:8.1f}ms  ticks={len(samples):5d}  "
+          f"lag p50={statistics.median(samples) * 1000:7.2f}ms  p99={p99 * 1000:7.2f}ms  "
+          f"max={samples[-1] * 1000:7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"DB tayyorlanmoqda: {args.rows} ta activity, {args.users} ta user...")
+        setup_db(os.path.join(tmp, 'bench.db'), args.rows, args.users)
+        for name, handler in (('before', sync_handler), ('after', async_handler)):
+            elapsed, samples = asyncio.run(scenario(handler, args.concurrency))
+            report(name, elapsed, samples)
+        storage.shutdown()
+        db.close_connections()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Sessiya xotira benchmarki: eski dict sessiyalar va ixcham UserSession.
+
+Har bir rejim uchun N ta parallel sessiya yaratiladi va tracemalloc orqali
+bitta sessiyaga to'g'ri keladigan baytlar hisoblanadi.
+
+    python benchmarks/bench_session_memory.py --sessions 10000 --bank-size 250
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from question_bank import QuestionBank, _freeze  # noqa: E402
+from sessions import UserSession  # noqa: E402
+
+QUESTION_TEXT = "Какие документы должны находиться на борту воздушного судна при выполнении полёта? " * 2
+OPTION_TEXT = "Свидетельство о регистрации, сертификат лётной годности, бортовой журнал"
+
+
+def make_rows(n: int):
+    return [{
+        'id': i + 1,
+        'question': f"{i + 1}. {QUESTION_TEXT}",
+        'options': [f"{OPTION_TEXT} ({j})" for j in range(4)],
+        'correct_answer': 'ABCD'[i % 4]
+    } for i in range(n)]
+
+
+def legacy_session(rows, test_mode: str):
+    # Eski start_new_quiz: db.get_all_questions / get_random_questions har safar yangi dict'lar qaytarardi
+    source = rows if test_mode == 'sequential' else rows[:30]
+    questions = [{'id': r['id'], 'question': r['question'], 'options': list(r['options']),
+                  'correct_answer': r['correct_answer']} for r in source]
+    session = {
+        'language': 'ru',
+        'state': 'quiz',
+        'subject': 'operations',
+        'test_mode': test_mode,
+        'questions': questions,
+        'current_question': 0,
+        'correct_answers': 0,
+        'answers': [None] * len(questions)
+    }
+    # Yarim savollarga javob berilgan holat
+    for i in range(len(questions) // 2):
+        session['answers'][i] = {'user_answer': 1, 'is_correct': i % 2 == 0}
+    return session
+
+
+def compact_session(bank, test_mode: str):
+    session = UserSession('ru')
+    order = range(len(bank)) if test_mode == 'sequential' else array('I', bank.sample_indices(30))
+    session.start_quiz(bank, test_mode, order)
+    for i in range(session.total // 2):
+        session.record_answer(i, 1, i % 2 == 0)
+    return session
+
+
+def measure(factory, count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = {uid: factory() for uid in range(count)}
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del sessions
+    return (after - before) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=10000)
+    parser.add_argument('--bank-size', type=int, default=250)
+    args = parser.parse_args()
+
+    rows = make_rows(args.bank_size)
+    bank = QuestionBank('operations', 0, tuple(_freeze(r) for r in rows))
+
+    print(f"{args.sessions} ta sessiya, bank hajmi {args.bank_size} ta savol")
+    for test_mode in ('random', 'sequential'):
+        legacy = measure(lambda: legacy_session(rows, test_mode), args.sessions)
+        compact = measure(lambda: compact_session(bank, test_mode), args.sessions)
+        print(f"{test_mode:<11} legacy={legacy:10.0f} B/session  compact={compact:8.0f} B/session  "
+              f"({legacy / compact:5.1f}x)  jami compact={compact * args.sessions / 1024 / 1024:6.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Ishga tushish vaqti benchmarki: STARTUP_MODE=eager va lazy.
+
+Har bir o'lchov alohida jarayonda (toza interpretator, redeploy'dagidek):
+  - ready: jarayon boshlanganidan `build_application()` tugaguncha - shundan
+    keyin bot update qabul qila oladi;
+  - import: shundan `import bot_new` (modul darajasidagi tayyorgarlik);
+  - first_quiz: oldindan yuklanmagan fanda birinchi testni boshlash;
+  - prewarm: lazy rejimdagi fon tayyorgarligi (ommabop fanlar + eski statistika).
+
+Ikki holat: cold - bo'sh papka (DB yo'q, birinchi deploy), warm - oldingi
+ishga tushishdan qolgan DB (odatiy redeploy).
+
+    python benchmarks/bench_startup.py --repeats 5
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_SUBJECT = 'operations'
+POPULAR_SUBJECTS = ('airlaw', 'meteorology', 'navigation')
+
+CHILD = r'''
+import asyncio, json, sys, time
+started = time.time()
+sys.path.insert(0, {root!r})
+import bot_new
+imported = time.time()
+application = bot_new.build_application(mode='polling')
+ready = time.time()
+
+async def scenario():
+    t = time.perf_counter()
+    await bot_new.load_subject({subject!r})
+    assert bot_new.quiz_bot.start_new_quiz(1, {subject!r}, 'random')
+    first_quiz = time.perf_counter() - t
+    t = time.perf_counter()
+    if bot_new.STARTUP_MODE != 'eager':
+        await bot_new.prewarm()
+    return first_quiz, time.perf_counter() - t
+
+first_quiz, prewarm = asyncio.run(scenario())
+bot_new.activity_log.shutdown()
+bot_new.storage.shutdown()
+bot_new.db.close_connections()
+print(json.dumps({{'started': started, 'imported': imported, 'ready': ready,
+                   'first_quiz': first_quiz, 'prewarm': prewarm}}))
+'''
+
+SEED = r'''
+import sys
+sys.path.insert(0, {root!r})
+import db
+db.init_db()
+db.log_activities([(i, 'u', 'U', 'test_started', s, '{day}T12:00:00')
+                   for i, s in enumerate({subjects!r} * 50)])
+db.close_connections()
+'''
+
+
+def run_child(workdir: str, mode: str) -> dict:
+    env = dict(os.environ, BOT_TOKEN='123456:BENCH', STARTUP_MODE=mode, BOT_MODE='polling')
+    spawned = time.time()
+    out = subprocess.run([sys.executable, '-c', CHILD.format(root=ROOT, subject=FIRST_SUBJECT)],
+                         cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    data = json.loads(out.stdout.strip().splitlines()[-1])
+    return {
+        'ready': data['ready'] - spawned,
+        'import': data['imported'] - data['started'],
+        'first_quiz': data['first_quiz'],
+        'prewarm': data['prewarm']
+    }
+
+
+def warm_db(path: str):
+    """Oldingi deploy'dan qolgan DB: banklar sinxronlangan, ommabop fanlar bor"""
+    os.makedirs(path)
+    run_child(path, 'eager')
+    subprocess.run([sys.executable, '-c', SEED.format(root=ROOT, subjects=POPULAR_SUBJECTS,
+                                                      day=time.strftime('%Y-%m-%d'))],
+                   cwd=path, check=True, capture_output=True)
+
+
+def measure(state: str, mode: str, repeats: int, template: str) -> dict:
+    samples = []
+    for _ in range(repeats):
+        workdir = tempfile.mkdtemp(prefix='startup-')
+        try:
+            if state == 'warm':
+                shutil.rmtree(workdir)
+                shutil.copytree(template, workdir)
+            samples.append(run_child(workdir, mode))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {key: statistics.median(s[key] for s in samples) * 1000 for key in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--json', help="natijani JSON faylga yozish")
+    args = parser.parse_args()
+
+    template_root = tempfile.mkdtemp(prefix='startup-template-')
+    template = os.path.join(template_root, 'warm')
+    try:
+        warm_db(template)
+        results = {}
+        print(f"{'holat':<6} {'rejim':<6} {'ready':>9} {'import':>9} {'first_quiz':>11} {'prewarm':>9}  (ms, median)")
+        for state in ('cold', 'warm'):
+            for mode in ('eager', 'lazy'):
+                r = measure(state, mode, args.repeats, template)
+                results[f'{state}/{mode}'] = {k: round(v, 1) for k, v in r.items()}
+                print(f"{state:<6} {mode:<6} {r['ready']:9.1f} {r['import']:9.1f} {r['first_quiz']:11.1f} "
+                      f"{r['prewarm']:9.1f}", flush=True)
+    finally:
+        shutil.rmtree(template_root, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
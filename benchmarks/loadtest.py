@@ -0,0 +1,462 @@
+"""Yuklama testi: soxta Telegram Bot API va simulyatsiya qilingan foydalanuvchilar.
+
+Bot (haqiqiy bot_new handlerlari, polling yoki webhook rejimida) shu jarayonda
+ishlaydi, soxta Bot API va foydalanuvchilar esa alohida jarayonda - ularning
+ishi bot event loop'iga ta'sir qilmasligi uchun. Webhook rejimida soxta API
+update'larni Telegram kabi botning webhook endpointiga POST qiladi (2xx
+bo'lmasa qayta yuboradi). Har bir foydalanuvchi to'liq
+yo'lni bosib o'tadi: /start -> til -> fan -> test turi -> 30 ta javob ->
+natija. Tugmalar botning o'z klaviaturalaridan tanlanadi.
+
+Har bir concurrency darajasi uchun hisobot:
+  - e2e: update foydalanuvchiga berilgandan botning birinchi javobigacha
+    (sendMessage/editMessageText) vaqt, p50/p95/p99;
+  - handler: callback marshrutlarining ichki vaqti (router hook);
+  - update/s va event loop kechikishi (lag).
+
+Webhook rejimida oxirida endpoint tekshiruvlari ham o'tkaziladi: secret
+sarlavhasi (403), noto'g'ri body (400), draining paytida 503; biror
+tekshiruv o'tmasa exit 1.
+
+    python benchmarks/loadtest.py --users 10 50 200 --think 0.2
+    python benchmarks/loadtest.py --mode webhook --users 10 50
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import router  # noqa: E402
+
+TOKEN = '123456:LOADTEST'
+WEBHOOK_SECRET = 'loadtest-secret'
+LAG_TICK = 0.005
+REPLY_TIMEOUT = 60.0
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+# --- Soxta Bot API va foydalanuvchilar (alohida jarayon) ---
+
+class FakeBotAPI:
+    def __init__(self, seed: int, webhook_url: Optional[str] = None, secret: Optional[str] = None):
+        self.rng = random.Random(seed)
+        # Berilsa update'lar getUpdates o'rniga shu manzilga POST qilinadi
+        self.webhook_url = webhook_url
+        self.secret = secret
+        self._session = None
+        self._deliveries = set()
+        self.redelivered = 0
+        self.updates: List[dict] = []
+        self.update_id = 0
+        self.new_updates = asyncio.Event()
+        self.users: Dict[int, 'SimUser'] = {}
+        self.callbacks: Dict[str, int] = {}
+        self.latencies: List[float] = []
+        self.delivered = 0
+
+    def push(self, update: dict):
+        self.update_id += 1
+        update['update_id'] = self.update_id
+        if self.webhook_url:
+            task = asyncio.get_running_loop().create_task(self.post_webhook(update))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+            return
+        self.updates.append(update)
+        self.new_updates.set()
+
+    async def post_webhook(self, update: dict):
+        """Telegram kabi: 2xx bo'lmaguncha qayta yuborish (4xx - tashlanadi)"""
+        import aiohttp
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        self._mark_delivered(update, time.perf_counter())
+        headers = {'X-Telegram-Bot-Api-Secret-Token': self.secret or ''}
+        delay = 0.05
+        while True:
+            try:
+                async with self._session.post(self.webhook_url, json=update, headers=headers) as response:
+                    if response.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            self.redelivered += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    def _mark_delivered(self, update: dict, now: float):
+        self.delivered += 1
+        user = self.users.get(_chat_of(update))
+        if user is not None:
+            user.delivered_at = now
+
+    async def get_updates(self, params: dict) -> list:
+        offset = int(params.get('offset') or 0)
+        timeout = float(params.get('timeout') or 0)
+        self.updates = [u for u in self.updates if u['update_id'] >= offset]
+        if not self.updates and timeout:
+            self.new_updates.clear()
+            try:
+                await asyncio.wait_for(self.new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        now = time.perf_counter()
+        for update in self.updates:
+            if '_delivered' not in update:
+                update['_delivered'] = now
+                self._mark_delivered(update, now)
+        return [{k: v for k, v in u.items() if k != '_delivered'} for u in self.updates]
+
+    def reply(self, chat_id: int, params: dict):
+        user = self.users.get(chat_id)
+        if user is None:
+            return
+        if user.delivered_at is not None:
+            self.latencies.append(time.perf_counter() - user.delivered_at)
+            user.delivered_at = None
+        markup = params.get('reply_markup')
+        if isinstance(markup, str):
+            markup = json.loads(markup)
+        user.inbox.put_nowait((params.get('text', ''), markup))
+
+    async def handle(self, request):
+        from aiohttp import web
+        method = request.match_info['method']
+        if request.content_type == 'application/json':
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        if method == 'getUpdates':
+            return web.json_response({'ok': True, 'result': await self.get_updates(params)})
+        if method == 'getMe':
+            return web.json_response({'ok': True, 'result': {
+                'id': 1, 'is_bot': True, 'first_name': 'Load', 'username': 'load_bot',
+                'can_join_groups': False, 'can_read_all_group_messages': False, 'supports_inline_queries': False}})
+        if method in ('sendMessage', 'editMessageText'):
+            chat_id = int(params.get('chat_id', 0))
+            self.reply(chat_id, params)
+            return web.json_response({'ok': True, 'result': {
+                'message_id': 1, 'date': int(time.time()), 'text': params.get('text', ''),
+                'chat': {'id': chat_id, 'type': 'private'}}})
+        return web.json_response({'ok': True, 'result': True})
+
+    async def run_level(self, request):
+        """Bitta concurrency darajasini boshidan oxirigacha o'tkazish"""
+        from aiohttp import web
+        params = await request.json()
+        self.latencies = []
+        self.delivered = 0
+        self.redelivered = 0
+        users = [SimUser(self, params['first_user'] + i, self.rng.random(), params['think'])
+                 for i in range(params['users'])]
+        for user in users:
+            self.users[user.user_id] = user
+        started = time.perf_counter()
+        results = await asyncio.gather(*(user.run() for user in users))
+        duration = time.perf_counter() - started
+        for user in users:
+            self.users.pop(user.user_id, None)
+        return web.json_response({
+            'users': len(users),
+            'completed': sum(results),
+            'updates': self.delivered,
+            'duration': duration,
+            'redelivered': self.redelivered,
+            'latencies': self.latencies
+        })
+
+
+def _chat_of(update: dict) -> Optional[int]:
+    if 'message' in update:
+        return update['message']['chat']['id']
+    if 'callback_query' in update:
+        return update['callback_query']['from']['id']
+    return None
+
+
+class SimUser:
+    """Bitta foydalanuvchi: bot javobidagi tugmalardan keyingisini tanlaydi"""
+
+    def __init__(self, api: FakeBotAPI, user_id: int, seed: float, think: float):
+        self.api = api
+        self.user_id = user_id
+        self.rng = random.Random(seed)
+        self.think = think
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.delivered_at: Optional[float] = None
+        self.answers = 0
+        self._message_id = 0
+
+    def _user(self) -> dict:
+        return {'id': self.user_id, 'is_bot': False, 'first_name': f'User{self.user_id}'}
+
+    def send_command(self, text: str):
+        self._message_id += 1
+        self.api.push({'message': {
+            'message_id': self._message_id, 'date': int(time.time()), 'text': text,
+            'chat': {'id': self.user_id, 'type': 'private'}, 'from': self._user(),
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]}})
+
+    def press(self, data: str):
+        self.api.push({'callback_query': {
+            'id': f'{self.user_id}-{time.perf_counter_ns()}', 'chat_instance': str(self.user_id),
+            'data': data, 'from': self._user(),
+            'message': {'message_id': 1, 'date': int(time.time()), 'text': '',
+                        'chat': {'id': self.user_id, 'type': 'private'}}}})
+
+    def choose(self, markup: Optional[dict]) -> Optional[str]:
+        """Klaviaturadan keyingi qadamni tanlash; None - kutish yoki tugadi"""
+        if not markup:
+            return None
+        buttons = {}
+        for row in markup.get('inline_keyboard', []):
+            for button in row:
+                decoded = _decode(button['callback_data'])
+                if decoded is not None:
+                    buttons.setdefault(decoded[0], []).append((button['callback_data'], decoded[1]))
+        for route in (router.ANSWER, router.LANGUAGE, router.SUBJECT):
+            if route in buttons:
+                if route == router.ANSWER:
+                    self.answers += 1
+                return self.rng.choice(buttons[route])[0]
+        if router.TEST_MODE in buttons:
+            # Random test - 30 ta savol
+            return next(data for data, args in buttons[router.TEST_MODE] if args[0] == 'r')
+        if router.RESTART in buttons:
+            return ''  # natija ekrani - yo'l tugadi
+        return None
+
+    async def run(self) -> bool:
+        await asyncio.sleep(self.rng.random() * self.think)
+        self.send_command('/start')
+        while True:
+            try:
+                _, markup = await asyncio.wait_for(self.inbox.get(), REPLY_TIMEOUT)
+            except asyncio.TimeoutError:
+                return False
+            data = self.choose(markup)
+            if data == '':
+                return True
+            if data is not None:
+                if self.think:
+                    await asyncio.sleep(self.rng.uniform(0.5, 1.5) * self.think)
+                self.press(data)
+
+
+def _decode(data: str):
+    """Versiyalangan callback_data'ni marshrut va argumentlarga ajratish (tekshiruvsiz)"""
+    parts = data.split(router.SEP)
+    if len(parts) < 2 or parts[0] != router.VERSION:
+        return None
+    return parts[1], tuple(parts[2:])
+
+
+def serve_fake_api(port: int, seed: int, webhook_url: Optional[str] = None, secret: Optional[str] = None):
+    import logging
+    from aiohttp import web
+    # Jarayon to'xtatilganda ochiq long-poll'lar haqidagi xabarlar hisobotga aralashmasin
+    for name in ('aiohttp', 'asyncio'):
+        logging.getLogger(name).setLevel(logging.CRITICAL)
+    api = FakeBotAPI(seed, webhook_url, secret)
+    app = web.Application()
+    app.router.add_post('/bot{token}/{method}', api.handle)
+    app.router.add_post('/loadtest/run', api.run_level)
+    web.run_app(app, host='127.0.0.1', port=port, print=None, access_log=None)
+
+
+# --- Bot tomoni (shu jarayon) ---
+
+async def lag_monitor(samples: List[float], stop: asyncio.Event):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(LAG_TICK)
+        samples.append(time.perf_counter() - start - LAG_TICK)
+
+
+async def webhook_checks(session, server) -> List[tuple]:
+    """Webhook endpointi: secret sarlavhasi, noto'g'ri body va draining; (nom, kutilgan, olingan)"""
+    import webhook
+    url = f'http://127.0.0.1:{server.port}{server.path}'
+    secret = {webhook.SECRET_HEADER: server.secret, 'Content-Type': 'application/json'}
+    valid = json.dumps({'update_id': 10 ** 9})
+    cases = [
+        ("secret yo'q", {'Content-Type': 'application/json'}, valid, 403),
+        ("noto'g'ri secret", {webhook.SECRET_HEADER: 'x', 'Content-Type': 'application/json'}, valid, 403),
+        ("buzilgan JSON", secret, '{', 400),
+        ("JSON massiv", secret, '[]', 400),
+        ("JSON son", secret, '1', 400),
+        ("update_id yo'q", secret, '{}', 400),
+        ("to'g'ri update", secret, valid, 200),
+    ]
+    results = []
+    for name, headers, body, expected in cases:
+        async with session.post(url, data=body, headers=headers) as response:
+            results.append((name, expected, response.status))
+    # To'xtash boshlandi: yangi update'lar va /healthz 503 (Telegram/balanser qayta urinadi)
+    await server.drain(timeout=1.0)
+    async with session.post(url, data=valid, headers=secret) as response:
+        results.append(("draining: update", 503, response.status))
+    async with session.get(f'http://127.0.0.1:{server.port}/healthz') as response:
+        results.append(("draining: /healthz", 503, response.status))
+    return results
+
+
+async def run_bot(args, api_port: int) -> List[dict]:
+    import aiohttp
+    import bot_new
+    from telegram import Update
+
+    handler_times: List[float] = []
+    bot_new.callbacks.add_hook(lambda code, elapsed, error: handler_times.append(elapsed))
+
+    application = bot_new.build_application(mode=args.mode)
+    await application.initialize()
+    await application.post_init(application)
+    if args.mode == 'polling':
+        await application.updater.start_polling(poll_interval=0.0, timeout=10, allowed_updates=Update.ALL_TYPES)
+    await application.start()
+
+    reports = []
+    first_user = 10_000_000
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None)) as session:
+            for users in args.users:
+                handler_times.clear()
+                lag: List[float] = []
+                stop = asyncio.Event()
+                monitor = asyncio.create_task(lag_monitor(lag, stop))
+                async with session.post(f'http://127.0.0.1:{api_port}/loadtest/run', json={
+                    'users': users, 'think': args.think, 'first_user': first_user
+                }) as response:
+                    result = await response.json()
+                stop.set()
+                await monitor
+                first_user += users
+                latencies = result['latencies']
+                reports.append({
+                    'users': users,
+                    'completed': result['completed'],
+                    'updates': result['updates'],
+                    'mode': args.mode,
+                    'redelivered': result['redelivered'],
+                    'duration_s': round(result['duration'], 2),
+                    'updates_per_s': round(result['updates'] / result['duration'], 1) if result['duration'] else 0,
+                    'e2e_ms': {p: round(percentile(latencies, p) * 1000, 2) for p in (50, 95, 99)},
+                    'handler_ms': {p: round(percentile(handler_times, p) * 1000, 2) for p in (50, 95, 99)},
+                    'loop_lag_ms': {
+                        'mean': round(statistics.mean(lag) * 1000, 2) if lag else 0,
+                        'p99': round(percentile(lag, 99) * 1000, 2),
+                        'max': round(max(lag) * 1000, 2) if lag else 0
+                    }
+                })
+                print_report(reports[-1])
+            if args.mode == 'webhook':
+                checks = await webhook_checks(session, application.bot_data['web_server'])
+                for name, expected, status in checks:
+                    print(f"webhook {name:<22} kutilgan {expected}, olindi {status}  "
+                          f"{'OK' if status == expected else 'XATO'}", flush=True)
+                reports.append({'webhook_checks': [
+                    {'name': name, 'expected': expected, 'status': status} for name, expected, status in checks]})
+    finally:
+        if application.updater is not None:
+            await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+        await application.post_shutdown(application)
+    return reports
+
+
+def print_report(r: dict):
+    print(f"{r['mode']:<8} users={r['users']:<5} done={r['completed']:<5} updates={r['updates']:<6} "
+          f"{r['updates_per_s']:>7} upd/s | e2e p50/p95/p99 "
+          f"{r['e2e_ms'][50]}/{r['e2e_ms'][95]}/{r['e2e_ms'][99]} ms | handler "
+          f"{r['handler_ms'][50]}/{r['handler_ms'][95]}/{r['handler_ms'][99]} ms | "
+          f"lag p99 {r['loop_lag_ms']['p99']} ms, max {r['loop_lag_ms']['max']} ms"
+          + (f" | qayta yuborildi {r['redelivered']}" if r['redelivered'] else ''), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, nargs='+', default=[10, 50, 200], help="concurrency darajalari")
+    parser.add_argument('--think', type=float, default=0.2, help="foydalanuvchi bosishlari orasidagi o'rtacha pauza (s)")
+    parser.add_argument('--feedback-delay', type=float, default=0.05, help="ANSWER_FEEDBACK_DELAY")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--mode', choices=('polling', 'webhook'), default='polling',
+                        help="update'larni getUpdates yoki webhook orqali yetkazish")
+    parser.add_argument('--json', help="hisobotni JSON faylga yozish")
+    args = parser.parse_args()
+
+    api_port = free_port()
+    bot_port = free_port()
+    webhook_url = f'http://127.0.0.1:{bot_port}/webhook' if args.mode == 'webhook' else None
+    api = multiprocessing.get_context('spawn').Process(
+        target=serve_fake_api, args=(api_port, args.seed, webhook_url, WEBHOOK_SECRET), daemon=True)
+    api.start()
+
+    # Bot sozlamalari bot_new import qilinishidan oldin o'rnatiladi; DB vaqtinchalik papkada
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    os.environ.update({
+        'BOT_TOKEN': TOKEN,
+        'BOT_MODE': args.mode,
+        'BOT_API_BASE_URL': f'http://127.0.0.1:{api_port}/bot',
+        'PORT': str(bot_port),
+        'WEBHOOK_LISTEN': '127.0.0.1',
+        'WEBHOOK_PATH': '/webhook',
+        'WEBHOOK_SECRET': WEBHOOK_SECRET,
+        'WEBHOOK_URL': '',
+        'ANSWER_FEEDBACK_DELAY': str(args.feedback_delay),
+        'QUIZ_START_DELAY': str(args.feedback_delay),
+        'ADMIN_USER_ID': '0'
+    })
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        time.sleep(0.5)
+        reports = asyncio.run(run_bot(args, api_port))
+    finally:
+        import activity_log
+        import db
+        import storage
+        activity_log.shutdown()
+        storage.shutdown()
+        db.close_connections()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        api.terminate()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+
+    failed = [c for r in reports for c in r.get('webhook_checks', []) if c['status'] != c['expected']]
+    if failed:
+        print(f"Webhook tekshiruvlari o'tmadi: {', '.join(c['name'] for c in failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+"""Issiq yo'llar uchun mikro-benchmarklar va regressiya tekshiruvi.
+
+Sintetik banklar (standart: 1k, 10k, 100k savol) va 1M qatorli faoliyat logi
+ustida o'lchanadi:
+  - db.get_random_questions, db.get_all_questions (har bir bank hajmi uchun);
+  - db.log_activity va db.get_stats_summary (to'lgan user_activity ustida);
+  - MultiLanguageQuizBot.start_new_quiz (random/sequential) va answer_question;
+  - show_question matni va klaviaturasi: keshdan va noldan qurish.
+
+Natija - har bir holat uchun bitta chaqiruv vaqti (mikrosoniya, takrorlar
+medianasi). Baseline JSON faylda har bir holat uchun `threshold` (ruxsat
+etilgan sekinlashish koeffitsienti) bilan saqlanadi:
+
+    python benchmarks/microbench.py --save      # baseline yozish/yangilash
+    python benchmarks/microbench.py --check     # baseline'dan sekinlashsa exit 1
+
+Baseline mashinaga bog'liq: boshqa mashinada avval --save bilan yangilang.
+Tayyorlangan DB'ni qayta ishlatish uchun --db (fayl yo'q bo'lsa yaratiladi).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'microbench_baseline.json')
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_ACTIVITY_ROWS = 1000000
+ACTIVITY_USERS = 50000
+DEFAULT_THRESHOLD = 1.5
+# Diskka yozuvchi holatlar shovqinliroq
+WRITE_THRESHOLD = 2.5
+# Bitta takror kamida shuncha davom etadi (chaqiruvlar soni shunga qarab tanlanadi)
+MIN_REPEAT_TIME = 0.2
+REPEATS = 5
+
+QUESTION_TEXT = "Какие документы должны находиться на борту воздушного судна при выполнении международного полёта?"
+OPTION_TEXT = "Свидетельство о регистрации, сертификат лётной годности, бортовой журнал"
+
+
+def bench_subject(size: int) -> str:
+    return f'bench{size}'
+
+
+def make_questions(size: int) -> List[Dict]:
+    return [{
+        'id': i + 1,
+        'question': f"{QUESTION_TEXT} #{i + 1}",
+        'options': [f"{OPTION_TEXT} ({j})" for j in range(4)],
+        'correct_answer': i % 4
+    } for i in range(size)]
+
+
+def populate(sizes, activity_rows: int):
+    """Sintetik banklar va faoliyat logini DB'ga yozish (rollup triggerlari bilan)"""
+    import db
+    db.init_db()
+    for size in sizes:
+        subject = bench_subject(size)
+        if db.count_questions(subject) != size:
+            db.sync_questions(subject, make_questions(size))
+    existing = db._reader().execute('SELECT COUNT(*) FROM user_activity').fetchone()[0]
+    activities = ('bot_started', 'test_started', 'test_completed')
+    rng = random.Random(1)
+    chunk = []
+    for i in range(existing, activity_rows):
+        uid = rng.randrange(ACTIVITY_USERS)
+        day = 1 + i % 28
+        chunk.append((uid, f'user{uid}', f'User {uid}', activities[i % 3], bench_subject(sizes[i % len(sizes)]),
+                      f'2025-01-{day:02d}T12:00:00'))
+        if len(chunk) == 20000:
+            db.log_activities(chunk)
+            chunk = []
+    if chunk:
+        db.log_activities(chunk)
+
+
+def measure(func: Callable[[], object], repeats: int = REPEATS) -> float:
+    """Bitta chaqiruvning median vaqti (mikrosoniya)"""
+    func()  # isitish
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_REPEAT_TIME or number >= 1 << 20:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(MIN_REPEAT_TIME / elapsed) + 1))
+    samples = [elapsed / number]
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return statistics.median(samples) * 1e6
+
+
+def cases(sizes) -> List[tuple]:
+    """(nom, funksiya, threshold) ro'yxati; bot_new shu yerda import qilinadi"""
+    import bot_new
+    import db
+    import question_bank
+    from rendering import build_question
+
+    quiz_bot = bot_new.quiz_bot
+    result = []
+    for size in sizes:
+        subject = bench_subject(size)
+        result.append((f'db.get_random_questions[{size}]', lambda s=subject: db.get_random_questions(s, 30),
+                       DEFAULT_THRESHOLD))
+        result.append((f'db.get_all_questions[{size}]', lambda s=subject: db.get_all_questions(s),
+                       DEFAULT_THRESHOLD))
+
+    counter = iter(range(10 ** 9))
+    result.append(('db.log_activity', lambda: db.log_activity(
+        next(counter) % ACTIVITY_USERS, 'bench', 'Bench', 'test_started', bench_subject(sizes[0]),
+        '2025-02-01T12:00:00'), WRITE_THRESHOLD))
+    result.append(('db.get_stats_summary', db.get_stats_summary, DEFAULT_THRESHOLD))
+
+    user_id = 1
+    for size in sizes:
+        subject = bench_subject(size)
+        question_bank.get_bank(subject)
+        for mode in ('random', 'sequential'):
+            result.append((f'start_new_quiz[{size},{mode}]',
+                           lambda s=subject, m=mode: quiz_bot.start_new_quiz(user_id, s, m), DEFAULT_THRESHOLD))
+
+    # Javob berish va savol ekrani: eng katta bankdagi random test
+    quiz_bot.start_new_quiz(user_id, bench_subject(sizes[-1]), 'random')
+    session = quiz_bot.user_sessions.get(user_id)
+    session.language = 'ru'
+    answers = iter(range(10 ** 9))
+    result.append(('answer_question', lambda: quiz_bot.answer_question(user_id, next(answers) % 4),
+                   DEFAULT_THRESHOLD))
+
+    def show_question_cached():
+        question = quiz_bot.get_current_question(user_id)
+        progress = quiz_bot.get_progress(user_id)
+        rendered = bot_new.question_renders.render(session.bank, question, session.language, quiz_bot.translate)
+        rendered.text(progress['current'], progress['total'], progress['correct'])
+        rendered.markup(has_prev=progress['current'] > 1)
+
+    def show_question_build():
+        question = quiz_bot.get_current_question(user_id)
+        progress = quiz_bot.get_progress(user_id)
+        rendered = build_question(question, session.language, quiz_bot.translate)
+        rendered.text(progress['current'], progress['total'], progress['correct'])
+        rendered.markup(has_prev=progress['current'] > 1)
+
+    result.append(('show_question[cached]', show_question_cached, DEFAULT_THRESHOLD))
+    result.append(('show_question[build]', show_question_build, DEFAULT_THRESHOLD))
+    return result
+
+
+def run(sizes, activity_rows: int, db_path: Optional[str], only: Optional[str]) -> Dict[str, dict]:
+    workdir = tempfile.mkdtemp(prefix='microbench-')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    os.environ.setdefault('BOT_TOKEN', '123456:MICROBENCH')
+    import db
+    db.DB_PATH = os.path.abspath(db_path) if db_path else os.path.join(workdir, 'bench.db')
+    try:
+        started = time.perf_counter()
+        populate(sizes, activity_rows)
+        print(f"DB tayyor: {time.perf_counter() - started:.1f}s ({db.DB_PATH})", flush=True)
+        results = {}
+        for name, func, threshold in cases(sizes):
+            if only and only not in name:
+                continue
+            results[name] = {'us': round(measure(func), 2), 'threshold': threshold}
+            print(f"{name:<38} {results[name]['us']:>14.2f} us", flush=True)
+        return results
+    finally:
+        import activity_log
+        import storage
+        activity_log.shutdown()
+        storage.shutdown()
+        db.close_connections()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def check(results: Dict[str, dict], baseline: Dict[str, dict]) -> List[str]:
+    """Baseline'dan threshold martadan ko'p sekinlashgan holatlar"""
+    failures = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<38} baseline'da yo'q")
+            continue
+        ratio = current['us'] / base['us'] if base['us'] else 0.0
+        limit = base.get('threshold', DEFAULT_THRESHOLD)
+        status = 'OK' if ratio <= limit else 'SEKIN'
+        print(f"{name:<38} {base['us']:>12.2f} -> {current['us']:>12.2f} us  x{ratio:5.2f} (chegara x{limit})  {status}")
+        if ratio > limit:
+            failures.append(name)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', help="bank hajmlari (standart: 1000 10000 100000)")
+    parser.add_argument('--activity-rows', type=int, help="user_activity qatorlari (standart: 1000000)")
+    parser.add_argument('--db', help="tayyorlangan DB fayli (qayta ishlatish uchun)")
+    parser.add_argument('--only', help="faqat nomida shu matn bor holatlar")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save', action='store_true', help="natijani baseline sifatida yozish")
+    parser.add_argument('--check', action='store_true', help="baseline bilan solishtirish, sekinlashsa exit 1")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.check:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    # Tekshiruvda parametrlar baseline'niki bilan bir xil bo'lishi kerak
+    params = baseline['params'] if baseline else {}
+    sizes = tuple(args.sizes or params.get('sizes') or DEFAULT_SIZES)
+    activity_rows = args.activity_rows if args.activity_rows is not None else \
+        params.get('activity_rows', DEFAULT_ACTIVITY_ROWS)
+    if baseline and (list(sizes) != params.get('sizes') or activity_rows != params.get('activity_rows')):
+        parser.error("--check baseline parametrlari bilan ishga tushirilishi kerak")
+
+    results = run(sizes, activity_rows, args.db, args.only)
+
+    if args.save:
+        data = {
+            'params': {'sizes': list(sizes), 'activity_rows': activity_rows},
+            'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'processor': platform.processor() or platform.machine()},
+            'results': results
+        }
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                old = json.load(f).get('results', {})
+            # Qo'lda sozlangan threshold'lar saqlanadi; --only bilan qolgan holatlar ham
+            for name, entry in results.items():
+                if name in old:
+                    entry['threshold'] = old[name].get('threshold', entry['threshold'])
+            if args.only:
+                data['results'] = dict(old, **results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f"Baseline yozildi: {args.baseline}")
+
+    if baseline is not None:
+        failures = check(results, baseline['results'])
+        if failures:
+            print(f"Regressiya: {', '.join(failures)}")
+            sys.exit(1)
+        print("Barcha holatlar baseline chegarasida")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,26 @@
+import asyncio
 import logging
-import json
-import random
 import os
-from datetime import datetime
-from typing import Dict, Any
+import time
+from array import array
+from datetime import datetime, timedelta
 import db
+import activity_log
+import adaptive
+import coordination
+import storage
+from broadcast import BroadcastEngine
+from scheduling import PerUserUpdateProcessor, TransitionScheduler
+import i18n
+import metrics
+import profiling
+import question_bank
+import router
+import webhook
+from sessions import SessionStore
+from rendering import LANGUAGE_PICKER, LANGUAGE_PICKER_TEXT, MenuKeyboards, QuestionRenderCache
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, ContextTypes, filters
+from telegram.ext import Application, CommandHandler, MessageHandler, ContextTypes, filters
 from dotenv import load_dotenv
 
 # .env fayldan o'zgaruvchilarni yuklash
@@ -23,89 +37,82 @@ logger = logging.getLogger(__name__)
 BOT_TOKEN = os.getenv("BOT_TOKEN", "YOUR_BOT_TOKEN_HERE")
 ADMIN_USER_ID = int(os.getenv("ADMIN_USER_ID", "0"))
 
+# Javobdan keyin keyingi savolgacha va test boshlanishidagi kutish (soniya)
+ANSWER_FEEDBACK_DELAY = float(os.getenv("ANSWER_FEEDBACK_DELAY", "2.5"))
+QUIZ_START_DELAY = float(os.getenv("QUIZ_START_DELAY", "1"))
+# Bir vaqtda qayta ishlanadigan update'lar soni (bitta user ichida tartib saqlanadi)
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "256"))
+# Bitta foydalanuvchidan navbatda turishi mumkin bo'lgan update'lar (ortig'i tashlanadi)
+MAX_PENDING_PER_USER = int(os.getenv("MAX_PENDING_PER_USER", "20"))
+# Bajarilishini kutib turgan update'lar chegarasi (PTB semaforiga qo'shiladi)
+MAX_QUEUED_UPDATES = int(os.getenv("MAX_QUEUED_UPDATES", "1024"))
+# compile_questions.py yozadigan savollar fayli
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+QUESTIONS_ARTIFACT = os.getenv("QUESTIONS_ARTIFACT", os.path.join(BASE_DIR, 'questions.bin'))
+# Bank fayllarini kuzatish oralig'i (soniya); 0 - o'chirilgan, faqat /reload orqali
+BANK_WATCH_INTERVAL = float(os.getenv("BANK_WATCH_INTERVAL", "0"))
+# Bot API manzili (lokal soxta Bot API bilan sinash uchun, masalan http://127.0.0.1:8081/bot)
+BOT_API_BASE_URL = os.getenv("BOT_API_BASE_URL", "")
+# Ishga tushish: lazy - bot darhol ishlaydi, fan banklari birinchi murojaatda tayyorlanadi;
+# eager - barcha banklar va eski statistika update qabul qilishdan oldin
+STARTUP_MODE = os.getenv("STARTUP_MODE", "lazy")
+# Lazy rejimda fonda oldindan tayyorlanadigan eng ommabop fanlar soni va davri (kun)
+PREWARM_SUBJECTS = int(os.getenv("PREWARM_SUBJECTS", "3"))
+PREWARM_DAYS = int(os.getenv("PREWARM_DAYS", "30"))
+
+# db funksiyalarining vaqtini o'lchash (/metrics)
+metrics.instrument_db()
+
+def format_stats_summary(stats) -> str:
+    """db.get_stats_summary() natijasidan statistika matni"""
+    if not stats or not stats.get('unique_users'):
+        return "📊 Hozircha statistika ma'lumotlari yo'q"
+    
+    total_tests = stats.get('total_tests', 0)
+    completed_tests = stats.get('completed_tests', 0)
+    stats_text = f"""📊 Bot Statistikasi
+
+👥 Jami foydalanuvchilar: {stats['unique_users']}
+📝 Boshlangan testlar: {total_tests}
+✅ Tugallangan testlar: {completed_tests}
+📈 Tugallash foizi: {(completed_tests/total_tests*100) if total_tests > 0 else 0:.1f}%
+
+🏆 Eng faol foydalanuvchilar:
+"""
+    for i, (uid, name, username, tests) in enumerate(stats.get('top_users', []), 1):
+        uname = f"@{username}" if username else "Noma'lum"
+        stats_text += f"{i}. {name} ({uname}) - {tests} ta test\n"
+    
+    return stats_text
+
 class MultiLanguageQuizBot:
     def __init__(self):
         self.questions = {}
-        self.translations = {}
-        self.user_sessions = {}  # Har bir user uchun sessiya ma'lumotlari
-        self.user_stats = []  # Foydalanuvchilar statistikasi
+        self.translations = i18n.Translations({})
+        self.keyboards = MenuKeyboards(self.translations, ())
+        self.user_sessions = SessionStore()  # Har bir user uchun sessiya ma'lumotlari (SQLite'da saqlanadi)
+        self.selector = adaptive.AdaptiveSelector()  # Xatolar tarixiga qarab random savollar
         # Initialize DB and load data
         db.init_db()
         self.load_data()
-        self.load_stats()
+        if STARTUP_MODE == 'eager':
+            self.load_stats()
     
     def load_stats(self):
-        """Statistika ma'lumotlarini yuklash"""
-        try:
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            stats_path = os.path.join(current_dir, 'user_stats.json')
-            with open(stats_path, 'r', encoding='utf-8') as f:
-                self.user_stats = json.load(f)
-        except FileNotFoundError:
-            self.user_stats = []
-    
-    def save_stats(self):
-        """Statistika ma'lumotlarini saqlash"""
+        """Eski user_stats.json'ni (bo'lsa) SQLite'ga ko'chirish - oqim bilan, bir marta"""
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        stats_path = os.path.join(current_dir, 'user_stats.json')
         try:
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            stats_path = os.path.join(current_dir, 'user_stats.json')
-            with open(stats_path, 'w', encoding='utf-8') as f:
-                json.dump(self.user_stats, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"Statistika saqlashda xatolik: {e}")
-    
-    def log_user_activity(self, user_id: int, username: str, first_name: str, activity: str, subject: str = None):
-        """Foydalanuvchi faoliyatini loglash"""
-        activity_log = {
-            'user_id': user_id,
-            'username': username,
-            'first_name': first_name,
-            'activity': activity,
-            'subject': subject,
-            'timestamp': datetime.now().isoformat()
-        }
-        self.user_stats.append(activity_log)
-        self.save_stats()
+            imported = db.import_stats_json(stats_path)
+        except (OSError, ValueError) as e:
+            logger.error(f"user_stats.json ni ko'chirishda xatolik: {e}")
+            return
+        if imported:
+            logger.info(f"user_stats.json'dan {imported} ta yozuv ko'chirildi")
     
     def get_stats_summary(self):
-        """Umumiy statistika ma'lumotlari"""
-        if not self.user_stats:
-            return "📊 Hozircha statistika ma'lumotlari yo'q"
-        
-        unique_users = len(set(log['user_id'] for log in self.user_stats))
-        total_tests = len([log for log in self.user_stats if log['activity'] == 'test_started'])
-        completed_tests = len([log for log in self.user_stats if log['activity'] == 'test_completed'])
-        
-        # Eng faol foydalanuvchilar
-        user_activity = {}
-        for log in self.user_stats:
-            user_id = log['user_id']
-            if user_id not in user_activity:
-                user_activity[user_id] = {
-                    'name': log['first_name'],
-                    'username': log['username'],
-                    'tests': 0
-                }
-            if log['activity'] == 'test_started':
-                user_activity[user_id]['tests'] += 1
-        
-        top_users = sorted(user_activity.items(), key=lambda x: x[1]['tests'], reverse=True)[:20]
-        
-        stats_text = f"""📊 Bot Statistikasi
-
-👥 Jami foydalanuvchilar: {unique_users}
-📝 Boshlangan testlar: {total_tests}
-✅ Tugallangan testlar: {completed_tests}
-📈 Tugallash foizi: {(completed_tests/total_tests*100) if total_tests > 0 else 0:.1f}%
-
-🏆 Eng faol foydalanuvchilar:
-"""
-        
-        for i, (user_id, data) in enumerate(top_users, 1):
-            username = f"@{data['username']}" if data['username'] else "Noma'lum"
-            stats_text += f"{i}. {data['name']} ({username}) - {data['tests']} ta test\n"
-        
-        return stats_text
+        """Umumiy statistika matni (rollup jadvallaridan)"""
+        return format_stats_summary(db.get_stats_summary())
     
     def load_data(self):
         """Savollar va tarjimalarni yuklash"""
@@ -115,193 +122,199 @@ class MultiLanguageQuizBot:
             
             # Tarjimalarni yuklash
             translations_path = os.path.join(current_dir, 'translations.json')
-            with open(translations_path, 'r', encoding='utf-8') as f:
-                self.translations = json.load(f)
-
-            # Ensure DB has questions for each subject; load from JSON if DB is empty
-            subjects = [
-                ('airlaw', 'questions_airlaw.json'),
-                ('aviation', 'questions_aviation.json'),
-                ('aviation_general', 'questions_aviation_general.json'),
-                ('meteorology', 'questions_meteorology.json'),
-                ('navigation', 'questions_navigation.json'),
-                ('cessna172', 'questions_cessna172.json'),
-                ('operations', 'questions_operations.json'),
-                ('radiotelephony', 'questions_radiotelephony.json')
-            ]
-            for subj, path in subjects:
-                try:
-                    count = db.count_questions(subj)
-                except Exception:
-                    count = 0
-                full_path = os.path.join(current_dir, path)
-                if count == 0 and os.path.exists(full_path):
-                    inserted = db.load_questions_from_json(full_path, subj)
-                    logger.info(f"Inserted {inserted} questions for {subj} from {full_path}")
-
-            logger.info("Ma'lumotlar muvaffaqiyatli yuklandi into DB")
+            self.translations = i18n.load(translations_path)
+            # Statik menyular har bir til uchun bir marta quriladi
+            self.keyboards = MenuKeyboards(self.translations, (s for s, _ in question_bank.SUBJECTS))
+
+            if STARTUP_MODE == 'eager':
+                # DB'dagi savollarni manba fayllar bilan sinxronlash: xeshi o'zgargan fanlar
+                # compiled questions.bin (mmap) yoki JSON'dan diff bo'yicha yangilanadi
+                results = question_bank.reload_banks(current_dir, QUESTIONS_ARTIFACT)
+                for subj, result in results.items():
+                    logger.info(f"{subj} banki sinxronlandi: {result}")
+
+                logger.info("Ma'lumotlar muvaffaqiyatli yuklandi into DB")
+            # lazy: har bir fan ensure_subject orqali birinchi murojaatda sinxronlanadi
         except FileNotFoundError as e:
             logger.error(f"Fayl topilmadi: {e}")
-            self.translations = {}
+    
+    def get_language(self, user_id: int) -> str:
+        """Foydalanuvchi tanlagan til"""
+        session = self.user_sessions.peek(user_id)
+        return session.language if session else i18n.DEFAULT_LANGUAGE
     
     def get_text(self, user_id: int, key: str) -> str:
         """Foydalanuvchi tili bo'yicha matnni olish"""
-        session = self.user_sessions.get(user_id, {})
-        language = session.get('language', 'uz')
-        return self.translations.get(language, {}).get(key, key)
+        return self.translations.get(self.get_language(user_id), key)
+    
+    def translate(self, language: str, key: str) -> str:
+        """Berilgan til bo'yicha matnni olish"""
+        return self.translations.get(language, key)
     
     def start_new_quiz(self, user_id: int, subject: str, test_mode: str = 'random'):
         """Yangi quiz boshlash
         test_mode: 'random' = 30 tasodifiy savol, 'sequential' = barcha savollar ketmaket
         """
-        # Use DB to fetch questions
+        # Savollar xotiradagi bankdan olinadi - SQLite'ga murojaat yo'q
+        # (handlerlar load_subject bilan bankni oldindan tayyorlaydi)
         try:
-            available = db.count_questions(subject)
-        except Exception:
-            available = 0
+            bank = question_bank.ensure_subject(BASE_DIR, QUESTIONS_ARTIFACT, subject)
+        except Exception as e:
+            logger.error(f"{subject} bankini yuklashda xatolik: {e}")
+            return False
         
-        if available < 30:
+        if len(bank) < 30:
             logger.warning(f"{subject} uchun kamida 30 ta savol kerak!")
             return False
 
-        # Test mode bo'yicha savollarni tanlash
+        # Test mode bo'yicha savollarni tanlash (sessiyada faqat bank indekslari saqlanadi)
         if test_mode == 'sequential':
             # Barcha savollarni ketmaket
-            selected_questions = db.get_all_questions(subject)
-            total_questions = len(selected_questions)
+            order = range(len(bank))
+        elif adaptive.ADAPTIVE_SELECTION:
+            # Random - 30 ta, ko'p adashilgan va uzoq ko'rilmagan savollar ko'proq chiqadi
+            order = array('I', self.selector.sample_indices(user_id, bank, 30))
         else:
             # Random - 30 ta
-            selected_questions = db.get_random_questions(subject, 30)
-            total_questions = 30
+            order = array('I', bank.sample_indices(30))
         
-        if user_id not in self.user_sessions:
-            self.user_sessions[user_id] = {}
-            
-        self.user_sessions[user_id].update({
-            'subject': subject,
-            'test_mode': test_mode,
-            'questions': selected_questions,
-            'current_question': 0,
-            'correct_answers': 0,
-            'answers': [None] * total_questions,
-            'state': 'quiz'
-        })
+        session = self.user_sessions.get_or_create(user_id)
+        session.start_quiz(bank, test_mode, order)
         return True
     
     def get_current_question(self, user_id: int):
         """Joriy savolni olish"""
-        if user_id not in self.user_sessions:
+        session = self.user_sessions.peek(user_id)
+        if session is None or session.bank is None:
             return None
         
-        session = self.user_sessions[user_id]
-        current_index = session['current_question']
+        current_index = session.current_question
         
-        if current_index >= len(session['questions']):
+        if current_index >= session.total:
             return None
         
-        return session['questions'][current_index]
+        return session.question(current_index)
     
     def answer_question(self, user_id: int, answer: str):
         """Savolga javob berish"""
-        if user_id not in self.user_sessions:
+        session = self.user_sessions.peek(user_id)
+        if session is None or session.bank is None:
             return False
         
-        session = self.user_sessions[user_id]
-        current_index = session['current_question']
+        current_index = session.current_question
         
-        if current_index >= len(session['questions']):
+        if current_index >= session.total:
             return False
         
-        question = session['questions'][current_index]
-        # correct_answer ni tekshirish - agar harf bo'lsa, raqamga aylantirish
-        if isinstance(question['correct_answer'], str):
-            # Agar "A", "B", "C", "D" shaklida bo'lsa
-            if question['correct_answer'] in ['A', 'B', 'C', 'D']:
-                correct_answer = ord(question['correct_answer']) - ord('A')  # A=0, B=1, C=2, D=3
-            else:
-                try:
-                    correct_answer = int(question['correct_answer'])
-                except ValueError:
-                    correct_answer = 0  # Default qiymat
-        else:
-            correct_answer = question['correct_answer']
+        question = session.question(current_index)
+        # correct_answer bankda allaqachon variant indeksiga keltirilgan
+        correct_answer = question['correct_answer']
         
         user_answer = int(answer) if isinstance(answer, str) else answer
         is_correct = user_answer == correct_answer
         
-        # Javobni saqlash
-        session['answers'][current_index] = {
-            'user_answer': answer,
-            'is_correct': is_correct
-        }
-        
-        if is_correct:
-            session['correct_answers'] += 1
+        # Javobni saqlash (to'g'ri javoblar soni ham shu yerda yangilanadi)
+        session.record_answer(current_index, user_answer, is_correct)
+        self.user_sessions.mark_dirty(user_id)
+        if adaptive.ADAPTIVE_SELECTION:
+            self.selector.record(user_id, session.bank, session.order[current_index], is_correct)
         
         return is_correct
     
     def next_question(self, user_id: int):
         """Keyingi savolga o'tish"""
-        if user_id not in self.user_sessions:
+        session = self.user_sessions.peek(user_id)
+        if session is None:
             return False
         
-        session = self.user_sessions[user_id]
-        session['current_question'] += 1
+        session.current_question += 1
+        self.user_sessions.mark_dirty(user_id)
         return True
     
     def previous_question(self, user_id: int):
         """Oldingi savolga qaytish"""
-        if user_id not in self.user_sessions:
+        session = self.user_sessions.peek(user_id)
+        if session is None or session.bank is None:
             return False
         
-        session = self.user_sessions[user_id]
-        if session['current_question'] > 0:
-            session['current_question'] -= 1
+        if session.current_question > 0:
+            session.current_question -= 1
             # Oldingi javobni o'chirish
-            current_index = session['current_question']
-            if session['answers'][current_index] and session['answers'][current_index]['is_correct']:
-                session['correct_answers'] -= 1
-            session['answers'][current_index] = None
+            session.clear_answer(session.current_question)
+            self.user_sessions.mark_dirty(user_id)
             return True
         return False
     
     def get_progress(self, user_id: int):
         """Progress ma'lumotlarini olish"""
-        if user_id not in self.user_sessions:
+        session = self.user_sessions.peek(user_id)
+        if session is None or session.bank is None:
             return None
         
-        session = self.user_sessions[user_id]
         return {
-            'current': session['current_question'] + 1,
-            'total': len(session['questions']),
-            'correct': session['correct_answers']
+            'current': session.current_question + 1,
+            'total': session.total,
+            'correct': session.correct_answers
         }
     
     def is_quiz_finished(self, user_id: int):
         """Quiz tugaganmi tekshirish"""
-        if user_id not in self.user_sessions:
+        session = self.user_sessions.peek(user_id)
+        if session is None:
             return True
         
-        session = self.user_sessions[user_id]
-        return session['current_question'] >= len(session['questions'])
+        return session.current_question >= session.total
     
     def set_language(self, user_id: int, language: str):
         """Foydalanuvchi tilini o'rnatish"""
-        if user_id not in self.user_sessions:
-            self.user_sessions[user_id] = {}
-        self.user_sessions[user_id]['language'] = language
-        self.user_sessions[user_id]['state'] = 'menu'
+        session = self.user_sessions.get_or_create(user_id)
+        session.language = language
+        session.state = 'menu'
 
 # Global bot instance
 quiz_bot = MultiLanguageQuizBot()
+update_processor = PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES, preload=quiz_bot.user_sessions.preload,
+                                          max_pending_per_user=MAX_PENDING_PER_USER,
+                                          max_queued_updates=MAX_QUEUED_UPDATES)
+transitions = TransitionScheduler(update_processor)
+broadcasts = BroadcastEngine()
+# Bir nechta worker bo'lsa admin amallari natijasi boshqalarga shu orqali yetkaziladi
+control = coordination.ControlChannel()
+# Savol matni va klaviaturasi (subject, qid, til) bo'yicha bir marta quriladi
+question_renders = QuestionRenderCache()
+
+async def load_subject(subject: str):
+    """Fan bankini event loop'dan tashqarida tayyorlash (lazy rejimda birinchi murojaatda sinxronlanadi)"""
+    await storage.run(question_bank.ensure_subject, BASE_DIR, QUESTIONS_ARTIFACT, subject)
+
+async def prepare_quiz(user_id: int, subject: str):
+    """Test boshlashdan oldin bank va foydalanuvchi indeksini event loop'dan tashqarida tayyorlash"""
+    await load_subject(subject)
+    if adaptive.ADAPTIVE_SELECTION:
+        bank = question_bank.get_bank(subject)
+        await quiz_bot.selector.preload(user_id, bank)
+
+async def prewarm():
+    """Lazy rejim: ommabop fanlarni va eski statistikani fonda tayyorlash"""
+    started = time.monotonic()
+    since = (datetime.now() - timedelta(days=PREWARM_DAYS)).date().isoformat()
+    known = {s for s, _ in question_bank.SUBJECTS}
+    popular = [s for s in await storage.run(db.get_popular_subjects, since) if s in known]
+    for subject in popular[:PREWARM_SUBJECTS]:
+        try:
+            await load_subject(subject)
+        except Exception as e:
+            logger.error(f"{subject} bankini oldindan yuklashda xatolik: {e}")
+    await storage.run(quiz_bot.load_stats)
+    logger.info(f"Oldindan yuklandi: {popular[:PREWARM_SUBJECTS]} ({time.monotonic() - started:.2f}s)")
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Bot boshlanishi - til tanlash"""
     user_id = update.effective_user.id
     user = update.effective_user
     
-    # Foydalanuvchi faoliyatini loglash (DB)
-    db.log_activity(
+    # Foydalanuvchi faoliyatini loglash (DB, fon rejimida)
+    activity_log.log(
         user_id,
         user.username,
         user.first_name,
@@ -311,44 +324,15 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     
     # Til tanlash tugmalari
-    keyboard = [
-        [
-            InlineKeyboardButton("🇺🇿 O'zbekcha", callback_data="lang_uz"),
-            InlineKeyboardButton("🇷🇺 Русский", callback_data="lang_ru"),
-            InlineKeyboardButton("🇺🇸 English", callback_data="lang_en")
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    welcome_text = "🌍 Tilni tanlang / Выберите язык / Choose language:"
-    
-    await update.message.reply_text(welcome_text, reply_markup=reply_markup)
+    await update.message.reply_text(LANGUAGE_PICKER_TEXT, reply_markup=LANGUAGE_PICKER)
 
 async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
     """Asosiy menyu ko'rsatish"""
-    start_message = quiz_bot.get_text(user_id, 'start_message')
-    choose_subject = quiz_bot.get_text(user_id, 'choose_subject')
-    
-    menu_text = f"{start_message}\n\n{choose_subject}"
-    
-    # Mavzular tugmalari
-    keyboard = [
-        [InlineKeyboardButton(quiz_bot.get_text(user_id, 'airlaw'), callback_data="subject_airlaw")],
-        [InlineKeyboardButton(quiz_bot.get_text(user_id, 'aviation'), callback_data="subject_aviation")],
-        [InlineKeyboardButton(quiz_bot.get_text(user_id, 'aviation_general'), callback_data="subject_aviation_general")],
-        [InlineKeyboardButton(quiz_bot.get_text(user_id, 'meteorology'), callback_data="subject_meteorology")],
-        [InlineKeyboardButton(quiz_bot.get_text(user_id, 'navigation'), callback_data="subject_navigation")],
-        [InlineKeyboardButton(quiz_bot.get_text(user_id, 'cessna172'), callback_data="subject_cessna172")],
-        [InlineKeyboardButton(quiz_bot.get_text(user_id, 'operations'), callback_data="subject_operations")],
-        [InlineKeyboardButton(quiz_bot.get_text(user_id, 'radiotelephony'), callback_data="subject_radiotelephony")],
-        [InlineKeyboardButton(quiz_bot.get_text(user_id, 'choose_language'), callback_data="change_language")]
-    ]
+    language = quiz_bot.get_language(user_id)
+    menu_text = quiz_bot.keyboards.main_menu_text(language)
     
-    # Admin uchun maxsus tugma qo'shish
-    if user_id == ADMIN_USER_ID:
-        keyboard.append([InlineKeyboardButton("🔧 Admin Panel", callback_data="admin_panel")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Mavzular tugmalari (admin uchun Admin Panel qatori bilan) oldindan qurilgan
+    reply_markup = quiz_bot.keyboards.main_menu(language, admin=user_id == ADMIN_USER_ID)
     
     if update.callback_query:
         await update.callback_query.edit_message_text(menu_text, reply_markup=reply_markup)
@@ -364,44 +348,11 @@ async def show_question(update: Update, context: ContextTypes.DEFAULT_TYPE, user
         await update.callback_query.edit_message_text("❌ Xatolik yuz berdi!")
         return
     
-    # Savol matni
-    question_text = f"📝 **{quiz_bot.get_text(user_id, 'question')} {question['id']} ({progress['current']}/{progress['total']})**\n\n"
-    question_text += f"❓ {question['question']}\n\n"
-    
-    # Javob variantlari
-    options = ['A', 'B', 'C', 'D']
-    for i, option in enumerate(options):
-        if i < len(question['options']):
-            question_text += f"{option}) {question['options'][i]}\n"
-    
-    question_text += f"\n✅ {quiz_bot.get_text(user_id, 'correct_answers')}: {progress['correct']}"
-    
-    # Tugmalar
-    keyboard = []
-    
-    # Javob tugmalari (callback_data now uses option index)
-    answer_buttons = []
-    for i, option in enumerate(options):
-        if i < len(question['options']):
-            answer_buttons.append(
-                InlineKeyboardButton(option, callback_data=f"answer_{i}")
-            )
-    
-    # Javob tugmalarini 2 ta qatorga bo'lish
-    keyboard.extend([answer_buttons[i:i+2] for i in range(0, len(answer_buttons), 2)])
-    
-    # Navigatsiya tugmalari
-    nav_buttons = []
-    if progress['current'] > 1:
-        nav_buttons.append(InlineKeyboardButton(quiz_bot.get_text(user_id, 'back'), callback_data="prev"))
-    
-    nav_buttons.append(InlineKeyboardButton(quiz_bot.get_text(user_id, 'forward'), callback_data="next"))
-    nav_buttons.append(InlineKeyboardButton(quiz_bot.get_text(user_id, 'restart'), callback_data="restart"))
-    
-    keyboard.append(nav_buttons)
-    keyboard.append([InlineKeyboardButton(quiz_bot.get_text(user_id, 'back_to_menu'), callback_data="main_menu")])
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Savol va tugmalar keshdan, har safar faqat progress va ball qo'shiladi
+    session = quiz_bot.user_sessions.peek(user_id)
+    rendered = question_renders.render(session.bank, question, session.language, quiz_bot.translate)
+    question_text = rendered.text(progress['current'], progress['total'], progress['correct'])
+    reply_markup = rendered.markup(has_prev=progress['current'] > 1)
     
     if update.callback_query:
         await update.callback_query.edit_message_text(
@@ -416,188 +367,168 @@ async def show_question(update: Update, context: ContextTypes.DEFAULT_TYPE, user
             parse_mode='Markdown'
         )
 
-async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Tugma bosilganida ishlovchi"""
+# Callback marshrutlari: fanlar, tillar va rejimlar registri bir marta quriladi
+callbacks = router.Router(router.Registry((s for s, _ in question_bank.SUBJECTS), i18n.LANGUAGES))
+callbacks.add_hook(metrics.observe_route)
+metrics.active_sessions.set_function(lambda: len(quiz_bot.user_sessions))
+metrics.session_dirty.set_function(lambda: quiz_bot.user_sessions.stats()['dirty'])
+metrics.session_spilled.set_function(lambda: quiz_bot.user_sessions.stats()['spilled_pending'])
+metrics.session_evictions_ttl.set_function(lambda: quiz_bot.user_sessions.evictions_ttl)
+metrics.session_evictions_lru.set_function(lambda: quiz_bot.user_sessions.evictions_lru)
+metrics.session_reloads.set_function(lambda: quiz_bot.user_sessions.reloads)
+metrics.activity_dropped.set_function(lambda: activity_log.sink.dropped)
+metrics.render_cache_hits.set_function(lambda: question_renders.hits)
+metrics.render_cache_misses.set_function(lambda: question_renders.misses)
+metrics.render_cache_size.set_function(lambda: question_renders.stats()['size'])
+
+# Admin bo'limlaridan qaytish tugmalari
+ADMIN_BACK_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔧 Admin Panel", callback_data=router.encode(router.ADMIN_PANEL))],
+    [InlineKeyboardButton("🏠 Asosiy Menyu", callback_data=router.encode(router.MAIN_MENU))]
+])
+
+@callbacks.route(router.LANGUAGE)
+async def on_language(update: Update, context: ContextTypes.DEFAULT_TYPE, language: str):
+    """Til tanlash"""
+    user_id = update.callback_query.from_user.id
+    quiz_bot.set_language(user_id, language)
+    await storage.set_user_language(user_id, language)
+    await show_main_menu(update, context, user_id)
+
+@callbacks.route(router.CHANGE_LANGUAGE)
+async def on_change_language(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Til o'zgartirish"""
+    await update.callback_query.edit_message_text(LANGUAGE_PICKER_TEXT, reply_markup=LANGUAGE_PICKER)
+
+@callbacks.route(router.MAIN_MENU)
+async def on_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Asosiy menyu"""
+    await show_main_menu(update, context, update.callback_query.from_user.id)
+
+@callbacks.route(router.SUBJECT)
+async def on_subject(update: Update, context: ContextTypes.DEFAULT_TYPE, subject: str):
+    """Fan tanlash - Test mode tanlash tugmalarini ko'rsatish"""
+    language = quiz_bot.get_language(update.callback_query.from_user.id)
+    reply_markup = quiz_bot.keyboards.test_mode(language, subject)
+    mode_text = quiz_bot.translate(language, 'choose_test_mode')
+    if subject not in question_bank.loaded_subjects():
+        # Foydalanuvchi test turini tanlaguncha bank fonda tayyorlanadi
+        context.application.create_task(load_subject(subject))
+    await update.callback_query.edit_message_text(mode_text, reply_markup=reply_markup)
+
+@callbacks.route(router.TEST_MODE)
+async def on_test_mode(update: Update, context: ContextTypes.DEFAULT_TYPE, test_mode: str, subject: str):
+    """Test mode tanlash (random yoki sequential)"""
     query = update.callback_query
-    await query.answer()
-    
     user_id = query.from_user.id
-    data = query.data
-    
-    # Til tanlash
-    if data.startswith("lang_"):
-        language = data.split("_")[1]
-        quiz_bot.set_language(user_id, language)
-        await show_main_menu(update, context, user_id)
-        return
-    
-    # Til o'zgartirish
-    if data == "change_language":
-        keyboard = [
-            [
-                InlineKeyboardButton("🇺🇿 O'zbekcha", callback_data="lang_uz"),
-                InlineKeyboardButton("🇷🇺 Русский", callback_data="lang_ru"),
-                InlineKeyboardButton("🇺🇸 English", callback_data="lang_en")
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text("🌍 Tilni tanlang / Выберите язык / Choose language:", reply_markup=reply_markup)
-        return
-    
-    # Asosiy menyu
-    if data == "main_menu":
-        await show_main_menu(update, context, user_id)
-        return
-    
-    # Fan tanlash - Test mode tanlash tugmalarini ko'rsatish
-    if data.startswith("subject_"):
-        subject = data.split("_", 1)[1]  # "_"dan keyin barcha qismni olish
-        valid_subjects = ["airlaw", "aviation", "aviation_general", "meteorology", "navigation", "cessna172", "operations", "radiotelephony"]
-        
-        if subject in valid_subjects:
-            # Test mode tanlash tugmalarini ko'rsatish
-            keyboard = [
-                [
-                    InlineKeyboardButton(
-                        quiz_bot.get_text(user_id, 'random_test'),
-                        callback_data=f"testmode_random_{subject}"
-                    )
-                ],
-                [
-                    InlineKeyboardButton(
-                        quiz_bot.get_text(user_id, 'sequential_test'),
-                        callback_data=f"testmode_sequential_{subject}"
-                    )
-                ],
-                [
-                    InlineKeyboardButton(
-                        quiz_bot.get_text(user_id, 'back_to_menu'),
-                        callback_data="main_menu"
-                    )
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            mode_text = quiz_bot.get_text(user_id, 'choose_test_mode')
-            await query.edit_message_text(mode_text, reply_markup=reply_markup)
-        return
-    
-    # Test mode tanlash (random yoki sequential)
-    if data.startswith("testmode_"):
-        parts = data.split("_")
-        test_mode = parts[1]  # 'random' yoki 'sequential'
-        subject = "_".join(parts[2:])  # Subject (multiple parts bo'lsa)
+    # Bank hali yuklanmagan bo'lsa, SQLite'dan o'qish event loop'dan tashqarida bo'ladi
+    await prepare_quiz(user_id, subject)
+    if quiz_bot.start_new_quiz(user_id, subject, test_mode):
+        # Test boshlanganligi haqida loglash (DB, fon rejimida)
+        user = query.from_user
+        activity_log.log(
+            user_id,
+            user.username,
+            user.first_name,
+            'test_started',
+            subject,
+            datetime.now().isoformat()
+        )
         
-        valid_subjects = ["airlaw", "aviation", "aviation_general", "meteorology", "navigation", "cessna172", "operations", "radiotelephony"]
+        await query.edit_message_text(quiz_bot.get_text(user_id, 'test_starting'))
         
-        if subject in valid_subjects and test_mode in ['random', 'sequential']:
-            if quiz_bot.start_new_quiz(user_id, subject, test_mode):
-                # Test boshlanganligi haqida loglash (DB)
-                user = query.from_user
-                db.log_activity(
-                    user_id,
-                    user.username,
-                    user.first_name,
-                    'test_started',
-                    subject,
-                    datetime.now().isoformat()
-                )
-                
-                await query.edit_message_text(quiz_bot.get_text(user_id, 'test_starting'))
-                
-                # 1 soniya kutib, birinchi savolni ko'rsatish
-                import asyncio
-                await asyncio.sleep(1)
-                await show_first_question(query, context, user_id)
-            else:
-                await query.edit_message_text("❌ Savollar yuklanmadi!")
-        return
+        # Biroz kutib birinchi savolni ko'rsatish (handler kutib turmaydi)
+        transitions.schedule(
+            user_id, QUIZ_START_DELAY,
+            lambda: show_first_question(query, context, user_id)
+        )
+    else:
+        await query.edit_message_text("❌ Savollar yuklanmadi!")
+
+@callbacks.route(router.ANSWER)
+async def on_answer(update: Update, context: ContextTypes.DEFAULT_TYPE, selected_index: int):
+    """Javob berildi"""
+    query = update.callback_query
+    user_id = query.from_user.id
     
-    # Javob berildi
-    if data.startswith("answer_"):
-        # callback contains the option index, e.g. answer_0
-        try:
-            selected_index = int(data.split("_")[1])
-        except Exception:
-            selected_index = None
+    is_correct = quiz_bot.answer_question(user_id, selected_index)
 
-        is_correct = quiz_bot.answer_question(user_id, selected_index)
+    # Javobni ko'rsatish
+    if is_correct:
+        result_text = f"✅ {quiz_bot.get_text(user_id, 'correct_answer')}"
+    else:
+        q = quiz_bot.get_current_question(user_id)
+        if q is None:
+            return
+        correct_idx = q['correct_answer']
+        correct_text = q['options'][correct_idx] if 0 <= correct_idx < len(q['options']) else str(correct_idx)
+        wrong_text = quiz_bot.get_text(user_id, 'wrong_answer')
+        result_text = f"❌ {wrong_text}\n\n✅ To'g'ri javob: {correct_text}"
+    
+    # Javobni ko'rsatish va kutish
+    try:
+        await query.edit_message_text(result_text)
+    except Exception as e:
+        logger.error(f"Javob ko'rsatishda xatolik: {e}")
+    
+    # Kutib keyingi savolga o'tish - taymerga qo'yiladi, handler darhol bo'shaydi
+    answered_index = quiz_bot.user_sessions.peek(user_id).current_question
+    transitions.schedule(
+        user_id, ANSWER_FEEDBACK_DELAY,
+        lambda: advance_after_answer(update, query, context, user_id, answered_index)
+    )
 
-        # Javobni ko'rsatish
-        if is_correct:
-            result_text = f"✅ {quiz_bot.get_text(user_id, 'correct_answer')}"
-        else:
-            q = quiz_bot.get_current_question(user_id)
-            # Correct answer indeksini topish
-            if isinstance(q['correct_answer'], str):
-                if q['correct_answer'] in ['A', 'B', 'C', 'D']:
-                    correct_idx = ord(q['correct_answer']) - ord('A')  # A=0, B=1, C=2, D=3
-                else:
-                    try:
-                        correct_idx = int(q['correct_answer'])
-                    except ValueError:
-                        correct_idx = 0
-            else:
-                correct_idx = q['correct_answer']
-            
-            correct_text = q['options'][correct_idx] if 0 <= correct_idx < len(q['options']) else str(correct_idx)
-            wrong_text = quiz_bot.get_text(user_id, 'wrong_answer')
-            result_text = f"❌ {wrong_text}\n\n✅ To'g'ri javob: {correct_text}"
-        
-        # Javobni ko'rsatish va kutish
-        try:
-            await query.edit_message_text(result_text)
-        except Exception as e:
-            logger.error(f"Javob ko'rsatishda xatolik: {e}")
-        
-        # 2.5 soniya kutish va keyingi savolga o'tish
-        import asyncio
-        await asyncio.sleep(2.5)
-        
-        # Keyingi savolga o'tish
-        try:
-            await show_next_question(query, context, user_id)
-        except Exception as e:
-            logger.error(f"Keyingi savolga o'tishda xatolik: {e}")
-            # Agar xatolik bo'lsa, savolni qayta ko'rsatish
-            await show_question(update, context, user_id)
-        return
-    
-    # Navigation tugmalari
-    if data == "next":
-        if not quiz_bot.is_quiz_finished(user_id):
-            quiz_bot.next_question(user_id)
-            if quiz_bot.is_quiz_finished(user_id):
-                await show_results(query, context, user_id)
-            else:
-                await show_question(update, context, user_id)
-        else:
+@callbacks.route(router.NEXT)
+async def on_next(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Keyingi savol"""
+    query = update.callback_query
+    user_id = query.from_user.id
+    if not quiz_bot.is_quiz_finished(user_id):
+        quiz_bot.next_question(user_id)
+        if quiz_bot.is_quiz_finished(user_id):
             await show_results(query, context, user_id)
-        return
-    
-    if data == "prev":
-        if quiz_bot.previous_question(user_id):
+        else:
             await show_question(update, context, user_id)
-        return
-    
-    if data == "restart":
-        session = quiz_bot.user_sessions.get(user_id, {})
-        subject = session.get('subject', 'aviation')
-        quiz_bot.start_new_quiz(user_id, subject)
+    else:
+        await show_results(query, context, user_id)
+
+@callbacks.route(router.PREV)
+async def on_prev(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Oldingi savol"""
+    user_id = update.callback_query.from_user.id
+    if quiz_bot.previous_question(user_id):
         await show_question(update, context, user_id)
-        return
-    
-    # Admin funksiyalari
-    if data == "admin_panel":
-        await show_admin_panel(update, context)
-        return
-    
-    if data == "admin_broadcast":
-        await start_broadcast(update, context)
-        return
-    
-    if data == "admin_statistics":
-        stats = db.get_stats_summary()
-        stats_text = f"""📊 **Bot Statistikasi**
+
+@callbacks.route(router.RESTART)
+async def on_restart(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Testni qaytadan boshlash"""
+    user_id = update.callback_query.from_user.id
+    session = quiz_bot.user_sessions.peek(user_id)
+    subject = session.subject if session and session.subject else 'aviation'
+    await prepare_quiz(user_id, subject)
+    quiz_bot.start_new_quiz(user_id, subject)
+    await show_question(update, context, user_id)
+
+# Admin funksiyalari
+def admin_only(update: Update):
+    """Admin marshrutlari uchun guard: router so'rovga shu matn bilan javob beradi"""
+    if update.effective_user.id != ADMIN_USER_ID:
+        return "❌ Sizda admin huquqi yo'q!"
+    return None
+
+@callbacks.route(router.ADMIN_PANEL, guard=admin_only)
+async def on_admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await show_admin_panel(update, context)
+
+@callbacks.route(router.ADMIN_BROADCAST, guard=admin_only)
+async def on_admin_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await start_broadcast(update, context)
+
+@callbacks.route(router.ADMIN_STATISTICS, guard=admin_only)
+async def on_admin_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin statistikasi"""
+    stats = await storage.get_stats_summary()
+    stats_text = f"""📊 **Bot Statistikasi**
 
 👥 Jami foydalanuvchilar: {stats['unique_users']}
 📝 Boshlangan testlar: {stats['total_tests']}
@@ -606,39 +537,65 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 🏆 **Eng faol foydalanuvchilar:**
 """
-        for i, (uid, first_name, username, tests) in enumerate(stats['top_users'], 1):
-            uname = f"@{username}" if username else "Noma'lum"
-            stats_text += f"{i}. {first_name} ({uname}) - {tests} ta test\n"
-        
-        keyboard = [
-            [InlineKeyboardButton("🔧 Admin Panel", callback_data="admin_panel")],
-            [InlineKeyboardButton("🏠 Asosiy Menyu", callback_data="back_to_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.callback_query.edit_message_text(stats_text, reply_markup=reply_markup, parse_mode='Markdown')
-        return
+    for i, (uid, first_name, username, tests) in enumerate(stats['top_users'], 1):
+        uname = f"@{username}" if username else "Noma'lum"
+        stats_text += f"{i}. {first_name} ({uname}) - {tests} ta test\n"
+    
+    render = question_renders.stats()
+    stats_text += f"\n🖼 Savollar keshi: {render['size']} ta, hit {render['hit_rate']*100:.1f}%\n"
+    sessions = quiz_bot.user_sessions.stats()
+    stats_text += (f"💾 Sessiyalar: {sessions['resident']} ta xotirada, chiqarilgan TTL {sessions['evictions_ttl']} / "
+                   f"LRU {sessions['evictions_lru']}, qayta yuklangan {sessions['reloads']}\n")
+    
+    await update.callback_query.edit_message_text(stats_text, reply_markup=ADMIN_BACK_MARKUP, parse_mode='Markdown')
+
+@callbacks.route(router.ADMIN_USERS, guard=admin_only)
+async def on_admin_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Foydalanuvchilar ro'yxati"""
+    users = await storage.get_all_users()
+    users_text = f"👥 **Barcha Foydalanuvchilar** ({len(users)} ta)\n\n"
+    for i, (uid, first_name, username) in enumerate(users[:20], 1):  # Faqat birinchi 20 ta
+        uname = f"@{username}" if username else "Noma'lum"
+        users_text += f"{i}. {first_name} ({uname}) - ID: {uid}\n"
     
-    if data == "admin_users":
-        users = db.get_all_users()
-        users_text = f"👥 **Barcha Foydalanuvchilar** ({len(users)} ta)\n\n"
-        for i, (uid, first_name, username) in enumerate(users[:20], 1):  # Faqat birinchi 20 ta
-            uname = f"@{username}" if username else "Noma'lum"
-            users_text += f"{i}. {first_name} ({uname}) - ID: {uid}\n"
-        
-        if len(users) > 20:
-            users_text += f"\n... va yana {len(users)-20} ta foydalanuvchi"
-        
-        keyboard = [
-            [InlineKeyboardButton("🔧 Admin Panel", callback_data="admin_panel")],
-            [InlineKeyboardButton("🏠 Asosiy Menyu", callback_data="back_to_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.callback_query.edit_message_text(users_text, reply_markup=reply_markup, parse_mode='Markdown')
-        return
+    if len(users) > 20:
+        users_text += f"\n... va yana {len(users)-20} ta foydalanuvchi"
     
-    if data == "back_to_menu":
-        await show_main_menu(update, context, user_id)
+    await update.callback_query.edit_message_text(users_text, reply_markup=ADMIN_BACK_MARKUP, parse_mode='Markdown')
+
+@callbacks.route(router.ADMIN_RELOAD, guard=admin_only)
+async def on_admin_reload(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Savollar banklarini qayta yuklash"""
+    query = update.callback_query
+    reload_text = await reload_question_banks()
+    await query.edit_message_text(reload_text, reply_markup=ADMIN_BACK_MARKUP)
+
+@callbacks.route(router.ADMIN_PROFILE, guard=admin_only)
+async def on_admin_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """CPU profil (standart davomiylik)"""
+    query = update.callback_query
+    await query.edit_message_text(start_profile(context, query.message.chat_id, 'cpu', profiling.PROFILE_DEFAULT_SECONDS),
+                                  reply_markup=ADMIN_BACK_MARKUP)
+
+@callbacks.route(router.ADMIN_MEMORY, guard=admin_only)
+async def on_admin_memory(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Xotira profili (standart davomiylik)"""
+    query = update.callback_query
+    await query.edit_message_text(start_profile(context, query.message.chat_id, 'memory', profiling.PROFILE_DEFAULT_SECONDS),
+                                  reply_markup=ADMIN_BACK_MARKUP)
+
+async def advance_after_answer(update, query, context, user_id, answered_index):
+    """Javob ko'rsatilgandan keyin keyingi savolga o'tish"""
+    session = quiz_bot.user_sessions.peek(user_id)
+    # Kutish davomida foydalanuvchi boshqa joyga o'tgan bo'lsa, hech narsa qilmaymiz
+    if not session or session.state != 'quiz' or session.current_question != answered_index:
         return
+    try:
+        await show_next_question(query, context, user_id)
+    except Exception as e:
+        logger.error(f"Keyingi savolga o'tishda xatolik: {e}")
+        # Agar xatolik bo'lsa, savolni qayta ko'rsatish
+        await show_question(update, context, user_id)
 
 async def show_first_question(query, context, user_id):
     """Birinchi savolni ko'rsatish"""
@@ -673,10 +630,10 @@ async def show_results(query, context, user_id):
     
     # Test tugaganligi haqida loglash
     user = query.from_user
-    session = quiz_bot.user_sessions.get(user_id, {})
-    subject = session.get('subject', 'unknown')
+    session = quiz_bot.user_sessions.peek(user_id)
+    subject = session.subject if session and session.subject else 'unknown'
     
-    db.log_activity(
+    activity_log.log(
         user_id,
         user.username,
         user.first_name,
@@ -700,12 +657,7 @@ async def show_results(query, context, user_id):
     else:
         result_text += quiz_bot.get_text(user_id, 'poor')
     
-    keyboard = [[
-        InlineKeyboardButton(quiz_bot.get_text(user_id, 'restart'), callback_data="restart"),
-        InlineKeyboardButton(quiz_bot.get_text(user_id, 'back_to_menu'), callback_data="main_menu")
-    ]]
-    
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = quiz_bot.keyboards.results(quiz_bot.get_language(user_id))
     
     await query.edit_message_text(
         result_text,
@@ -740,37 +692,100 @@ async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Sizda bu komandani ishlatish huquqi yo'q!")
         return
     
-    s = db.get_stats_summary()
-    if not s:
-        await update.message.reply_text("📊 Hozircha statistik ma'lumot yo'q")
+    await update.message.reply_text(format_stats_summary(await storage.get_stats_summary()))
+
+async def reload_question_banks(force: bool = False) -> str:
+    """Bank fayllarini qayta o'qish va natija matnini qaytarish"""
+    try:
+        results = await storage.run(question_bank.reload_banks, BASE_DIR, QUESTIONS_ARTIFACT, None, force)
+    except Exception as e:
+        logger.error(f"Banklarni qayta yuklashda xatolik: {e}")
+        return f"❌ Xatolik: {e}"
+    
+    if not results:
+        return "✅ Savollar banklari o'zgarmagan"
+    
+    await publish_banks_reloaded(results)
+    reload_text = "🔄 Savollar banklari yangilandi:\n\n"
+    for subject, r in results.items():
+        reload_text += f"{subject}: +{r['inserted']} ✏️{r['updated']} ➖{r['deleted']}\n"
+    return reload_text
+
+async def publish_banks_reloaded(results):
+    """Boshqa workerlarga o'zgargan fanlarni xabar qilish"""
+    subjects = [subject for subject, r in results.items() if any(r.values())]
+    if subjects:
+        await control.publish('banks_reloaded', subjects=subjects)
+
+@control.on('banks_reloaded')
+async def on_banks_reloaded(payload):
+    """Boshqa worker banklarni yangiladi - o'zimizdagi keshni qayta qurish"""
+    await storage.run(question_bank.refresh, payload['subjects'])
+    logger.info(f"Banklar boshqa workerda yangilandi: {payload['subjects']}")
+
+async def admin_reload(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Savollar banklarini botni to'xtatmasdan qayta yuklash (/reload [force])"""
+    if update.effective_user.id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ Sizda bu komandani ishlatish huquqi yo'q!")
         return
+    
+    force = bool(context.args) and context.args[0] == 'force'
+    await update.message.reply_text(await reload_question_banks(force))
+
+PROFILERS = {
+    'cpu': profiling.cpu_profile,
+    'sample': profiling.sample_profile,
+    'memory': profiling.memory_diff
+}
+
+def start_profile(context: ContextTypes.DEFAULT_TYPE, chat_id: int, kind: str, seconds: float) -> str:
+    """Profilni fonda boshlash (handler kutib turmaydi); natija hujjat sifatida keladi"""
+    if profiling.is_busy():
+        return "⏳ Profil allaqachon ishlayapti, tugashini kuting"
+    context.application.create_task(send_profile(context.bot, chat_id, kind, seconds))
+    return f"⏱ {kind} profil boshlandi: {seconds:g} soniya. Hisobot fayl sifatida yuboriladi."
+
+async def send_profile(bot, chat_id: int, kind: str, seconds: float):
+    try:
+        report = await PROFILERS[kind](seconds)
+    except profiling.ProfilerBusy:
+        await bot.send_message(chat_id, "⏳ Profil allaqachon ishlayapti, tugashini kuting")
+        return
+    except Exception as e:
+        logger.error(f"Profillashda xatolik: {e}")
+        await bot.send_message(chat_id, f"❌ Profillashda xatolik: {e}")
+        return
+    await bot.send_document(chat_id, document=report.encode('utf-8'),
+                            filename=profiling.report_filename(kind), caption=f"📄 {kind} profil, {seconds:g}s")
 
-    unique_users = s.get('unique_users', 0)
-    total_tests = s.get('total_tests', 0)
-    completed_tests = s.get('completed_tests', 0)
-    top = s.get('top_users', [])
-
-    stats_text = f"📊 Bot Statistikasi\n\n👥 Jami foydalanuvchilar: {unique_users}\n📝 Boshlangan testlar: {total_tests}\n✅ Tugallangan testlar: {completed_tests}\n\n🏆 Eng faol foydalanuvchilar:\n"
-    for i, row in enumerate(top, 1):
-        uid, name, username, tests = row
-        uname = f"@{username}" if username else "Noma'lum"
-        stats_text += f"{i}. {name} ({uname}) - {tests} ta test\n"
-
-    await update.message.reply_text(stats_text)
+async def admin_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ishlab turgan botni profillash: /profile [soniya] [sample]"""
+    if update.effective_user.id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ Sizda bu komandani ishlatish huquqi yo'q!")
+        return
+    args = context.args or []
+    kind = 'sample' if 'sample' in args else 'cpu'
+    seconds = profiling.parse_seconds(next((a for a in args if a != 'sample'), None))
+    await update.message.reply_text(start_profile(context, update.effective_chat.id, kind, seconds))
+
+async def admin_memprofile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Xotira o'sishi (tracemalloc snapshot farqi): /memprofile [soniya]"""
+    if update.effective_user.id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ Sizda bu komandani ishlatish huquqi yo'q!")
+        return
+    seconds = profiling.parse_seconds(context.args[0] if context.args else None)
+    await update.message.reply_text(start_profile(context, update.effective_chat.id, 'memory', seconds))
 
 async def show_admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Admin panelini ko'rsatish"""
-    user_id = update.effective_user.id
-    
-    if user_id != ADMIN_USER_ID:
-        await update.callback_query.answer("❌ Sizda admin huquqi yo'q!")
-        return
-    
     keyboard = [
-        [InlineKeyboardButton("📢 Broadcast Xabar", callback_data="admin_broadcast")],
-        [InlineKeyboardButton("📊 Statistika", callback_data="admin_statistics")],
-        [InlineKeyboardButton("👥 Barcha Foydalanuvchilar", callback_data="admin_users")],
-        [InlineKeyboardButton("🏠 Asosiy Menyu", callback_data="back_to_menu")]
+        [InlineKeyboardButton("📢 Broadcast Xabar", callback_data=router.encode(router.ADMIN_BROADCAST))],
+        [InlineKeyboardButton("📊 Statistika", callback_data=router.encode(router.ADMIN_STATISTICS))],
+        [InlineKeyboardButton("👥 Barcha Foydalanuvchilar", callback_data=router.encode(router.ADMIN_USERS))],
+        [InlineKeyboardButton("🔄 Savollarni yangilash", callback_data=router.encode(router.ADMIN_RELOAD))],
+        [InlineKeyboardButton("⏱ CPU profil", callback_data=router.encode(router.ADMIN_PROFILE)),
+         InlineKeyboardButton("🧠 Xotira profili", callback_data=router.encode(router.ADMIN_MEMORY))],
+        [InlineKeyboardButton("🏠 Asosiy Menyu", callback_data=router.encode(router.MAIN_MENU))]
     ]
     
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -780,19 +795,11 @@ async def show_admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def start_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Broadcast rejimini boshlash"""
-    user_id = update.effective_user.id
-    
-    if user_id != ADMIN_USER_ID:
-        await update.callback_query.answer("❌ Sizda admin huquqi yo'q!")
-        return
-    
     # Broadcast rejimini belgilash
-    if user_id not in quiz_bot.user_sessions:
-        quiz_bot.user_sessions[user_id] = {}
-    quiz_bot.user_sessions[user_id]['state'] = 'waiting_broadcast'
+    quiz_bot.user_sessions.get_or_create(update.effective_user.id).state = 'waiting_broadcast'
     
     keyboard = [
-        [InlineKeyboardButton("❌ Bekor qilish", callback_data="admin_panel")]
+        [InlineKeyboardButton("❌ Bekor qilish", callback_data=router.encode(router.ADMIN_PANEL))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
@@ -813,72 +820,118 @@ async def handle_broadcast_message(update: Update, context: ContextTypes.DEFAULT
     if user_id != ADMIN_USER_ID:
         return
     
-    session = quiz_bot.user_sessions.get(user_id, {})
-    if session.get('state') != 'waiting_broadcast':
+    session = quiz_bot.user_sessions.peek(user_id)
+    if session is None or session.state != 'waiting_broadcast':
         return
     
     broadcast_text = update.message.text
     
     # Barcha foydalanuvchilarni olish
-    all_users = db.get_all_users()
+    all_users = await storage.get_all_users()
     
-    sent_count = 0
-    failed_count = 0
+    progress_message = await update.message.reply_text(f"📤 Xabar yuborilmoqda... 0/{len(all_users)}")
     
-    progress_message = await update.message.reply_text("📤 Xabar yuborilmoqda...")
-    
-    for user_data in all_users:
-        target_user_id = user_data[0]  # user_id
-        try:
-            await context.bot.send_message(
-                chat_id=target_user_id,
-                text=f"📢 **Admin xabari:**\n\n{broadcast_text}",
-                parse_mode='Markdown'
-            )
-            sent_count += 1
-        except Exception as e:
-            failed_count += 1
-            logger.warning(f"Failed to send broadcast to {target_user_id}: {e}")
-    
-    # Natijani ko'rsatish
-    result_text = f"""✅ **Broadcast yakunlandi!**
-
-📤 Yuborildi: {sent_count} ta foydalanuvchi
-❌ Xato: {failed_count} ta foydalanuvchi
-📊 Jami: {len(all_users)} ta foydalanuvchi"""
-    
-    await progress_message.edit_text(result_text, parse_mode='Markdown')
+    # Yuborish fon rejimida, limitlar ichida; natija progress xabarida ko'rsatiladi
+    await broadcasts.start(
+        context.bot,
+        f"📢 **Admin xabari:**\n\n{broadcast_text}",
+        update.effective_chat.id,
+        progress_message.message_id,
+        [user_data[0] for user_data in all_users]
+    )
     
     # Broadcast rejimini tugatish
-    quiz_bot.user_sessions[user_id]['state'] = 'menu'
+    session.state = 'menu'
+    quiz_bot.user_sessions.mark_dirty(user_id)
     
     # Admin panelga qaytish tugmasi
-    keyboard = [
-        [InlineKeyboardButton("🔧 Admin Panel", callback_data="admin_panel")],
-        [InlineKeyboardButton("🏠 Asosiy Menyu", callback_data="back_to_menu")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text("Qaysi bo'limga qaytasiz?", reply_markup=reply_markup)
+    await update.message.reply_text("Qaysi bo'limga qaytasiz?", reply_markup=ADMIN_BACK_MARKUP)
+
+async def on_startup(application: Application):
+    """Ishga tushganda sessiyalarni saqlashni boshlash va broadcastlarni davom ettirish"""
+    quiz_bot.user_sessions.start()
+    quiz_bot.selector.start()
+    await application.bot_data['web_server'].start()
+    await control.start()
+    # Broadcastlarni faqat lease egasi bo'lgan worker yuboradi
+    broadcasts.start_coordinator(application.bot)
+    if STARTUP_MODE != 'eager':
+        application.bot_data['prewarm'] = asyncio.create_task(prewarm())
+    if BANK_WATCH_INTERVAL > 0:
+        # Fayllarni ham bitta worker kuzatadi, qolganlari control orqali yangilanadi
+        lease = coordination.Lease('bank_watcher', max(BANK_WATCH_INTERVAL * 3, 30))
+        application.bot_data['bank_watcher'] = asyncio.create_task(
+            question_bank.watch_banks(BASE_DIR, QUESTIONS_ARTIFACT, BANK_WATCH_INTERVAL,
+                                      lease=lease, on_reload=publish_banks_reloaded)
+        )
 
-def main():
-    """Botni ishga tushirish"""
-    # Application yaratish
-    application = Application.builder().token(BOT_TOKEN).build()
+async def on_shutdown(application: Application):
+    """To'xtashda kutilayotgan o'tishlar va broadcastlarni to'xtatish, sessiyalarni saqlash"""
+    for name in ('bank_watcher', 'prewarm'):
+        task = application.bot_data.pop(name, None)
+        if task is not None:
+            task.cancel()
+    await application.bot_data['web_server'].stop()
+    await control.shutdown()
+    await transitions.shutdown()
+    await broadcasts.shutdown()
+    await quiz_bot.user_sessions.shutdown()
+    await quiz_bot.selector.shutdown()
+
+def build_application(mode: str = webhook.BOT_MODE) -> Application:
+    """Handlerlar va HTTP server bilan Application yaratish (ishga tushirmasdan)"""
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(update_processor)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if BOT_API_BASE_URL:
+        builder.base_url(BOT_API_BASE_URL).base_file_url(BOT_API_BASE_URL.replace('/bot', '/file/bot', 1))
+    if metrics.ENABLED:
+        # Bot API so'rovlari metodi bo'yicha o'lchanadi (pool hajmi PTB standartidagidek)
+        builder.request(metrics.MetricsRequest(connection_pool_size=256))
+        builder.get_updates_request(metrics.MetricsRequest())
+    if mode == 'webhook':
+        # Webhook rejimida polling Updater kerak emas
+        builder.updater(None)
+    application = builder.build()
+    metrics.pending_updates.set_function(application.update_queue.qsize)
     
     # Handlerlarni qo'shish
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("myid", get_my_id))  # User ID olish
     application.add_handler(CommandHandler("stats", admin_stats))  # Admin statistika
-    application.add_handler(CallbackQueryHandler(button_handler))
+    application.add_handler(CommandHandler("reload", admin_reload))  # Savollarni qayta yuklash
+    application.add_handler(CommandHandler("profile", admin_profile))  # CPU profil
+    application.add_handler(CommandHandler("memprofile", admin_memprofile))  # Xotira profili
+    application.add_handlers(callbacks.handlers())  # Har bir tugma marshruti alohida handler
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_broadcast_message))
     
-    # Health check uchun web server (agar kerak bo'lsa)
-    port = int(os.getenv("PORT", 8080))
+    # HTTP server: /healthz va /metrics har doim, webhook endpoint faqat BOT_MODE=webhook bo'lsa
+    application.bot_data['web_server'] = webhook.BotServer(
+        application,
+        webhook=mode == 'webhook',
+        secret=webhook.WEBHOOK_SECRET or webhook.default_secret(BOT_TOKEN)
+    )
+    return application
+
+def main():
+    """Botni ishga tushirish"""
+    application = build_application()
     
     # Botni ishga tushirish
-    print("🤖 Bot ishga tushmoqda...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    print(f"🤖 Bot ishga tushmoqda ({webhook.BOT_MODE})...")
+    if webhook.BOT_MODE == 'webhook':
+        webhook.run_webhook(application, application.bot_data['web_server'])
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
+    
+    # Navbatdagi faoliyatlarni yozib, DB ulanishlarini yopish (WAL checkpoint)
+    activity_log.shutdown()
+    storage.shutdown()
+    db.close_connections()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,291 @@
+"""Broadcast xabarlarini yuborish mexanizmi.
+
+- Xabarlar parallel yuboriladi, lekin Telegram limitlari (global va har bir
+  chat uchun) ichida.
+- RetryAfter (flood control) kelsa, ko'rsatilgan vaqt kutiladi. Boshqa xatolarda
+  faqat so'rov Telegram'ga yetib bormagani aniq bo'lsa (ulanish o'rnatilmagan)
+  qayta yuboriladi; TimedOut va boshqa tarmoq xatolarida xabar yetkazilgan
+  bo'lishi mumkin, shuning uchun takror yubormasdan 'failed' deb yoziladi.
+- Har bir qabul qiluvchining holati yuborilgandan so'ng darhol (keyingisiga
+  o'tishdan oldin) SQLite'da saqlanadi, shuning uchun bot qayta ishga tushsa,
+  ish qolgan joyidan davom etadi. Faqat uzilish paytida yuborilayotgan
+  (ko'pi bilan CONCURRENCY ta) xabar takrorlanishi mumkin.
+- Progress xabari vaqti-vaqti bilan yangilanadi.
+- Bir nechta worker bo'lsa, broadcastlarni faqat 'broadcasts' lease egasi
+  yuboradi (global limit bitta jarayonda saqlanadi); boshqa worker yaratgan
+  broadcastni ega keyingi tekshiruvda oladi.
+"""
+import asyncio
+import functools
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+import db
+import storage
+from coordination import Lease
+
+logger = logging.getLogger(__name__)
+
+# Telegram: ~30 xabar/soniya global, 1 xabar/soniya bitta chatga
+GLOBAL_RATE = float(os.getenv('BROADCAST_GLOBAL_RATE', 25))
+PER_CHAT_INTERVAL = float(os.getenv('BROADCAST_PER_CHAT_INTERVAL', 1.0))
+CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', 20))
+PROGRESS_INTERVAL = float(os.getenv('BROADCAST_PROGRESS_INTERVAL', 5.0))
+# Lease muddati; egasi har ttl/3 soniyada yangilaydi va yangi broadcastlarni tekshiradi
+LEASE_TTL = float(os.getenv('BROADCAST_LEASE_TTL', 30))
+MAX_ATTEMPTS = 3
+# Shu xatolar so'rov yuborilishidan oldin yuz beradi - qayta urinish xavfsiz
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def _not_sent(error: TelegramError) -> bool:
+    """Tarmoq xatosi so'rov Telegram'ga yetib borishidan oldin yuz berganmi"""
+    return isinstance(error, NetworkError) and isinstance(error.__cause__, NOT_SENT_ERRORS)
+
+
+class RateLimiter:
+    """Token bucket + flood control pauzasi"""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class BroadcastJob:
+    """Bitta broadcast ishining yuborish jarayoni"""
+
+    def __init__(self, engine: 'BroadcastEngine', bot, broadcast_id: int, text: str, admin_chat_id: int,
+                 progress_message_id: int):
+        self.engine = engine
+        self.bot = bot
+        self.broadcast_id = broadcast_id
+        self.text = text
+        self.admin_chat_id = admin_chat_id
+        self.progress_message_id = progress_message_id
+        self.counts: Dict[str, int] = {}
+        self._chat_next: Dict[int, float] = {}
+        self._last_progress = None
+
+    async def _record(self, user_id: int, status: str, error: str = None):
+        # Natija saqlanmaguncha worker keyingi qabul qiluvchiga o'tmaydi
+        try:
+            await storage.run(db.mark_recipients, self.broadcast_id, [(user_id, status, error)])
+        except Exception as e:
+            # DB xatosi butun ishni to'xtatmasligi kerak; qabul qiluvchi DB'da 'pending'
+            # bo'lib qoladi va faqat shu bittasi qayta ishga tushishda takrorlanishi mumkin
+            logger.error(f"Broadcast {self.broadcast_id}: {user_id} natijasini saqlab bo'lmadi: {e}")
+        self.counts[status] = self.counts.get(status, 0) + 1
+        self.counts['pending'] -= 1
+
+    async def _deliver(self, user_id: int) -> Tuple[str, Optional[str]]:
+        """Xabarni yuborish; (holat, xato matni) qaytaradi"""
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            # Bitta chatga qayta urinishlar orasida per-chat limit
+            wait = self._chat_next.get(user_id, 0) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await self.engine.limiter.acquire()
+            self._chat_next[user_id] = time.monotonic() + PER_CHAT_INTERVAL
+            try:
+                await self.bot.send_message(chat_id=user_id, text=self.text, parse_mode='Markdown')
+                return 'sent', None
+            except RetryAfter as e:
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                logger.warning(f"Flood control: {retry_after}s kutiladi")
+                self.engine.limiter.pause(retry_after)
+                if attempt == MAX_ATTEMPTS:
+                    return 'failed', str(e)
+            except (Forbidden, BadRequest) as e:
+                # Bot bloklangan yoki chat topilmadi - qayta urinish foydasiz
+                return 'failed', str(e)
+            except TelegramError as e:
+                if not _not_sent(e):
+                    # TimedOut va h.k.: xabar yetkazilgan bo'lishi mumkin - takror yubormaymiz
+                    logger.warning(f"Broadcast {user_id} ga yetkazilgani noma'lum: {e!r}")
+                    return 'failed', f"yetkazilgani noma'lum: {e!r}"
+                if attempt == MAX_ATTEMPTS:
+                    logger.warning(f"Failed to send broadcast to {user_id}: {e}")
+                    return 'failed', str(e)
+
+    async def _send(self, user_id: int):
+        try:
+            status, error = await self._deliver(user_id)
+        except Exception as e:
+            logger.error(f"Broadcast {self.broadcast_id}: {user_id} ga yuborishda kutilmagan xatolik: {e!r}")
+            status, error = 'failed', repr(e)
+        finally:
+            self._chat_next.pop(user_id, None)
+        await self._record(user_id, status, error)
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            try:
+                user_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await self._send(user_id)
+
+    async def _progress_loop(self):
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            text = self.progress_text()
+            # Telegram o'zgarmagan matnni tahrirlashni rad etadi
+            if text != self._last_progress:
+                self._last_progress = text
+                await self._edit_progress(text)
+
+    def progress_text(self) -> str:
+        done = self.counts.get('sent', 0) + self.counts.get('failed', 0)
+        total = done + self.counts.get('pending', 0)
+        return f"📤 Xabar yuborilmoqda... {done}/{total}\n✅ {self.counts.get('sent', 0)}  ❌ {self.counts.get('failed', 0)}"
+
+    def result_text(self) -> str:
+        sent = self.counts.get('sent', 0)
+        failed = self.counts.get('failed', 0)
+        return f"""✅ **Broadcast yakunlandi!**
+
+📤 Yuborildi: {sent} ta foydalanuvchi
+❌ Xato: {failed} ta foydalanuvchi
+📊 Jami: {sent + failed} ta foydalanuvchi"""
+
+    async def _edit_progress(self, text: str, parse_mode: str = None):
+        if not self.progress_message_id:
+            return
+        try:
+            await self.bot.edit_message_text(text, chat_id=self.admin_chat_id,
+                                             message_id=self.progress_message_id, parse_mode=parse_mode)
+        except TelegramError as e:
+            logger.debug(f"Progress xabarini yangilab bo'lmadi: {e}")
+
+    async def run(self):
+        self.counts = await storage.run(db.get_broadcast_counts, self.broadcast_id)
+        pending = await storage.run(db.get_pending_recipients, self.broadcast_id)
+        self.counts['pending'] = len(pending)
+        queue = asyncio.Queue()
+        for user_id in pending:
+            queue.put_nowait(user_id)
+
+        progress = asyncio.create_task(self._progress_loop())
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(min(CONCURRENCY, len(pending)) or 1)]
+        try:
+            # Bitta worker yiqilsa, qolganlari ham to'xtatiladi: aks holda ish _jobs'dan
+            # chiqib, resume uni qayta boshlaganda yetim workerlar yuborishda davom etardi
+            done, _ = await asyncio.wait(workers, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+        finally:
+            progress.cancel()
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        await storage.run(db.finish_broadcast, self.broadcast_id, datetime.now().isoformat())
+        await self._edit_progress(self.result_text(), parse_mode='Markdown')
+        logger.info(f"Broadcast {self.broadcast_id} yakunlandi: {self.counts}")
+
+
+class BroadcastEngine:
+    """Broadcast ishlarini fon rejimida boshqarish"""
+
+    def __init__(self, rate: float = GLOBAL_RATE, lease_ttl: float = LEASE_TTL):
+        self.limiter = RateLimiter(rate)
+        self.lease = Lease('broadcasts', lease_ttl)
+        self._jobs: Dict[int, asyncio.Task] = {}
+        self._coordinator = None
+
+    def _spawn(self, job: BroadcastJob) -> bool:
+        # start() va coordinator (resume) bitta broadcastni ikki marta boshlamasligi uchun
+        if job.broadcast_id in self._jobs:
+            return False
+        task = asyncio.create_task(job.run())
+        self._jobs[job.broadcast_id] = task
+        task.add_done_callback(functools.partial(self._done, job.broadcast_id))
+        return True
+
+    def _done(self, broadcast_id: int, task: asyncio.Task):
+        if self._jobs.get(broadcast_id) is task:
+            del self._jobs[broadcast_id]
+        if not task.cancelled() and task.exception():
+            logger.error(f"Broadcast xatolik bilan tugadi: {task.exception()}")
+
+    async def start(self, bot, text: str, admin_chat_id: int, progress_message_id: int, user_ids: List[int]) -> int:
+        """Yangi broadcast yaratib, fon rejimida yuborishni boshlash"""
+        broadcast_id = await storage.run(db.create_broadcast, text, admin_chat_id, progress_message_id,
+                                         user_ids, datetime.now().isoformat())
+        if await self.lease.hold():
+            self._spawn(BroadcastJob(self, bot, broadcast_id, text, admin_chat_id, progress_message_id))
+        else:
+            logger.info(f"Broadcast {broadcast_id} lease egasi bo'lgan worker tomonidan yuboriladi")
+        return broadcast_id
+
+    async def resume(self, bot) -> int:
+        """Lease egasi bo'lsa, hali ishlamayotgan tugallanmagan broadcastlarni davom ettirish"""
+        if not await self.lease.hold():
+            # Lease boshqa workerda - o'zimizdagi ishlarni to'xtatamiz (holat DB'da saqlangan)
+            for task in list(self._jobs.values()):
+                task.cancel()
+            return 0
+        unfinished = await storage.run(db.get_unfinished_broadcasts)
+        started = 0
+        for broadcast_id, text, admin_chat_id, progress_message_id in unfinished:
+            if broadcast_id in self._jobs:
+                continue
+            logger.info(f"Broadcast {broadcast_id} davom ettirilmoqda")
+            started += self._spawn(BroadcastJob(self, bot, broadcast_id, text, admin_chat_id, progress_message_id))
+        return started
+
+    async def _coordinate(self, bot):
+        while True:
+            try:
+                await self.resume(bot)
+            except Exception as e:
+                logger.error(f"Broadcastlarni tekshirishda xatolik: {e}")
+            await asyncio.sleep(self.lease.ttl / 3)
+
+    def start_coordinator(self, bot):
+        """Lease'ni ushlab turish va tugallanmagan broadcastlarni davom ettirish (fon rejimida)"""
+        if self._coordinator is None:
+            self._coordinator = asyncio.create_task(self._coordinate(bot))
+
+    def running(self) -> int:
+        return len(self._jobs)
+
+    async def shutdown(self):
+        """Ishlarni to'xtatish (holat saqlangan, keyingi ishga tushishda yoki boshqa worker davom ettiradi)"""
+        if self._coordinator is not None:
+            self._coordinator.cancel()
+            await asyncio.gather(self._coordinator, return_exceptions=True)
+            self._coordinator = None
+        tasks = list(self._jobs.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await self.lease.release()
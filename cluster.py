@@ -0,0 +1,308 @@
+"""Botni bir nechta worker jarayonida ishga tushirish (supervisor).
+
+    python cluster.py --workers 4
+
+Supervisor update'larni Telegram'dan oladi (polling yoki BOT_MODE=webhook) va
+har birini user_id bo'yicha bitta workerga yuboradi: bitta foydalanuvchining
+barcha update'lari doim bitta workerga, kelish tartibida boradi. Shuning uchun
+sessiyalar worker xotirasida izchil qoladi, umumiy holat esa SQLite'da (WAL).
+
+Workerlar oddiy `bot_new.py` jarayonlari: 127.0.0.1 dagi ichki webhook
+portida ishlaydi (WORKER_BASE_PORT + indeks). Broadcast va bank kuzatuvchini
+lease orqali bitta worker bajaradi, admin amallari control_events orqali
+boshqalarga yetkaziladi (coordination.py). To'xtagan worker qayta ishga
+tushiriladi; shu vaqt ichida uning update'lari navbatda kutadi.
+"""
+import argparse
+import asyncio
+import hmac
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import List, Optional
+
+import aiohttp
+from aiohttp import web
+from dotenv import load_dotenv
+
+import db
+import question_bank
+import webhook
+
+load_dotenv()
+
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger('cluster')
+
+BOT_TOKEN = os.getenv("BOT_TOKEN", "YOUR_BOT_TOKEN_HERE")
+BOT_API_BASE_URL = os.getenv("BOT_API_BASE_URL", "") or "https://api.telegram.org/bot"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+QUESTIONS_ARTIFACT = os.getenv("QUESTIONS_ARTIFACT", os.path.join(BASE_DIR, 'questions.bin'))
+
+WORKERS = int(os.getenv('WORKERS', os.cpu_count() or 1))
+WORKER_BASE_PORT = int(os.getenv('WORKER_BASE_PORT', 9100))
+# Bitta worker navbatidagi update'lar chegarasi (to'lsa intake sekinlashadi)
+WORKER_QUEUE_SIZE = int(os.getenv('WORKER_QUEUE_SIZE', 10000))
+POLL_TIMEOUT = int(os.getenv('POLL_TIMEOUT', 30))
+RESTART_BACKOFF_MIN = 1.0
+RESTART_BACKOFF_MAX = 30.0
+# Worker shuncha soniya uzluksiz ishlasa, qayta ishga tushirish kechikishi boshlang'ich qiymatga qaytadi
+RESTART_STABLE_SECONDS = float(os.getenv('RESTART_STABLE_SECONDS', 60))
+
+
+def update_user_id(update: dict) -> int:
+    """Update kimga tegishli (scheduling.update_key'ning JSON ko'rinishi)"""
+    for key, value in update.items():
+        if key == 'update_id' or not isinstance(value, dict):
+            continue
+        user = value.get('from') or value.get('user')
+        if isinstance(user, dict) and 'id' in user:
+            return user['id']
+        chat = value.get('chat') or (value.get('message') or {}).get('chat')
+        if isinstance(chat, dict) and 'id' in chat:
+            return chat['id']
+    return 0
+
+
+def shard_for(update: dict, workers: int) -> int:
+    return update_user_id(update) % workers
+
+
+class Worker:
+    """Bitta bot_new.py jarayoni va unga update yuboruvchi navbat"""
+
+    def __init__(self, index: int, count: int, secret: str):
+        self.index = index
+        self.count = count
+        self.secret = secret
+        self.port = WORKER_BASE_PORT + index
+        self.url = f"http://127.0.0.1:{self.port}{webhook.WEBHOOK_PATH}"
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WORKER_QUEUE_SIZE)
+        self.process: Optional[subprocess.Popen] = None
+        self.restarts = 0
+        self.forwarded = 0
+        self.backoff = RESTART_BACKOFF_MIN
+        self.started_at = 0.0
+        self.restart_at: Optional[float] = None  # to'xtagan worker qachon qayta ishga tushiriladi
+
+    def spawn(self):
+        env = dict(os.environ,
+                   BOT_MODE='webhook',
+                   WEBHOOK_URL='',  # setWebhook'ni faqat supervisor chaqiradi
+                   WEBHOOK_LISTEN='127.0.0.1',
+                   WEBHOOK_SECRET=self.secret,
+                   PORT=str(self.port),
+                   WORKER_INDEX=str(self.index),
+                   WORKER_COUNT=str(self.count))
+        self.process = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, 'bot_new.py')],
+                                        env=env, cwd=os.getcwd())
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        logger.info(f"Worker {self.index} ishga tushdi (pid {self.process.pid}, port {self.port})")
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    async def forward(self, session: aiohttp.ClientSession):
+        """Navbatdagi update'larni tartib bilan yuborish; worker tayyor bo'lmasa qayta urinish"""
+        headers = {webhook.SECRET_HEADER: self.secret, 'Content-Type': 'application/json'}
+        while True:
+            body = await self.queue.get()
+            delay = 0.1
+            while True:
+                try:
+                    async with session.post(self.url, data=body, headers=headers) as response:
+                        if response.status == 200:
+                            break
+                        if response.status in (400, 403):
+                            logger.error(f"Worker {self.index} update'ni rad etdi: {response.status}")
+                            break
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass
+                # Worker qayta ishga tushmoqda yoki draining (503) - tartibni buzmay kutamiz
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 2.0)
+            self.forwarded += 1
+            self.queue.task_done()
+
+    def terminate(self):
+        if self.alive():
+            self.process.send_signal(signal.SIGTERM)
+
+
+class Supervisor:
+    def __init__(self, workers: int, mode: str = webhook.BOT_MODE):
+        self.mode = mode
+        self.secret = webhook.WEBHOOK_SECRET or webhook.default_secret(BOT_TOKEN)
+        self.workers: List[Worker] = [Worker(i, workers, self.secret) for i in range(workers)]
+        self.stopping = False
+        self._tasks: List[asyncio.Task] = []
+        self._runner: Optional[web.AppRunner] = None
+
+    def api_url(self, method: str) -> str:
+        return f"{BOT_API_BASE_URL}{BOT_TOKEN}/{method}"
+
+    async def dispatch(self, body: bytes):
+        """Update'ni user_id bo'yicha tegishli worker navbatiga qo'yish"""
+        update = json.loads(body)
+        await self.workers[shard_for(update, len(self.workers))].queue.put(body)
+
+    # --- Update'larni qabul qilish ---
+
+    async def poll(self, session: aiohttp.ClientSession):
+        await session.post(self.api_url('deleteWebhook'))
+        offset = 0
+        while not self.stopping:
+            try:
+                async with session.post(self.api_url('getUpdates'),
+                                        json={'offset': offset, 'timeout': POLL_TIMEOUT},
+                                        timeout=aiohttp.ClientTimeout(total=POLL_TIMEOUT + 10)) as response:
+                    data = await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+                logger.warning(f"getUpdates xatolik: {e}")
+                await asyncio.sleep(1)
+                continue
+            if not data.get('ok'):
+                logger.warning(f"getUpdates: {data}")
+                await asyncio.sleep(data.get('parameters', {}).get('retry_after', 1))
+                continue
+            for update in data['result']:
+                offset = update['update_id'] + 1
+                await self.workers[shard_for(update, len(self.workers))].queue.put(json.dumps(update))
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(webhook.SECRET_HEADER, ''), self.secret):
+            return web.Response(status=403)
+        if self.stopping:
+            return web.Response(status=503)
+        try:
+            await self.dispatch(await request.read())
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return web.Response(status=400)
+        return web.Response()
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        workers = [{
+            'index': w.index,
+            'alive': w.alive(),
+            'queued': w.queue.qsize(),
+            'forwarded': w.forwarded,
+            'restarts': w.restarts
+        } for w in self.workers]
+        healthy = not self.stopping and all(w['alive'] for w in workers)
+        return web.json_response({'status': 'ok' if healthy else 'degraded', 'mode': self.mode, 'workers': workers},
+                                 status=200 if healthy else 503)
+
+    # --- Workerlarni kuzatish ---
+
+    def check_workers(self, now: float):
+        """Har bir worker o'z kechikishi bilan, boshqalarini kutmasdan qayta ishga tushiriladi"""
+        for w in self.workers:
+            if self.stopping:
+                return
+            if w.alive():
+                if w.backoff > RESTART_BACKOFF_MIN and now - w.started_at >= RESTART_STABLE_SECONDS:
+                    w.backoff = RESTART_BACKOFF_MIN
+                continue
+            if w.restart_at is None:
+                w.restart_at = now + w.backoff
+                logger.error(f"Worker {w.index} to'xtadi (kod {w.process.returncode}), "
+                             f"{w.backoff:.0f}s dan keyin qayta ishga tushiriladi")
+                w.backoff = min(w.backoff * 2, RESTART_BACKOFF_MAX)
+            elif now >= w.restart_at:
+                w.restarts += 1
+                w.spawn()
+
+    async def monitor(self):
+        while not self.stopping:
+            await asyncio.sleep(0.5)
+            self.check_workers(time.monotonic())
+
+    async def run(self):
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        for w in self.workers:
+            w.spawn()
+
+        app = web.Application()
+        app.router.add_get('/healthz', self.handle_health)
+        if self.mode == 'webhook':
+            app.router.add_post(webhook.WEBHOOK_PATH, self.handle_update)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, webhook.WEBHOOK_LISTEN, webhook.PORT).start()
+
+        async with aiohttp.ClientSession() as session:
+            self._tasks = [asyncio.create_task(w.forward(session)) for w in self.workers]
+            self._tasks.append(asyncio.create_task(self.monitor()))
+            intake = None
+            if self.mode == 'webhook':
+                if webhook.WEBHOOK_URL:
+                    await session.post(self.api_url('setWebhook'), json={
+                        'url': webhook.WEBHOOK_URL.rstrip('/') + webhook.WEBHOOK_PATH,
+                        'secret_token': self.secret,
+                        'max_connections': webhook.WEBHOOK_MAX_CONNECTIONS
+                    })
+            else:
+                intake = asyncio.create_task(self.poll(session))
+            logger.info(f"Supervisor: {len(self.workers)} worker, rejim {self.mode}, port {webhook.PORT}")
+
+            await stop_event.wait()
+            await self.shutdown(intake)
+
+    async def shutdown(self, intake: Optional[asyncio.Task]):
+        """Yangi update olishni to'xtatish, navbatlarni workerlarga yetkazish, workerlarni to'xtatish"""
+        self.stopping = True
+        if intake is not None:
+            intake.cancel()
+            await asyncio.gather(intake, return_exceptions=True)
+        deadline = time.monotonic() + webhook.WEBHOOK_DRAIN_TIMEOUT
+        while any(w.queue.qsize() for w in self.workers) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for w in self.workers:
+            w.terminate()
+        for w in self.workers:
+            if w.process is not None:
+                await asyncio.get_running_loop().run_in_executor(None, w.process.wait)
+        await self._runner.cleanup()
+        logger.info("Supervisor to'xtadi")
+
+
+def prepare_shared_state():
+    """Umumiy DB'ni workerlar ishga tushishidan oldin bir marta tayyorlash"""
+    db.init_db()
+    question_bank.reload_banks(BASE_DIR, QUESTIONS_ARTIFACT)
+    db.import_stats_json(os.path.join(BASE_DIR, 'user_stats.json'))
+    db.close_connections()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Botni bir nechta worker jarayonida ishga tushirish")
+    parser.add_argument('--workers', type=int, default=WORKERS, help="worker jarayonlar soni")
+    args = parser.parse_args()
+
+    prepare_shared_state()
+    try:
+        asyncio.run(Supervisor(max(1, args.workers)).run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Savollar banklarini tekshirish va questions.bin ga kompilyatsiya qilish.
+
+Barcha questions_*.json fayllari tekshiriladi (takroriy id, variantlar,
+correct_answer oralig'i), javoblar butun indeksga keltiriladi, "A)"
+ko'rinishidagi prefikslar olib tashlanadi va natija bitta binar faylga
+yoziladi. Bot bu faylni ishga tushganda mmap qiladi.
+
+    python compile_questions.py            # tekshirish + questions.bin yozish
+    python compile_questions.py --check    # faqat tekshirish
+"""
+import argparse
+import json
+import os
+import sys
+from collections import Counter
+
+import question_bank
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ARTIFACT_PATH = os.path.join(BASE_DIR, 'questions.bin')
+
+
+def compile_bank(path: str):
+    """Bitta bankni o'qib normallashtirish; (savollar, xatolar) qaytaradi"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    errors = []
+    if not isinstance(data, list):
+        return [], [f"{path}: savollar ro'yxati kutilgan"]
+
+    duplicates = [qid for qid, count in Counter(q.get('id') for q in data).items() if count > 1]
+    if duplicates:
+        errors.append(f"Duplicate IDs found: {duplicates}")
+
+    questions = []
+    for q in data:
+        try:
+            questions.append(question_bank.normalize_question(q))
+        except ValueError as e:
+            errors.append(str(e))
+    questions.sort(key=lambda q: q['id'])
+    return questions, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--check', action='store_true', help="faqat tekshirish, fayl yozilmaydi")
+    parser.add_argument('--output', default=ARTIFACT_PATH)
+    args = parser.parse_args()
+
+    banks = {}
+    failed = False
+    for subject, filename in question_bank.SUBJECTS:
+        path = os.path.join(BASE_DIR, filename)
+        if not os.path.exists(path):
+            print(f"⚠️  {subject}: {filename} topilmadi")
+            continue
+        questions, errors = compile_bank(path)
+        print(f"{subject:<17} {len(questions):4d} ta savol", "✅" if not errors else f"❌ {len(errors)} ta xato")
+        for e in errors:
+            print('   -', e)
+        failed = failed or bool(errors)
+        banks[subject] = (question_bank.source_hash(path), questions)
+
+    if failed:
+        print("Xatolar tuzatilmaguncha fayl yozilmaydi.")
+        return 1
+    if not args.check:
+        question_bank.write_artifact(args.output, banks)
+        print(f"✅ {args.output} yozildi ({os.path.getsize(args.output)} bayt)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""Bir nechta worker jarayoni orasidagi kelishuv (umumiy SQLite orqali).
+
+- WORKER_ID - shu jarayonning noyob nomi (host:pid), lease egasi sifatida.
+- Lease: faqat bitta worker bajarishi kerak bo'lgan vazifalar uchun (broadcast
+  yuborish, bank fayllarini kuzatish). Egasi muddatida yangilab turadi, jarayon
+  o'lsa muddat tugagach boshqa worker oladi.
+- ControlChannel: admin amallari natijasini boshqa workerlarga yetkazish
+  (masalan banklar qayta yuklandi -> keshlarni yangilash).
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import db
+import storage
+
+logger = logging.getLogger(__name__)
+
+WORKER_INDEX = int(os.getenv('WORKER_INDEX', 0))
+WORKER_COUNT = int(os.getenv('WORKER_COUNT', 1))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+CONTROL_POLL_INTERVAL = float(os.getenv('CONTROL_POLL_INTERVAL', 1.0))
+# Eski buyruqlar shuncha vaqtdan keyin o'chiriladi (soniya)
+CONTROL_RETENTION = 24 * 3600
+
+ControlHandler = Callable[[Dict[str, Any]], Awaitable]
+
+
+class Lease:
+    """Nomlangan lease: `hold()` har chaqirilganda oladi yoki yangilaydi"""
+
+    def __init__(self, name: str, ttl: float, owner: str = WORKER_ID):
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner
+        self.held = False
+
+    async def hold(self) -> bool:
+        try:
+            self.held = await storage.run(db.acquire_lease, self.name, self.owner, self.ttl, time.time())
+        except Exception as e:
+            # DB band bo'lsa lease'ni yo'qotilgan deb hisoblaymiz (ikki egali holatdan xavfsizroq)
+            logger.error(f"Lease {self.name} yangilanmadi: {e}")
+            self.held = False
+        return self.held
+
+    async def release(self):
+        if self.held:
+            self.held = False
+            await storage.run(db.release_lease, self.name, self.owner)
+
+
+class ControlChannel:
+    """control_events jadvali orqali buyruqlarni yuborish va qabul qilish"""
+
+    def __init__(self, origin: str = WORKER_ID, interval: float = CONTROL_POLL_INTERVAL):
+        self.origin = origin
+        self.interval = interval
+        self._handlers: Dict[str, ControlHandler] = {}
+        self._last_id = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def on(self, command: str):
+        """Dekorator: buyruq uchun handler"""
+        def register(handler: ControlHandler) -> ControlHandler:
+            self._handlers[command] = handler
+            return handler
+        return register
+
+    async def publish(self, command: str, **payload):
+        """Buyruqni boshqa workerlarga yuborish (o'ziga qaytmaydi)"""
+        if WORKER_COUNT <= 1:
+            return
+        now = time.time()
+        await storage.run(db.publish_control_event, command, json.dumps(payload), self.origin, now)
+        await storage.run(db.prune_control_events, now - CONTROL_RETENTION)
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                events = await storage.run(db.get_control_events, self._last_id)
+            except Exception as e:
+                logger.error(f"Control buyruqlarini o'qishda xatolik: {e}")
+                continue
+            for event_id, command, payload, origin in events:
+                self._last_id = event_id
+                handler = self._handlers.get(command)
+                if origin == self.origin or handler is None:
+                    continue
+                try:
+                    await handler(json.loads(payload))
+                except Exception as e:
+                    logger.error(f"Control buyrug'i {command} bajarilmadi: {e}")
+
+    async def start(self):
+        """Faqat ishga tushgandan keyingi buyruqlar qabul qilinadi"""
+        if WORKER_COUNT <= 1 or self._task is not None:
+            return
+        self._last_id = await storage.run(db.last_control_event_id)
+        self._task = asyncio.create_task(self._poll())
+
+    async def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
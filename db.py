@@ -1,9 +1,18 @@
 import sqlite3
 import json
+import os
+import threading
+from contextlib import contextmanager
 from typing import List, Dict, Any
 
 DB_PATH = 'bot_data.db'
 
+# Ulanish sozlamalari (PRAGMA'lar)
+MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 64 * 1024 * 1024))
+CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', 16 * 1024))
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT_MS = 5000
+
 SCHEMA = '''
 PRAGMA foreign_keys = ON;
 
@@ -27,43 +36,342 @@ CREATE TABLE IF NOT EXISTS user_activity (
   subject TEXT,
   timestamp TEXT
 );
+
+CREATE TABLE IF NOT EXISTS broadcasts (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  text TEXT,
+  admin_chat_id INTEGER,
+  progress_message_id INTEGER,
+  status TEXT, -- 'running' | 'done'
+  created_at TEXT,
+  finished_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS broadcast_recipients (
+  broadcast_id INTEGER REFERENCES broadcasts(id),
+  user_id INTEGER,
+  status TEXT, -- 'pending' | 'sent' | 'failed'
+  error TEXT,
+  PRIMARY KEY (broadcast_id, user_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS ix_broadcast_recipients_status ON broadcast_recipients(broadcast_id, status);
+
+CREATE INDEX IF NOT EXISTS ix_user_activity_activity ON user_activity(activity);
+CREATE INDEX IF NOT EXISTS ix_user_activity_user ON user_activity(user_id);
+
+-- Statistika rollup jadvallari: user_activity'ga yozilganda trigger orqali yangilanadi
+CREATE TABLE IF NOT EXISTS stats_counters (
+  name TEXT PRIMARY KEY, -- 'unique_users' yoki 'activity:<activity>'
+  value INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS user_test_counts (
+  user_id INTEGER PRIMARY KEY,
+  first_name TEXT,
+  username TEXT,
+  tests INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS ix_user_test_counts_tests ON user_test_counts(tests DESC);
+
+CREATE TABLE IF NOT EXISTS subject_daily_counts (
+  subject TEXT,
+  day TEXT, -- YYYY-MM-DD
+  activity TEXT,
+  count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (subject, day, activity)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_user_activity_rollup AFTER INSERT ON user_activity
+BEGIN
+  INSERT INTO stats_counters (name, value)
+    SELECT 'unique_users', 1 WHERE NOT EXISTS (SELECT 1 FROM user_test_counts WHERE user_id = NEW.user_id)
+    ON CONFLICT(name) DO UPDATE SET value = value + 1;
+  INSERT INTO user_test_counts (user_id, first_name, username, tests)
+    VALUES (NEW.user_id, NEW.first_name, NEW.username, NEW.activity = 'test_started')
+    ON CONFLICT(user_id) DO UPDATE SET tests = tests + excluded.tests,
+      first_name = excluded.first_name, username = excluded.username;
+  INSERT INTO stats_counters (name, value) VALUES ('activity:' || COALESCE(NEW.activity, ''), 1)
+    ON CONFLICT(name) DO UPDATE SET value = value + 1;
+  INSERT INTO subject_daily_counts (subject, day, activity, count)
+    VALUES (COALESCE(NEW.subject, ''), COALESCE(substr(NEW.timestamp, 1, 10), ''), COALESCE(NEW.activity, ''), 1)
+    ON CONFLICT(subject, day, activity) DO UPDATE SET count = count + 1;
+END;
+
+-- Foydalanuvchilar ro'yxati: har bir faoliyat yozilganda upsert qilinadi
+CREATE TABLE IF NOT EXISTS users (
+  user_id INTEGER PRIMARY KEY,
+  first_name TEXT,
+  username TEXT,
+  language TEXT,
+  first_seen TEXT,
+  last_seen TEXT
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_user_activity_users AFTER INSERT ON user_activity
+BEGIN
+  INSERT INTO users (user_id, first_name, username, first_seen, last_seen)
+    VALUES (NEW.user_id, NEW.first_name, NEW.username, NEW.timestamp, NEW.timestamp)
+    ON CONFLICT(user_id) DO UPDATE SET
+      first_name = CASE WHEN COALESCE(excluded.last_seen, '') >= COALESCE(users.last_seen, '') THEN excluded.first_name ELSE users.first_name END,
+      username = CASE WHEN COALESCE(excluded.last_seen, '') >= COALESCE(users.last_seen, '') THEN excluded.username ELSE users.username END,
+      first_seen = MIN(COALESCE(users.first_seen, excluded.first_seen), COALESCE(excluded.first_seen, users.first_seen)),
+      last_seen = MAX(COALESCE(users.last_seen, excluded.last_seen), COALESCE(excluded.last_seen, users.last_seen));
+END;
+
+-- Foydalanuvchi sessiyalari (JSON), sessions.SessionStore tomonidan write-behind yoziladi
+CREATE TABLE IF NOT EXISTS sessions (
+  user_id INTEGER PRIMARY KEY,
+  data TEXT,
+  updated_at TEXT
+);
+
+-- Foydalanuvchining har bir savol bo'yicha natijalari (adaptive.AdaptiveSelector uchun)
+CREATE TABLE IF NOT EXISTS user_question_stats (
+  user_id INTEGER,
+  subject TEXT,
+  qid INTEGER,
+  seen INTEGER NOT NULL DEFAULT 0,
+  wrong INTEGER NOT NULL DEFAULT 0,
+  last_seen REAL,
+  PRIMARY KEY (user_id, subject, qid)
+) WITHOUT ROWID;
+
+-- Har bir fan bankining oxirgi qo'llangan manba xeshi (hot reload uchun)
+CREATE TABLE IF NOT EXISTS bank_sources (
+  subject TEXT PRIMARY KEY,
+  source_hash TEXT,
+  updated_at TEXT
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS schema_meta (
+  key TEXT PRIMARY KEY,
+  value TEXT
+) WITHOUT ROWID;
+
+-- Bir nechta worker jarayoni uchun: vazifa egasi (broadcast, bank kuzatuvchi)
+CREATE TABLE IF NOT EXISTS leases (
+  name TEXT PRIMARY KEY,
+  owner TEXT,
+  expires_at REAL
+) WITHOUT ROWID;
+
+-- Workerlar orasidagi buyruqlar (masalan banklar qayta yuklandi)
+CREATE TABLE IF NOT EXISTS control_events (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  command TEXT,
+  payload TEXT,
+  origin TEXT,
+  created_at REAL
+);
 '''
 
+# Bir martalik ma'lumot migratsiyalari (eski DB'larda mavjud ma'lumotdan hisoblash)
+MIGRATIONS = [
+    ('rollups_v1', [
+        'DELETE FROM stats_counters',
+        'DELETE FROM user_test_counts',
+        'DELETE FROM subject_daily_counts',
+        "INSERT INTO user_test_counts (user_id, first_name, username, tests) "
+        "SELECT user_id, first_name, username, SUM(activity = 'test_started') FROM user_activity GROUP BY user_id",
+        "INSERT INTO stats_counters (name, value) SELECT 'unique_users', COUNT(*) FROM user_test_counts",
+        "INSERT INTO stats_counters (name, value) "
+        "SELECT 'activity:' || COALESCE(activity, ''), COUNT(*) FROM user_activity GROUP BY 1",
+        "INSERT INTO subject_daily_counts (subject, day, activity, count) "
+        "SELECT COALESCE(subject, ''), COALESCE(substr(timestamp, 1, 10), ''), COALESCE(activity, ''), COUNT(*) "
+        "FROM user_activity GROUP BY 1, 2, 3",
+    ]),
+    ('users_v1', [
+        # Ism/username eng oxirgi faoliyatdagisi olinadi (MAX bilan bare column)
+        "INSERT OR REPLACE INTO users (user_id, first_name, username, language, first_seen, last_seen) "
+        "SELECT a.user_id, a.first_name, a.username, u.language, b.first_seen, a.last_seen "
+        "FROM (SELECT user_id, first_name, username, MAX(timestamp) AS last_seen FROM user_activity GROUP BY user_id) a "
+        "JOIN (SELECT user_id, MIN(timestamp) AS first_seen FROM user_activity GROUP BY user_id) b USING (user_id) "
+        "LEFT JOIN users u USING (user_id)",
+    ]),
+]
+
+# Har bir fan savollari o'zgarganda oshiriladi - xotiradagi keshlar shu orqali eskirganini biladi
+_questions_version: Dict[str, int] = {}
+
+
+def questions_version(subject: str) -> int:
+    """Fan savollari jadvalining joriy versiyasi"""
+    return _questions_version.get(subject, 0)
+
+
+def _bump_questions_version(subject: str):
+    _questions_version[subject] = _questions_version.get(subject, 0) + 1
+
+
+def invalidate_questions(subject: str):
+    """Jadvalni boshqa jarayon o'zgartirgan bo'lsa - xotiradagi keshlarni eskirgan deb belgilash"""
+    _bump_questions_version(subject)
+
+
+# O'quvchilar uchun har bir thread'da bitta doimiy ulanish, yozish uchun esa
+# bitta alohida writer ulanishi (lock bilan). WAL rejimida o'quvchilar
+# yozuvchini kutmaydi.
+_local = threading.local()
+_readers: List[sqlite3.Connection] = []
+_readers_lock = threading.Lock()
+_writer_conn = None
+_writer_path = None
+_writer_lock = threading.RLock()
+_generation = 0
+
+
+def _connect(readonly: bool = False) -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+    conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE_KB}')
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA foreign_keys = ON')
+    if readonly:
+        conn.execute('PRAGMA query_only = ON')
+    return conn
+
+
+def _reader() -> sqlite3.Connection:
+    """Joriy thread uchun doimiy o'quvchi ulanish"""
+    key = (DB_PATH, _generation)
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'key', None) != key:
+        conn = _connect(readonly=True)
+        _local.conn = conn
+        _local.key = key
+        with _readers_lock:
+            _readers.append(conn)
+    return conn
+
+
+@contextmanager
+def _writer():
+    """Yagona writer ulanishi - blok bitta tranzaksiya sifatida commit qilinadi"""
+    global _writer_conn, _writer_path
+    with _writer_lock:
+        if _writer_conn is None or _writer_path != DB_PATH:
+            if _writer_conn is not None:
+                _writer_conn.close()
+            _writer_conn = _connect()
+            _writer_path = DB_PATH
+        try:
+            # Yozish lock'i darhol olinadi: boshqa jarayon yozayotgan bo'lsa busy_timeout
+            # bo'yicha kutiladi (deferred tranzaksiya o'rtada SQLITE_BUSY bermasligi uchun)
+            _writer_conn.execute('BEGIN IMMEDIATE')
+            yield _writer_conn
+            _writer_conn.commit()
+        except Exception:
+            _writer_conn.rollback()
+            raise
+
+
+def close_connections():
+    """Barcha ochiq ulanishlarni yopish (shutdown yoki DB_PATH almashganda)"""
+    global _writer_conn, _writer_path, _generation
+    with _writer_lock:
+        if _writer_conn is not None:
+            _writer_conn.close()
+        _writer_conn = None
+        _writer_path = None
+    with _readers_lock:
+        for conn in _readers:
+            conn.close()
+        _readers.clear()
+        _generation += 1
+
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.executescript(SCHEMA)
-    conn.commit()
-    conn.close()
+    with _writer() as conn:
+        conn.executescript(SCHEMA)
+    with _writer() as conn:
+        done = {row[0] for row in conn.execute('SELECT key FROM schema_meta')}
+        for key, statements in MIGRATIONS:
+            if key in done:
+                continue
+            for sql in statements:
+                conn.execute(sql)
+            conn.execute('INSERT INTO schema_meta (key, value) VALUES (?, ?)', (key, 'done'))
 
 
 def load_questions_from_json(path: str, subject: str):
     with open(path, 'r', encoding='utf-8') as f:
         data = json.load(f)
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    return load_questions(subject, data)
+
+
+def load_questions(subject: str, questions: List[Dict[str, Any]]) -> int:
+    """Savollarni jadvalga qo'shish (mavjudlari o'zgarmaydi)"""
     inserted = 0
-    for q in data:
-        qid = q.get('id')
-        question = q.get('question')
-        options = json.dumps(q.get('options', []), ensure_ascii=False)
-        correct = q.get('correct_answer')
-        try:
-            cur.execute('INSERT OR IGNORE INTO questions (qid, subject, question, options, correct_answer) VALUES (?, ?, ?, ?, ?)',
-                        (qid, subject, question, options, correct))
-            if cur.rowcount > 0:
-                inserted += 1
-        except Exception as e:
-            print('Error inserting', qid, e)
-    conn.commit()
-    conn.close()
+    with _writer() as conn:
+        cur = conn.cursor()
+        for q in questions:
+            qid = q.get('id')
+            question = q.get('question')
+            options = json.dumps(q.get('options', []), ensure_ascii=False)
+            correct = q.get('correct_answer')
+            try:
+                cur.execute('INSERT OR IGNORE INTO questions (qid, subject, question, options, correct_answer) VALUES (?, ?, ?, ?, ?)',
+                            (qid, subject, question, options, correct))
+                if cur.rowcount > 0:
+                    inserted += 1
+            except Exception as e:
+                print('Error inserting', qid, e)
+    if inserted:
+        _bump_questions_version(subject)
     return inserted
 
 
+def get_bank_source_hash(subject: str):
+    cur = _reader().cursor()
+    cur.execute('SELECT source_hash FROM bank_sources WHERE subject = ?', (subject,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def sync_questions(subject: str, questions: List[Dict[str, Any]], source_hash: str = None,
+                   updated_at: str = None) -> Dict[str, int]:
+    """Fan savollarini berilgan ro'yxatga moslash: (subject, qid) bo'yicha diff,
+    faqat o'zgargan qatorlar bitta tranzaksiyada insert/update/delete qilinadi"""
+    result = {'inserted': 0, 'updated': 0, 'deleted': 0}
+    with _writer() as conn:
+        existing = {row[0]: row[1:] for row in conn.execute(
+            'SELECT qid, question, options, correct_answer FROM questions WHERE subject = ?', (subject,))}
+        seen = set()
+        for q in questions:
+            qid = q['id']
+            if qid in seen:
+                continue  # takroriy id - birinchisi qoladi (eski INSERT OR IGNORE kabi)
+            seen.add(qid)
+            row = (q['question'], json.dumps(list(q['options']), ensure_ascii=False), q['correct_answer'])
+            old = existing.get(qid)
+            if old is None:
+                conn.execute('INSERT INTO questions (qid, subject, question, options, correct_answer) VALUES (?, ?, ?, ?, ?)',
+                             (qid, subject) + row)
+                result['inserted'] += 1
+            elif tuple(old) != row:
+                conn.execute('UPDATE questions SET question = ?, options = ?, correct_answer = ? WHERE subject = ? AND qid = ?',
+                             row + (subject, qid))
+                result['updated'] += 1
+        removed = [(subject, qid) for qid in existing if qid not in seen]
+        if removed:
+            conn.executemany('DELETE FROM questions WHERE subject = ? AND qid = ?', removed)
+            result['deleted'] = len(removed)
+        if source_hash is not None:
+            conn.execute('INSERT INTO bank_sources (subject, source_hash, updated_at) VALUES (?, ?, ?) '
+                         'ON CONFLICT(subject) DO UPDATE SET source_hash = excluded.source_hash, updated_at = excluded.updated_at',
+                         (subject, source_hash, updated_at))
+    if any(result.values()):
+        _bump_questions_version(subject)
+    return result
+
+
 def get_random_questions(subject: str, n: int) -> List[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    cur = _reader().cursor()
     cur.execute('SELECT qid, question, options, correct_answer FROM questions WHERE subject = ? ORDER BY RANDOM() LIMIT ?', (subject, n))
     rows = cur.fetchall()
     result = []
@@ -76,14 +384,12 @@ def get_random_questions(subject: str, n: int) -> List[Dict[str, Any]]:
             'options': options,
             'correct_answer': correct
         })
-    conn.close()
     return result
 
 
 def get_all_questions(subject: str) -> List[Dict[str, Any]]:
     """Mavzuning barcha savollarini ketmaket tartibi bilan olish"""
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    cur = _reader().cursor()
     cur.execute('SELECT qid, question, options, correct_answer FROM questions WHERE subject = ? ORDER BY qid', (subject,))
     rows = cur.fetchall()
     result = []
@@ -96,53 +402,302 @@ def get_all_questions(subject: str) -> List[Dict[str, Any]]:
             'options': options,
             'correct_answer': correct
         })
-    conn.close()
     return result
 
 
 def count_questions(subject: str) -> int:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    cur = _reader().cursor()
     cur.execute('SELECT COUNT(*) FROM questions WHERE subject = ?', (subject,))
-    c = cur.fetchone()[0]
-    conn.close()
-    return c
+    return cur.fetchone()[0]
 
 
 def log_activity(user_id: int, username: str, first_name: str, activity: str, subject: str = None, timestamp: str = None):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute('INSERT INTO user_activity (user_id, username, first_name, activity, subject, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
-                (user_id, username, first_name, activity, subject, timestamp))
-    conn.commit()
-    conn.close()
+    with _writer() as conn:
+        conn.execute('INSERT INTO user_activity (user_id, username, first_name, activity, subject, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
+                     (user_id, username, first_name, activity, subject, timestamp))
+
+
+def log_activities(rows: List[tuple]):
+    """Bir nechta faoliyatni bitta tranzaksiyada yozish
+    rows: (user_id, username, first_name, activity, subject, timestamp)
+    """
+    with _writer() as conn:
+        conn.executemany('INSERT INTO user_activity (user_id, username, first_name, activity, subject, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
+                         rows)
 
 
 def get_stats_summary():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute('SELECT COUNT(DISTINCT user_id) FROM user_activity')
-    unique_users = cur.fetchone()[0]
-    cur.execute("SELECT COUNT(*) FROM user_activity WHERE activity = 'test_started'")
-    total_tests = cur.fetchone()[0]
-    cur.execute("SELECT COUNT(*) FROM user_activity WHERE activity = 'test_completed'")
-    completed_tests = cur.fetchone()[0]
-    cur.execute("SELECT user_id, first_name, username, COUNT(*) as tests FROM user_activity WHERE activity = 'test_started' GROUP BY user_id ORDER BY tests DESC LIMIT 5")
+    """Statistika rollup jadvallaridan - log hajmiga bog'liq emas"""
+    cur = _reader().cursor()
+    cur.execute("SELECT name, value FROM stats_counters WHERE name IN ('unique_users', 'activity:test_started', 'activity:test_completed')")
+    counters = dict(cur.fetchall())
+    cur.execute('SELECT user_id, first_name, username, tests FROM user_test_counts WHERE tests > 0 ORDER BY tests DESC LIMIT 5')
     top = cur.fetchall()
-    conn.close()
     return {
-        'unique_users': unique_users,
-        'total_tests': total_tests,
-        'completed_tests': completed_tests,
+        'unique_users': counters.get('unique_users', 0),
+        'total_tests': counters.get('activity:test_started', 0),
+        'completed_tests': counters.get('activity:test_completed', 0),
         'top_users': top
     }
 
 
+def get_popular_subjects(since_day: str, activity: str = 'test_started') -> List[str]:
+    """Berilgan kundan beri eng ko'p boshlangan fanlar (rollup jadvalidan)"""
+    cur = _reader().cursor()
+    cur.execute("SELECT subject FROM subject_daily_counts WHERE activity = ? AND day >= ? AND subject != '' "
+                'GROUP BY subject ORDER BY SUM(count) DESC', (activity, since_day))
+    return [row[0] for row in cur.fetchall()]
+
+
 def get_all_users():
     """Barcha foydalanuvchilarni olish (broadcast uchun)"""
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute('SELECT DISTINCT user_id, first_name, username FROM user_activity ORDER BY user_id')
-    users = cur.fetchall()
-    conn.close()
-    return users
+    cur = _reader().cursor()
+    cur.execute('SELECT user_id, first_name, username FROM users ORDER BY user_id')
+    return cur.fetchall()
+
+
+def set_user_language(user_id: int, language: str):
+    """Foydalanuvchi tanlagan tilni saqlash"""
+    with _writer() as conn:
+        conn.execute('INSERT INTO users (user_id, language) VALUES (?, ?) '
+                     'ON CONFLICT(user_id) DO UPDATE SET language = excluded.language', (user_id, language))
+
+
+def get_user_language(user_id: int):
+    cur = _reader().cursor()
+    cur.execute('SELECT language FROM users WHERE user_id = ?', (user_id,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+STATS_IMPORT_KEY = 'stats_json_import'
+STATS_IMPORT_CHUNK = 5000
+_JSON_READ_SIZE = 64 * 1024
+_WHITESPACE = ' \t\n\r'
+
+
+def iter_json_array(f, read_size: int = _JSON_READ_SIZE):
+    """Katta JSON massiv elementlarini faylni to'liq o'qimasdan birma-bir qaytarish"""
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = f.read(read_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def skip(chars: str):
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    skip(_WHITESPACE)
+    if pos >= len(buf) or buf[pos] != '[':
+        raise ValueError("JSON massiv kutilgan edi")
+    pos += 1
+    while True:
+        skip(_WHITESPACE + ',')
+        if pos >= len(buf):
+            raise ValueError("JSON massiv yopilmagan")
+        if buf[pos] == ']':
+            return
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            rest = buf[end:].lstrip(_WHITESPACE)
+            if not eof and (not rest or rest[0] not in ',]'):
+                # Qiymatdan keyin ajratuvchi ko'rinmadi: son bufer chegarasida
+                # kesilgan bo'lishi mumkin ('1.5e' + '10') - davomini o'qib qayta
+                fill()
+                continue
+            pos = end
+            yield value
+            break
+
+
+def _stats_import_state(conn) -> Dict[str, Any]:
+    row = conn.execute('SELECT value FROM schema_meta WHERE key = ?', (STATS_IMPORT_KEY,)).fetchone()
+    return json.loads(row[0]) if row else {'records': 0}
+
+
+def import_stats_json(path: str, chunk_size: int = STATS_IMPORT_CHUNK) -> int:
+    """Eski user_stats.json yozuvlarini user_activity'ga oqim bilan ko'chirish.
+
+    Fayl bo'laklab o'qiladi va har chunk_size yozuv bitta tranzaksiyada
+    yoziladi; shu tranzaksiyada schema_meta'ga nechta yozuv o'tgani ham
+    saqlanadi. To'xtab qolsa keyingi safar shu joydan davom etadi (fayl
+    o'zgarmagan bo'lsa), to'liq ko'chirilgan fayl qayta o'qilmaydi. Fayl
+    o'zgargan bo'lsa boshidan o'tiladi: (user_id, activity, timestamp)
+    bo'yicha mavjud yozuvlar qayta qo'shilmaydi. Rollup va users jadvallari
+    triggerlar orqali yangilanadi. Qo'shilgan yozuvlar sonini qaytaradi.
+    """
+    if not os.path.exists(path):
+        return 0
+    st = os.stat(path)
+    source = {'path': os.path.abspath(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    state = _stats_import_state(_reader())
+    if state.get('source') != source:
+        state = {'records': 0}
+    elif state.get('done'):
+        return 0
+
+    skip = state['records']
+    seen = 0
+    inserted = 0
+    chunk = []
+
+    def flush(done: bool = False):
+        nonlocal inserted
+        with _writer() as conn:
+            for row in chunk:
+                cur = conn.execute(
+                    'INSERT INTO user_activity (user_id, username, first_name, activity, subject, timestamp) '
+                    'SELECT ?, ?, ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM user_activity '
+                    'WHERE user_id = ? AND activity IS ? AND timestamp IS ?)',
+                    row + (row[0], row[3], row[5]))
+                inserted += cur.rowcount
+            progress = {'source': source, 'records': seen, 'done': done}
+            conn.execute('INSERT INTO schema_meta (key, value) VALUES (?, ?) '
+                         'ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+                         (STATS_IMPORT_KEY, json.dumps(progress)))
+        chunk.clear()
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for record in iter_json_array(f):
+            seen += 1
+            if seen <= skip or not isinstance(record, dict) or record.get('user_id') is None:
+                continue
+            chunk.append((record['user_id'], record.get('username'), record.get('first_name'),
+                          record.get('activity'), record.get('subject'), record.get('timestamp')))
+            if len(chunk) >= chunk_size:
+                flush()
+    flush(done=True)
+    return inserted
+
+
+def create_broadcast(text: str, admin_chat_id: int, progress_message_id: int, user_ids: List[int],
+                     created_at: str = None) -> int:
+    """Broadcast ishini va uning qabul qiluvchilarini bitta tranzaksiyada yaratish"""
+    with _writer() as conn:
+        cur = conn.execute('INSERT INTO broadcasts (text, admin_chat_id, progress_message_id, status, created_at) VALUES (?, ?, ?, ?, ?)',
+                           (text, admin_chat_id, progress_message_id, 'running', created_at))
+        broadcast_id = cur.lastrowid
+        conn.executemany("INSERT OR IGNORE INTO broadcast_recipients (broadcast_id, user_id, status) VALUES (?, ?, 'pending')",
+                         ((broadcast_id, uid) for uid in user_ids))
+    return broadcast_id
+
+
+def get_unfinished_broadcasts():
+    """Tugallanmagan broadcastlar (qayta ishga tushganda davom ettirish uchun)"""
+    cur = _reader().cursor()
+    cur.execute("SELECT id, text, admin_chat_id, progress_message_id FROM broadcasts WHERE status = 'running' ORDER BY id")
+    return cur.fetchall()
+
+
+def get_pending_recipients(broadcast_id: int) -> List[int]:
+    cur = _reader().cursor()
+    cur.execute("SELECT user_id FROM broadcast_recipients WHERE broadcast_id = ? AND status = 'pending'", (broadcast_id,))
+    return [r[0] for r in cur.fetchall()]
+
+
+def mark_recipients(broadcast_id: int, results: List[tuple]):
+    """Yetkazish natijalarini saqlash; results: (user_id, status, error)"""
+    with _writer() as conn:
+        conn.executemany('UPDATE broadcast_recipients SET status = ?, error = ? WHERE broadcast_id = ? AND user_id = ?',
+                         ((status, error, broadcast_id, uid) for uid, status, error in results))
+
+
+def get_broadcast_counts(broadcast_id: int) -> Dict[str, int]:
+    cur = _reader().cursor()
+    cur.execute('SELECT status, COUNT(*) FROM broadcast_recipients WHERE broadcast_id = ? GROUP BY status', (broadcast_id,))
+    return dict(cur.fetchall())
+
+
+def finish_broadcast(broadcast_id: int, finished_at: str = None):
+    with _writer() as conn:
+        conn.execute("UPDATE broadcasts SET status = 'done', finished_at = ? WHERE id = ?", (finished_at, broadcast_id))
+
+
+def load_session(user_id: int):
+    cur = _reader().cursor()
+    cur.execute('SELECT data FROM sessions WHERE user_id = ?', (user_id,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def save_sessions(rows: List[tuple]):
+    """Sessiyalarni bitta tranzaksiyada saqlash; rows: (user_id, data, updated_at)"""
+    with _writer() as conn:
+        conn.executemany('INSERT INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?) '
+                         'ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at',
+                         rows)
+
+
+def get_user_question_stats(user_id: int, subject: str) -> List[tuple]:
+    """Foydalanuvchining fan bo'yicha savol natijalari: (qid, seen, wrong, last_seen)"""
+    cur = _reader().cursor()
+    cur.execute('SELECT qid, seen, wrong, last_seen FROM user_question_stats WHERE user_id = ? AND subject = ?',
+                (user_id, subject))
+    return cur.fetchall()
+
+
+def record_question_results(rows: List[tuple]):
+    """Javob natijalarini bitta tranzaksiyada qo'shish; rows: (user_id, subject, qid, wrong, answered_at)"""
+    with _writer() as conn:
+        conn.executemany('INSERT INTO user_question_stats (user_id, subject, qid, seen, wrong, last_seen) '
+                         'VALUES (?, ?, ?, 1, ?, ?) '
+                         'ON CONFLICT(user_id, subject, qid) DO UPDATE SET seen = seen + 1, '
+                         'wrong = wrong + excluded.wrong, last_seen = MAX(COALESCE(last_seen, 0), excluded.last_seen)',
+                         rows)
+
+
+def acquire_lease(name: str, owner: str, ttl: float, now: float) -> bool:
+    """Lease'ni olish yoki yangilash; boshqa egada va muddati o'tmagan bo'lsa False"""
+    with _writer() as conn:
+        cur = conn.execute('INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) '
+                           'ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at '
+                           'WHERE leases.owner = excluded.owner OR leases.expires_at < ?',
+                           (name, owner, now + ttl, now))
+        return cur.rowcount > 0
+
+
+def release_lease(name: str, owner: str):
+    with _writer() as conn:
+        conn.execute('DELETE FROM leases WHERE name = ? AND owner = ?', (name, owner))
+
+
+def publish_control_event(command: str, payload: str, origin: str, created_at: float) -> int:
+    with _writer() as conn:
+        cur = conn.execute('INSERT INTO control_events (command, payload, origin, created_at) VALUES (?, ?, ?, ?)',
+                           (command, payload, origin, created_at))
+        return cur.lastrowid
+
+
+def get_control_events(after_id: int) -> List[tuple]:
+    cur = _reader().cursor()
+    cur.execute('SELECT id, command, payload, origin FROM control_events WHERE id > ? ORDER BY id', (after_id,))
+    return cur.fetchall()
+
+
+def last_control_event_id() -> int:
+    cur = _reader().cursor()
+    cur.execute('SELECT COALESCE(MAX(id), 0) FROM control_events')
+    return cur.fetchone()[0]
+
+
+def prune_control_events(before: float):
+    with _writer() as conn:
+        conn.execute('DELETE FROM control_events WHERE created_at < ?', (before,))
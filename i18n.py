@@ -0,0 +1,54 @@
+"""Tarjimalarni ishga tushishda muzlatilgan jadvallarga kompilyatsiya qilish.
+
+Har bir til uchun barcha kalitlar bilan to'liq jadval quriladi: tilda yo'q
+kalit asosiy tildan (uz) olinadi va ishga tushishda ogohlantirish sifatida
+chiqariladi. Shundan keyin matn olish bitta dict murojaati.
+"""
+import json
+import logging
+from types import MappingProxyType
+from typing import Dict, List, Mapping
+
+logger = logging.getLogger(__name__)
+
+LANGUAGES = ('uz', 'ru', 'en')
+DEFAULT_LANGUAGE = 'uz'
+
+
+class Translations:
+    """Til -> muzlatilgan (kalit -> matn) jadval"""
+    __slots__ = ('tables', 'missing')
+
+    def __init__(self, raw: Mapping[str, Mapping[str, str]]):
+        keys = set()
+        for language in LANGUAGES:
+            keys.update(raw.get(language, {}))
+        default = raw.get(DEFAULT_LANGUAGE, {})
+
+        tables = {}
+        missing: Dict[str, List[str]] = {}
+        for language in LANGUAGES:
+            source = raw.get(language, {})
+            lost = sorted(keys - source.keys())
+            if lost:
+                missing[language] = lost
+            tables[language] = MappingProxyType(
+                {key: source.get(key, default.get(key, key)) for key in keys}
+            )
+        self.tables = MappingProxyType(tables)
+        self.missing = missing
+
+    def table(self, language: str) -> Mapping[str, str]:
+        return self.tables.get(language) or self.tables[DEFAULT_LANGUAGE]
+
+    def get(self, language: str, key: str) -> str:
+        return self.table(language).get(key, key)
+
+
+def load(path: str) -> Translations:
+    """translations.json'ni o'qish va yetishmayotgan kalitlarni loglash"""
+    with open(path, 'r', encoding='utf-8') as f:
+        translations = Translations(json.load(f))
+    for language, keys in translations.missing.items():
+        logger.warning(f"'{language}' tarjimasida kalitlar yo'q ({DEFAULT_LANGUAGE} ishlatiladi): {', '.join(keys)}")
+    return translations
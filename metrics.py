@@ -0,0 +1,269 @@
+"""Yengil metrikalar: histogram, counter va gauge, Prometheus text formatida.
+
+Tashqi kutubxonasiz; qiymatlar jarayon xotirasida yig'iladi va BotServer'ning
+`GET /metrics` endpointida beriladi. Yoziladiganlar:
+  - bot_route_duration_seconds{route} - callback marshrutlari (router hook);
+  - bot_db_duration_seconds{function} - db modulining har bir funksiyasi;
+  - bot_api_request_duration_seconds{method}, bot_api_requests_total{method,status};
+  - bot_active_sessions, bot_pending_updates va bot_activity_dropped gauge'lari;
+  - bot_session_* - sessiyalar xotirasi (navbatdagi yozuvlar, chiqarishlar, qayta yuklashlar);
+  - bot_render_cache_{hits,misses}_total, bot_render_cache_size - savollar render keshi.
+
+db funksiyalari storage thread pool'ida ham chaqiriladi, shuning uchun
+yozish lock ostida. METRICS_ENABLED=0 bo'lsa hech narsa o'ralmaydi.
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from telegram.request import HTTPXRequest
+
+import router
+
+ENABLED = os.getenv('METRICS_ENABLED', '1') != '0'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Soniyalarda; db chaqiruvlari uchun millisekundlik qismi ham kerak
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Juda tez va tez-tez chaqiriladigan yordamchilar o'ralmaydi
+DB_EXCLUDE = frozenset({'questions_version', 'invalidate_questions', 'close_connections'})
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Tuple[str, ...], values: tuple, extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = ''
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{_labels(self.labelnames, k)} {_number(v)}' for k, v in items]
+
+
+class Gauge(Metric):
+    """Qiymati o'qilayotganda funksiyadan olinadi"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, help_text: str, func: Optional[Callable[[], float]] = None):
+        super().__init__(name, help_text)
+        self.func = func
+
+    def set_function(self, func: Callable[[], float]):
+        self.func = func
+
+    def samples(self) -> List[str]:
+        if self.func is None:
+            return []
+        return [f'{self.name} {_number(self.func())}']
+
+
+class FunctionCounter(Gauge):
+    """Faqat o'sadigan qiymat (masalan obyektdagi hisoblagich), o'qilayotganda funksiyadan olinadi"""
+    kind = 'counter'
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [har bir bucket uchun (kumulyativ emas) soni..., +Inf, sum]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[index] += 1
+            row[-1] += value
+
+    def count(self, *labels) -> int:
+        row = self._values.get(labels)
+        return sum(row[:-1]) if row else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = []
+        for labels, row in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), row[:-1]):
+                cumulative += n
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(row[-1])}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return '\n'.join(m.render() for m in self._metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+route_duration = REGISTRY.register(Histogram(
+    'bot_route_duration_seconds', 'Callback marshrutlarining bajarilish vaqti', ('route',)))
+route_errors = REGISTRY.register(Counter(
+    'bot_route_errors_total', 'Xatolik bilan tugagan callback marshrutlari', ('route',)))
+db_duration = REGISTRY.register(Histogram(
+    'bot_db_duration_seconds', 'db funksiyalarining bajarilish vaqti', ('function',)))
+db_errors = REGISTRY.register(Counter(
+    'bot_db_errors_total', 'Xatolik bilan tugagan db chaqiruvlari', ('function',)))
+api_duration = REGISTRY.register(Histogram(
+    'bot_api_request_duration_seconds', 'Telegram Bot API so\'rovlari vaqti', ('method',)))
+api_requests = REGISTRY.register(Counter(
+    'bot_api_requests_total', 'Telegram Bot API so\'rovlari (status: HTTP kod yoki "error")', ('method', 'status')))
+active_sessions = REGISTRY.register(Gauge(
+    'bot_active_sessions', 'Xotiradagi foydalanuvchi sessiyalari'))
+session_dirty = REGISTRY.register(Gauge(
+    'bot_session_dirty', 'O\'zgargan, hali yozilmagan xotiradagi sessiyalar'))
+session_spilled = REGISTRY.register(Gauge(
+    'bot_session_spilled', 'Xotiradan chiqarilgan, hali yozilmagan sessiyalar'))
+session_evictions_ttl = REGISTRY.register(FunctionCounter(
+    'bot_session_evictions_ttl_total', 'TTL bo\'yicha xotiradan chiqarilgan sessiyalar'))
+session_evictions_lru = REGISTRY.register(FunctionCounter(
+    'bot_session_evictions_lru_total', 'Xotira chegarasi (LRU) bo\'yicha chiqarilgan sessiyalar'))
+session_reloads = REGISTRY.register(FunctionCounter(
+    'bot_session_reloads_total', 'Backend\'dan qayta yuklangan sessiyalar'))
+render_cache_hits = REGISTRY.register(FunctionCounter(
+    'bot_render_cache_hits_total', 'Savollar render keshidan topilganlar'))
+render_cache_misses = REGISTRY.register(FunctionCounter(
+    'bot_render_cache_misses_total', 'Savollar render keshida topilmay qayta qurilganlar'))
+render_cache_size = REGISTRY.register(Gauge(
+    'bot_render_cache_size', 'Savollar render keshidagi yozuvlar'))
+pending_updates = REGISTRY.register(Gauge(
+    'bot_pending_updates', 'Qayta ishlanishini kutayotgan update\'lar'))
+activity_dropped = REGISTRY.register(Gauge(
+    'bot_activity_dropped', 'Navbat to\'la bo\'lgani uchun tashlangan activity hodisalari (ishga tushgandan beri)'))
+
+
+def observe_route(route: str, elapsed: float, error: Optional[BaseException]):
+    """router.Router hook'i (marshrut kodi o'qiladigan nomga aylantiriladi)"""
+    name = router.ROUTE_NAMES.get(route, route)
+    route_duration.observe(elapsed, name)
+    if error is not None:
+        route_errors.inc(name)
+
+
+def timed(func: Callable, histogram: Histogram = db_duration, errors: Counter = db_errors,
+          label: str = None) -> Callable:
+    """Sinxron funksiyani vaqt o'lchovchi bilan o'rash"""
+    label = label or func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            errors.inc(label)
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - started, label)
+    wrapper.__wrapped_metrics__ = True
+    return wrapper
+
+
+def instrument_module(module, exclude: Iterable[str] = ()) -> List[str]:
+    """Modulning ochiq funksiyalarini joyida o'rash (chaqiruvchilar `module.f` orqali oladi)"""
+    if not ENABLED:
+        return []
+    exclude = frozenset(exclude)
+    wrapped = []
+    for name, value in list(vars(module).items()):
+        if name.startswith('_') or name in exclude or not callable(value) or isinstance(value, type):
+            continue
+        if getattr(value, '__module__', None) != module.__name__ or getattr(value, '__wrapped_metrics__', False):
+            continue
+        setattr(module, name, timed(value))
+        wrapped.append(name)
+    return wrapped
+
+
+def instrument_db() -> List[str]:
+    import db
+    return instrument_module(db, DB_EXCLUDE)
+
+
+class MetricsRequest(HTTPXRequest):
+    """Bot API so'rovlarini metodi bo'yicha o'lchovchi HTTPXRequest"""
+
+    async def do_request(self, url: str, method: str, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            code, payload = await super().do_request(
+                url, method, request_data=request_data, read_timeout=read_timeout,
+                write_timeout=write_timeout, connect_timeout=connect_timeout, pool_timeout=pool_timeout)
+            status = str(code)
+            return code, payload
+        finally:
+            api_duration.observe(time.perf_counter() - started, api_method)
+            api_requests.inc(api_method, status)
+
+
+def render() -> str:
+    return REGISTRY.render()
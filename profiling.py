@@ -0,0 +1,216 @@
+"""Ishlab turgan botni profillash (admin buyruqlari uchun).
+
+Uch xil hisobot, har biri cheklangan vaqt oynasida:
+  - cpu_profile: cProfile event loop thread'ida (handlerlar, rendering, sessiyalar);
+  - sample_profile: statistik sampler - har SAMPLE_INTERVAL da barcha thread'lar
+    stack'i olinadi (storage thread pool'i ham ko'rinadi, overhead kichik);
+  - memory_diff: tracemalloc snapshot'lari farqi - oyna davomida qayerda xotira
+    o'sgani va hali bo'shatilmagani.
+
+Bir vaqtda faqat bitta profil ishlaydi. Natija oddiy matn (hujjat sifatida
+yuboriladi); bir nechta worker bo'lsa - faqat buyruq kelgan worker profillanadi.
+Snapshot olish va hisobotni formatlash executor'da bajariladi - event loop
+(boshqa foydalanuvchilar) to'xtab qolmaydi.
+"""
+import asyncio
+import contextlib
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+import coordination
+
+PROFILE_DEFAULT_SECONDS = float(os.getenv('PROFILE_DEFAULT_SECONDS', 30))
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', 300))
+PROFILE_TOP_N = int(os.getenv('PROFILE_TOP_N', 40))
+SAMPLE_INTERVAL = 0.005
+# Sampling paytida GIL tezroq almashsin: aks holda sampler faqat loop bo'sh
+# turganda (select ichida) uyg'onadi va band kod namunalarda ko'rinmaydi
+SAMPLE_SWITCH_INTERVAL = 0.0005
+TRACEMALLOC_FRAMES = 10
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+_busy = False
+
+
+@contextlib.asynccontextmanager
+async def _exclusive():
+    global _busy
+    if _busy:
+        raise ProfilerBusy("profil allaqachon ishlayapti")
+    _busy = True
+    try:
+        yield
+    finally:
+        _busy = False
+
+
+def is_busy() -> bool:
+    return _busy
+
+
+def parse_seconds(value: Optional[str], default: float = PROFILE_DEFAULT_SECONDS) -> float:
+    """Buyruq argumentidan davomiylik (1..PROFILE_MAX_SECONDS)"""
+    try:
+        seconds = float(value) if value is not None else default
+    except ValueError:
+        seconds = default
+    return min(max(seconds, 1.0), PROFILE_MAX_SECONDS)
+
+
+async def _off_loop(func, *args):
+    """Og'ir sinxron ishni event loop'dan tashqarida bajarish"""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+
+
+def _header(title: str, seconds: float) -> str:
+    return (f"{title}\nworker: {coordination.WORKER_ID}\n"
+            f"boshlandi: {datetime.now().isoformat(timespec='seconds')}, oyna: {seconds:g}s\n\n")
+
+
+async def cpu_profile(seconds: float, top: int = PROFILE_TOP_N) -> str:
+    """Event loop thread'ini cProfile bilan `seconds` davomida profillash"""
+    async with _exclusive():
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+        return await _off_loop(_format_cpu, profiler, seconds, top)
+
+
+def _format_cpu(profiler: cProfile.Profile, seconds: float, top: int) -> str:
+    out = io.StringIO()
+    out.write(_header("CPU profil (cProfile, event loop thread)", seconds))
+    stats = pstats.Stats(profiler, stream=out)
+    stats.strip_dirs()
+    out.write("=== cumulative bo'yicha ===\n")
+    stats.sort_stats('cumulative').print_stats(top)
+    out.write("\n=== tottime bo'yicha ===\n")
+    stats.sort_stats('tottime').print_stats(top)
+    return out.getvalue()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}"
+
+
+async def sample_profile(seconds: float, interval: float = SAMPLE_INTERVAL, top: int = PROFILE_TOP_N) -> str:
+    """Barcha thread'lar stack'ini davriy olish: eng ko'p uchragan funksiyalar"""
+    async with _exclusive():
+        own: Counter = Counter()      # stack tepasidagi funksiya (shu joyda vaqt o'tmoqda)
+        total: Counter = Counter()    # stack'ning istalgan joyida (chaqiruvchilar bilan)
+        per_thread: Counter = Counter()
+        stop = threading.Event()
+        samples = [0]
+
+        def run():
+            me = threading.get_ident()
+            names = {}
+            while not stop.wait(interval):
+                if len(names) != threading.active_count():
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me:
+                        continue
+                    thread = names.get(ident, str(ident))
+                    per_thread[thread] += 1
+                    own[(thread, _frame_label(frame))] += 1
+                    seen = set()
+                    while frame is not None:
+                        label = _frame_label(frame)
+                        if label not in seen:
+                            seen.add(label)
+                            total[label] += 1
+                        frame = frame.f_back
+                samples[0] += 1
+
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch_interval, SAMPLE_SWITCH_INTERVAL))
+        sampler = threading.Thread(target=run, name='profiling-sampler', daemon=True)
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            stop.set()
+            sys.setswitchinterval(switch_interval)
+            await _off_loop(sampler.join)
+        return await _off_loop(_format_samples, own, total, per_thread, samples[0], interval, seconds, top)
+
+
+def _format_samples(own: Counter, total: Counter, per_thread: Counter, samples: int, interval: float,
+                    seconds: float, top: int) -> str:
+    n = max(samples, 1)
+    out = io.StringIO()
+    out.write(_header(f"Sampling profil (har {interval * 1000:g} ms, {samples} ta namuna)", seconds))
+    out.write("=== thread'lar ===\n")
+    for thread, count in per_thread.most_common():
+        out.write(f"{count:8d}  {thread}\n")
+    out.write("\n=== stack tepasida (self) ===\n")
+    for (thread, label), count in own.most_common(top):
+        out.write(f"{count / n * 100:6.1f}%  {label}  [{thread}]\n")
+    out.write("\n=== stack ichida (total) ===\n")
+    for label, count in total.most_common(top):
+        out.write(f"{count / n * 100:6.1f}%  {label}\n")
+    return out.getvalue()
+
+
+async def memory_diff(seconds: float, top: int = PROFILE_TOP_N) -> str:
+    """tracemalloc: oyna boshidagi va oxiridagi snapshot'lar farqi"""
+    async with _exclusive():
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        try:
+            before = await _off_loop(tracemalloc.take_snapshot)
+            await asyncio.sleep(seconds)
+            after = await _off_loop(tracemalloc.take_snapshot)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started_here:
+                tracemalloc.stop()
+        return await _off_loop(_format_memory, before, after, current, peak, started_here, seconds, top)
+
+
+def _format_memory(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, current: int, peak: int,
+                   started_here: bool, seconds: float, top: int) -> str:
+    filters = (tracemalloc.Filter(False, tracemalloc.__file__),
+               tracemalloc.Filter(False, '<frozen importlib._bootstrap>'))
+    before = before.filter_traces(filters)
+    after = after.filter_traces(filters)
+    out = io.StringIO()
+    out.write(_header("Xotira profili (tracemalloc)", seconds))
+    if started_here:
+        out.write("tracemalloc shu oyna uchun yoqildi: faqat oyna ichidagi ajratmalar ko'rinadi\n")
+    out.write(f"kuzatilgan: {current / 1024 / 1024:.1f} MiB, cho'qqi: {peak / 1024 / 1024:.1f} MiB\n\n")
+    out.write("=== o'sish (qator bo'yicha) ===\n")
+    for stat in after.compare_to(before, 'lineno')[:top]:
+        out.write(f"{stat}\n")
+    out.write("\n=== o'sish (chaqiruvlar zanjiri bo'yicha, eng kattalari) ===\n")
+    for stat in after.compare_to(before, 'traceback')[:min(top, 10)]:
+        out.write(f"{stat.size_diff / 1024:+.1f} KiB, {stat.count_diff:+d} blok\n")
+        for line in stat.traceback.format(limit=TRACEMALLOC_FRAMES):
+            out.write(f"    {line}\n")
+    out.write("\n=== oxirgi snapshot: eng katta joylar ===\n")
+    for stat in after.statistics('lineno')[:top]:
+        out.write(f"{stat}\n")
+    return out.getvalue()
+
+
+def report_filename(kind: str) -> str:
+    return f"{kind}-{os.getpid()}-{int(time.time())}.txt"
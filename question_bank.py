@@ -0,0 +1,479 @@
+"""Savollar banki - har bir fan uchun xotiradagi o'zgarmas kesh.
+
+Bank bir marta quriladi va o'zgarmas yozuvlar sifatida saqlanadi: manba xeshi
+DB'ga qo'llangan xesh bilan bir xil bo'lsa - to'g'ridan-to'g'ri kompilyatsiya
+qilingan questions.bin yozuvlaridan (mmap, offset indeksi orqali), aks holda
+SQLite'dan. Quiz boshlashda SQLite'ga murojaat qilinmaydi - faqat indekslar
+ustida random.sample ishlatiladi.
+
+Shu yerda questions.bin formati ham bor: compile_questions.py uni yozadi, bot
+esa reload_banks'da mmap qilib ochiq saqlaydi.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+import random
+import re
+import struct
+import threading
+from datetime import datetime
+from types import MappingProxyType
+from typing import Awaitable, Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+
+import db
+import storage
+
+logger = logging.getLogger(__name__)
+
+# Fan -> JSON fayl (menyudagi tartibda)
+SUBJECTS = (
+    ('airlaw', 'questions_airlaw.json'),
+    ('aviation', 'questions_aviation.json'),
+    ('aviation_general', 'questions_aviation_general.json'),
+    ('meteorology', 'questions_meteorology.json'),
+    ('navigation', 'questions_navigation.json'),
+    ('cessna172', 'questions_cessna172.json'),
+    ('operations', 'questions_operations.json'),
+    ('radiotelephony', 'questions_radiotelephony.json')
+)
+
+_OPTION_PREFIX = re.compile(r'^([A-Da-d])\)\s*')
+
+
+def normalize_answer(value, options_count: int) -> int:
+    """correct_answer'ni variant indeksiga aylantirish ('B' -> 1, '2' -> 2, 2 -> 2)"""
+    if isinstance(value, bool):
+        raise ValueError(f"noto'g'ri correct_answer: {value!r}")
+    if isinstance(value, str):
+        value = value.strip()
+        if len(value) == 1 and value.upper() in 'ABCD':
+            value = ord(value.upper()) - ord('A')
+        else:
+            value = int(value)
+    if not isinstance(value, int) or not 0 <= value < options_count:
+        raise ValueError(f"correct_answer {value!r} variantlar oralig'idan tashqarida (options={options_count})")
+    return value
+
+
+def strip_option_prefixes(options: List[str]) -> List[str]:
+    """'A) matn' ko'rinishidagi harf prefikslarini olib tashlash (faqat harf tartibi mos kelsa)"""
+    cleaned = []
+    for i, option in enumerate(options):
+        match = _OPTION_PREFIX.match(option)
+        if match and match.group(1).upper() == chr(ord('A') + i):
+            option = option[match.end():]
+        cleaned.append(option)
+    return cleaned
+
+
+def normalize_question(question: Dict) -> Dict:
+    """Savolni yagona shaklga keltirish; xato bo'lsa ValueError"""
+    qid = question.get('id')
+    if not isinstance(qid, int):
+        raise ValueError(f"id butun son emas: {qid!r}")
+    text = question.get('question')
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError(f"savol {qid}: matn bo'sh")
+    options = question.get('options')
+    if not isinstance(options, list) or len(options) < 2 or not all(isinstance(o, str) for o in options):
+        raise ValueError(f"savol {qid}: 'options' kamida 2 ta matndan iborat ro'yxat bo'lishi kerak")
+    if len(options) > 4:
+        raise ValueError(f"savol {qid}: 4 tadan ko'p variant ({len(options)})")
+    try:
+        correct = normalize_answer(question.get('correct_answer'), len(options))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"savol {qid}: {e}")
+    return {
+        'id': qid,
+        'question': text,
+        'options': strip_option_prefixes(options),
+        'correct_answer': correct
+    }
+
+
+def _freeze_compiled(question: Dict) -> Mapping:
+    """questions.bin yozuvi allaqachon normallashtirilgan - faqat o'zgarmas qilinadi"""
+    return MappingProxyType({
+        'id': question['id'],
+        'question': question['question'],
+        'options': tuple(question['options']),
+        'correct_answer': question['correct_answer']
+    })
+
+
+def _freeze(question: Dict) -> Mapping:
+    """Savol dict'ini o'zgarmas yozuvga aylantirish (javob indeksi bir marta hisoblanadi)"""
+    options = strip_option_prefixes(list(question['options']))
+    try:
+        correct = normalize_answer(question['correct_answer'], len(options))
+    except (TypeError, ValueError):
+        correct = 0
+    return MappingProxyType({
+        'id': question['id'],
+        'question': question['question'],
+        'options': tuple(options),
+        'correct_answer': correct
+    })
+
+
+class QuestionBank:
+    """Bitta fanning o'zgarmas savollar to'plami"""
+    __slots__ = ('subject', 'version', 'questions', '_by_id')
+
+    def __init__(self, subject: str, version: int, questions: Tuple[Mapping, ...]):
+        self.subject = subject
+        self.version = version
+        self.questions = questions
+        self._by_id = {q['id']: i for i, q in enumerate(questions)}
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def sample(self, k: int) -> List[Mapping]:
+        """k ta tasodifiy savol - O(k), butun bankni saralamasdan"""
+        return [self.questions[i] for i in self.sample_indices(k)]
+
+    def sample_indices(self, k: int) -> List[int]:
+        """k ta tasodifiy savol indeksi - O(k)"""
+        return random.sample(range(len(self.questions)), k)
+
+    def index_of(self, qid: int) -> Optional[int]:
+        return self._by_id.get(qid)
+
+    def get(self, qid: int) -> Optional[Mapping]:
+        """Savolni id bo'yicha olish"""
+        index = self._by_id.get(qid)
+        return self.questions[index] if index is not None else None
+
+
+_banks: Dict[str, QuestionBank] = {}
+_lock = threading.Lock()
+# Ochiq turgan questions.bin (reload_banks ochadi, almashtirilsa qayta ochadi)
+_artifact: Optional['CompiledQuestions'] = None
+_artifact_path: Optional[str] = None
+
+
+def _compiled_questions(subject: str) -> Optional[Tuple[Mapping, ...]]:
+    """Artefakt DB'ga qo'llangan manba bilan bir xil bo'lsa - savollar shu yerdan"""
+    artifact = _artifact
+    if artifact is None:
+        return None
+    digest = artifact.source_hash(subject)
+    if digest is None or db.get_bank_source_hash(subject) != digest.hex():
+        return None
+    return tuple(_freeze_compiled(artifact.record(subject, i)) for i in range(artifact.count(subject)))
+
+
+def get_bank(subject: str) -> QuestionBank:
+    """Fan bankini keshdan olish; jadval o'zgargan bo'lsa qayta yuklash"""
+    bank = _banks.get(subject)
+    if bank is not None and bank.version == db.questions_version(subject):
+        return bank
+    with _lock:
+        version = db.questions_version(subject)
+        bank = _banks.get(subject)
+        if bank is None or bank.version != version:
+            questions = _compiled_questions(subject)
+            if questions is None:
+                questions = tuple(_freeze(q) for q in db.get_all_questions(subject))
+            bank = QuestionBank(subject, version, questions)
+            _banks[subject] = bank
+    return bank
+
+
+def refresh(subjects: List[str]):
+    """Boshqa jarayon DB'dagi savollarni yangilagan: keshni eskirgan deb belgilab qayta qurish"""
+    # reload_banks (load_source) o'qib turgan mmap almashtirilmasligi uchun
+    with _reload_lock:
+        if _artifact_path is not None:
+            attach_artifact(_artifact_path)
+        for subject in subjects:
+            db.invalidate_questions(subject)
+            get_bank(subject)
+
+
+def invalidate(subject: str = None):
+    """Keshni tozalash (subject berilmasa - hammasini)"""
+    with _lock:
+        if subject is None:
+            _banks.clear()
+        else:
+            _banks.pop(subject, None)
+
+
+# --- Kompilyatsiya qilingan fayl (questions.bin) ---
+#
+# Header:   MAGIC, uint32 fanlar soni
+# Fanlar:   uint16 nom uzunligi, nom (utf-8), 32 bayt manba sha256,
+#           uint32 savollar soni, uint64 offset indeksining joyi
+# Indeks:   har bir fan uchun uint64 yozuv offsetlari
+# Yozuv:    uint32 qid, uint8 correct, uint8 variantlar soni,
+#           uint32 uzunlik + savol matni, har bir variant: uint32 uzunlik + matn
+
+ARTIFACT_MAGIC = b'QBANK\x00\x01\x00'
+_HEADER = struct.Struct('<8sI')
+_SUBJECT = struct.Struct('<32sIQ')
+_RECORD = struct.Struct('<IBB')
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_U64 = struct.Struct('<Q')
+
+
+def source_hash(path: str) -> bytes:
+    """Manba JSON faylning sha256 xeshi (artefakt eskirganini aniqlash uchun)"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+def _encode_record(q: Dict) -> bytes:
+    parts = [_RECORD.pack(q['id'], q['correct_answer'], len(q['options']))]
+    for text in (q['question'], *q['options']):
+        data = text.encode('utf-8')
+        parts.append(_U32.pack(len(data)))
+        parts.append(data)
+    return b''.join(parts)
+
+
+def write_artifact(path: str, banks: Dict[str, Tuple[bytes, List[Dict]]]):
+    """Normallashtirilgan banklarni bitta binar faylga yozish (atomik almashtirish bilan)"""
+    names = list(banks)
+    header_size = _HEADER.size + sum(_U16.size + len(n.encode('utf-8')) + _SUBJECT.size for n in names)
+    offset = header_size
+    index_offsets = []
+    for name in names:
+        index_offsets.append(offset)
+        offset += _U64.size * len(banks[name][1])
+
+    header = [_HEADER.pack(ARTIFACT_MAGIC, len(names))]
+    indexes = []
+    records = []
+    for name, index_offset in zip(names, index_offsets):
+        digest, questions = banks[name]
+        encoded = name.encode('utf-8')
+        header.append(_U16.pack(len(encoded)) + encoded + _SUBJECT.pack(digest, len(questions), index_offset))
+        for q in questions:
+            indexes.append(_U64.pack(offset))
+            record = _encode_record(q)
+            records.append(record)
+            offset += len(record)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(b''.join(header))
+        f.write(b''.join(indexes))
+        f.write(b''.join(records))
+    os.replace(tmp_path, path)
+
+
+class CompiledQuestions:
+    """questions.bin faylini mmap orqali o'qish; yozuvlar talab qilinganda decode qilinadi"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            self.stat_key = (st.st_ino, st.st_size, st.st_mtime_ns)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = _HEADER.unpack_from(self._mm, 0)
+        if magic != ARTIFACT_MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path}: noma'lum format")
+        self._subjects: Dict[str, Tuple[bytes, int, int]] = {}
+        pos = _HEADER.size
+        for _ in range(count):
+            (name_len,) = _U16.unpack_from(self._mm, pos)
+            pos += _U16.size
+            name = bytes(self._mm[pos:pos + name_len]).decode('utf-8')
+            pos += name_len
+            self._subjects[name] = _SUBJECT.unpack_from(self._mm, pos)
+            pos += _SUBJECT.size
+
+    def subjects(self) -> List[str]:
+        return list(self._subjects)
+
+    def source_hash(self, subject: str) -> Optional[bytes]:
+        entry = self._subjects.get(subject)
+        return entry[0] if entry else None
+
+    def count(self, subject: str) -> int:
+        return self._subjects[subject][1]
+
+    def record(self, subject: str, index: int) -> Dict:
+        _, count, index_offset = self._subjects[subject]
+        if not 0 <= index < count:
+            raise IndexError(index)
+        (pos,) = _U64.unpack_from(self._mm, index_offset + index * _U64.size)
+        qid, correct, n_options = _RECORD.unpack_from(self._mm, pos)
+        pos += _RECORD.size
+        texts = []
+        for _ in range(n_options + 1):
+            (length,) = _U32.unpack_from(self._mm, pos)
+            pos += _U32.size
+            texts.append(self._mm[pos:pos + length].decode('utf-8'))
+            pos += length
+        return {'id': qid, 'question': texts[0], 'options': texts[1:], 'correct_answer': correct}
+
+    def questions(self, subject: str) -> Iterator[Dict]:
+        for i in range(self.count(subject)):
+            yield self.record(subject, i)
+
+    def close(self):
+        self._mm.close()
+
+
+def load_source(subject: str, path: str, artifact: CompiledQuestions = None) -> Tuple[bytes, List[Dict]]:
+    """Fan savollarini artefaktdan (manba xeshi mos bo'lsa) yoki JSON'dan o'qish"""
+    digest = source_hash(path)
+    if artifact is not None and artifact.source_hash(subject) == digest:
+        return digest, list(artifact.questions(subject))
+    if artifact is not None:
+        logger.warning(f"{subject}: questions.bin eskirgan, JSON'dan o'qilmoqda (compile_questions.py ni ishga tushiring)")
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    questions = []
+    seen = set()
+    for q in data:
+        try:
+            q = normalize_question(q)
+        except ValueError as e:
+            logger.warning(f"{subject}: savol o'tkazib yuborildi - {e}")
+            continue
+        # Takroriy id butun fan tranzaksiyasini buzmasligi uchun (birinchisi qoladi)
+        if q['id'] in seen:
+            logger.warning(f"{subject}: takroriy id {q['id']} o'tkazib yuborildi")
+            continue
+        seen.add(q['id'])
+        questions.append(q)
+    return digest, questions
+
+
+_reload_lock = threading.Lock()
+# Shu jarayonda manba fayli bilan sinxronlangan fanlar (lazy rejim uchun)
+_synced = set()
+
+
+def reload_banks(base_dir: str, artifact_path: str, subjects: List[str] = None,
+                 force: bool = False) -> Dict[str, Dict[str, int]]:
+    """Manba fayllari o'zgargan fanlarni DB bilan sinxronlash va keshni almashtirish.
+
+    Xeshi oxirgi qo'llangan xesh bilan bir xil bo'lgan fanlar o'tkazib yuboriladi.
+    Yangi bank to'liq qurilgandan keyin keshga qo'yiladi - boshlangan testlar esa
+    o'zlarining eski bank nusxasi bilan davom etadi.
+    """
+    results = {}
+    with _reload_lock:
+        artifact = attach_artifact(artifact_path)
+        for subject, filename in SUBJECTS:
+            if subjects is not None and subject not in subjects:
+                continue
+            path = os.path.join(base_dir, filename)
+            if not os.path.exists(path):
+                continue
+            digest = source_hash(path)
+            if not force and db.get_bank_source_hash(subject) == digest.hex():
+                _synced.add(subject)
+                continue
+            _, questions = load_source(subject, path, artifact)
+            result = db.sync_questions(subject, questions, digest.hex(), datetime.now().isoformat())
+            results[subject] = result
+            _synced.add(subject)
+            if any(result.values()):
+                get_bank(subject)  # yangi bankni oldindan qurib, atomik almashtirish
+                logger.info(f"{subject} banki yangilandi: {result}")
+    return results
+
+
+def ensure_subject(base_dir: str, artifact_path: str, subject: str) -> QuestionBank:
+    """Fan bankini birinchi murojaatda tayyorlash (lazy ishga tushish).
+
+    Shu jarayonda hali tekshirilmagan fan uchun manba xeshi solishtiriladi va
+    kerak bo'lsa DB yangilanadi; keyingi chaqiruvlar faqat keshdan oladi.
+    """
+    if subject not in _synced:
+        reload_banks(base_dir, artifact_path, subjects=[subject])
+        # Manba fayli yo'q fanlar ham qayta tekshirilmaydi
+        _synced.add(subject)
+    return get_bank(subject)
+
+
+def loaded_subjects() -> frozenset:
+    """Shu jarayonda sinxronlangan fanlar"""
+    return frozenset(_synced)
+
+
+def source_paths(base_dir: str, artifact_path: str) -> List[str]:
+    return [os.path.join(base_dir, filename) for _, filename in SUBJECTS] + [artifact_path]
+
+
+def _mtimes(paths: List[str]) -> Dict[str, int]:
+    result = {}
+    for path in paths:
+        try:
+            result[path] = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            result[path] = None
+    return result
+
+
+async def watch_banks(base_dir: str, artifact_path: str, interval: float, lease=None,
+                      on_reload: Callable[[Dict[str, Dict[str, int]]], Awaitable] = None):
+    """Bank fayllarini kuzatish: o'zgarsa reload_banks (xesh bo'yicha) chaqiriladi
+
+    lease berilsa (bir nechta worker), faqat uning egasi kuzatadi; on_reload
+    yangilangan fanlar bilan chaqiriladi (boshqa workerlarga xabar berish uchun).
+    """
+    paths = source_paths(base_dir, artifact_path)
+    known = _mtimes(paths)
+    while True:
+        await asyncio.sleep(interval)
+        if lease is not None and not await lease.hold():
+            continue
+        current = await storage.run(_mtimes, paths)
+        if current != known:
+            known = current
+            try:
+                results = await storage.run(reload_banks, base_dir, artifact_path)
+                if results:
+                    logger.info(f"Bank fayllari o'zgardi, qayta yuklandi: {results}")
+                    if on_reload is not None:
+                        await on_reload(results)
+            except Exception as e:
+                logger.error(f"Banklarni qayta yuklashda xatolik: {e}")
+
+
+def attach_artifact(path: str) -> Optional[CompiledQuestions]:
+    """questions.bin'ni ochiq saqlash: fayl almashtirilgan yoki o'chirilgan bo'lsa qayta ochish.
+
+    _reload_lock ostida chaqiriladi (reload_banks, refresh).
+    """
+    global _artifact, _artifact_path
+    _artifact_path = path
+    try:
+        st = os.stat(path)
+        key = (st.st_ino, st.st_size, st.st_mtime_ns)
+    except FileNotFoundError:
+        key = None
+    current = _artifact
+    if (current.stat_key if current is not None else None) == key:
+        return current
+    artifact = open_artifact(path) if key is not None else None
+    # get_bank yozuvlarni _lock ostida o'qiydi - eski mmap shu lock bilan yopiladi
+    with _lock:
+        _artifact = artifact
+        if current is not None:
+            current.close()
+    return artifact
+
+
+def open_artifact(path: str) -> Optional[CompiledQuestions]:
+    """Artefaktni ochish; yo'q yoki buzilgan bo'lsa None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        return CompiledQuestions(path)
+    except (OSError, ValueError, struct.error) as e:
+        logger.warning(f"{path} ni ochib bo'lmadi: {e}")
+        return None
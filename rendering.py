@@ -0,0 +1,163 @@
+"""Savol ekranlari va menyu klaviaturalarini oldindan tayyorlash.
+
+Savol matni (savol + variantlar) va javob klaviaturasi (subject, qid, til)
+bo'yicha bir marta quriladi va LRU keshda saqlanadi. Har bir ko'rishda faqat
+kichik progress/ball sarlavhasi yig'iladi. Statik menyular (til tanlash,
+asosiy menyu, test turi, natija) ishga tushishda bir marta quriladi.
+"""
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import router
+
+RENDER_CACHE_SIZE = int(os.getenv('RENDER_CACHE_SIZE', 4096))
+
+OPTION_LETTERS = ('A', 'B', 'C', 'D')
+
+LANGUAGE_PICKER_TEXT = "🌍 Tilni tanlang / Выберите язык / Choose language:"
+LANGUAGE_PICKER = InlineKeyboardMarkup([[
+    InlineKeyboardButton("🇺🇿 O'zbekcha", callback_data=router.encode(router.LANGUAGE, 'uz')),
+    InlineKeyboardButton("🇷🇺 Русский", callback_data=router.encode(router.LANGUAGE, 'ru')),
+    InlineKeyboardButton("🇺🇸 English", callback_data=router.encode(router.LANGUAGE, 'en'))
+]])
+
+
+class RenderedQuestion:
+    """Bitta savolning tayyor matni va klaviaturalari"""
+    __slots__ = ('header', 'body', 'footer', 'markup_first', 'markup_rest')
+
+    def __init__(self, header: str, body: str, footer: str,
+                 markup_first: InlineKeyboardMarkup, markup_rest: InlineKeyboardMarkup):
+        self.header = header
+        self.body = body
+        self.footer = footer
+        self.markup_first = markup_first
+        self.markup_rest = markup_rest
+
+    def text(self, current: int, total: int, correct: int) -> str:
+        return f"{self.header} ({current}/{total})**\n\n{self.body}{self.footer}{correct}"
+
+    def markup(self, has_prev: bool) -> InlineKeyboardMarkup:
+        return self.markup_rest if has_prev else self.markup_first
+
+
+def build_question(question, language: str, translate: Callable[[str, str], str]) -> RenderedQuestion:
+    """Savol ekranini noldan qurish"""
+    body = f"❓ {question['question']}\n\n"
+    options = question['options']
+    for i, letter in enumerate(OPTION_LETTERS):
+        if i < len(options):
+            body += f"{letter}) {options[i]}\n"
+
+    # Javob tugmalari (argument - variant indeksi), 2 tadan qatorga
+    answer_buttons = [
+        InlineKeyboardButton(letter, callback_data=router.encode(router.ANSWER, i))
+        for i, letter in enumerate(OPTION_LETTERS) if i < len(options)
+    ]
+    answer_rows = [answer_buttons[i:i + 2] for i in range(0, len(answer_buttons), 2)]
+
+    back = InlineKeyboardButton(translate(language, 'back'), callback_data=router.encode(router.PREV))
+    forward = InlineKeyboardButton(translate(language, 'forward'), callback_data=router.encode(router.NEXT))
+    restart = InlineKeyboardButton(translate(language, 'restart'), callback_data=router.encode(router.RESTART))
+    menu_row = [InlineKeyboardButton(translate(language, 'back_to_menu'),
+                                     callback_data=router.encode(router.MAIN_MENU))]
+
+    return RenderedQuestion(
+        header=f"📝 **{translate(language, 'question')} {question['id']}",
+        body=body,
+        footer=f"\n✅ {translate(language, 'correct_answers')}: ",
+        markup_first=InlineKeyboardMarkup(answer_rows + [[forward, restart], menu_row]),
+        markup_rest=InlineKeyboardMarkup(answer_rows + [[back, forward, restart], menu_row])
+    )
+
+
+class QuestionRenderCache:
+    """(subject, bank versiyasi, qid, til) -> RenderedQuestion, LRU"""
+
+    def __init__(self, maxsize: int = RENDER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._cache: 'OrderedDict[tuple, RenderedQuestion]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, bank, question, language: str, translate: Callable[[str, str], str]) -> RenderedQuestion:
+        key = (bank.subject, bank.version, question['id'], language)
+        rendered = self._cache.get(key)
+        if rendered is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return rendered
+        self.misses += 1
+        rendered = build_question(question, language, translate)
+        self._cache[key] = rendered
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return rendered
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+
+class MenuKeyboards:
+    """Har bir til uchun bir marta qurilgan statik klaviaturalar"""
+
+    def __init__(self, translations, subjects: Iterable[str]):
+        self.subjects = tuple(subjects)
+        self._main_menu = {}
+        self._main_menu_text = {}
+        self._test_mode = {}
+        self._results = {}
+        for language, t in translations.tables.items():
+            rows = [[InlineKeyboardButton(t.get(s, s), callback_data=router.encode(router.SUBJECT, s))]
+                    for s in self.subjects]
+            rows.append([InlineKeyboardButton(t.get('choose_language', 'choose_language'),
+                                              callback_data=router.encode(router.CHANGE_LANGUAGE))])
+            admin_row = [InlineKeyboardButton("🔧 Admin Panel", callback_data=router.encode(router.ADMIN_PANEL))]
+            self._main_menu_text[language] = (
+                f"{t.get('start_message', 'start_message')}\n\n{t.get('choose_subject', 'choose_subject')}"
+            )
+            self._main_menu[language, False] = InlineKeyboardMarkup(rows)
+            self._main_menu[language, True] = InlineKeyboardMarkup(rows + [admin_row])
+
+            back_to_menu = InlineKeyboardButton(t.get('back_to_menu', 'back_to_menu'),
+                                                callback_data=router.encode(router.MAIN_MENU))
+            for subject in self.subjects:
+                self._test_mode[language, subject] = InlineKeyboardMarkup([
+                    [InlineKeyboardButton(t.get('random_test', 'random_test'),
+                                          callback_data=router.test_mode_data('random', subject))],
+                    [InlineKeyboardButton(t.get('sequential_test', 'sequential_test'),
+                                          callback_data=router.test_mode_data('sequential', subject))],
+                    [back_to_menu]
+                ])
+            self._results[language] = InlineKeyboardMarkup([[
+                InlineKeyboardButton(t.get('restart', 'restart'), callback_data=router.encode(router.RESTART)),
+                back_to_menu
+            ]])
+        self._default = next(iter(translations.tables), None)
+
+    def _language(self, language: str) -> str:
+        return language if (language, False) in self._main_menu else self._default
+
+    def main_menu(self, language: str, admin: bool = False) -> InlineKeyboardMarkup:
+        return self._main_menu[self._language(language), admin]
+
+    def main_menu_text(self, language: str) -> str:
+        return self._main_menu_text[self._language(language)]
+
+    def test_mode(self, language: str, subject: str) -> InlineKeyboardMarkup:
+        return self._test_mode[self._language(language), subject]
+
+    def results(self, language: str) -> InlineKeyboardMarkup:
+        return self._results[self._language(language)]
@@ -0,0 +1,240 @@
+"""Callback tugmalari uchun jadvalga asoslangan router.
+
+callback_data ixcham va versiyalangan formatda: `1:<marshrut>[:arg...]`,
+masalan `1:t:r:airlaw` (test turi: random, fan: airlaw). Eski formatdagi
+tugmalar (`testmode_random_airlaw`, `answer_0`, ...) ham tanib olinadi,
+shuning uchun oldin yuborilgan xabarlar ishlashda davom etadi.
+
+Har bir marshrut alohida CallbackQueryHandler sifatida ro'yxatdan o'tadi.
+callback_data bir marta dekodlanadi (LRU kesh), handler'lar esa faqat
+marshrut kodini solishtiradi. Argumentlar (fan, rejim, til, variant)
+bir marta qurilgan registr bo'yicha tekshiriladi.
+"""
+import functools
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import CallbackQueryHandler, ContextTypes
+
+logger = logging.getLogger(__name__)
+
+VERSION = '1'
+SEP = ':'
+
+# Sekin marshrutlarni loglash chegarasi (soniya)
+ROUTE_SLOW_THRESHOLD = float(os.getenv('ROUTE_SLOW_THRESHOLD', '1.0'))
+
+# Marshrut kodlari
+LANGUAGE = 'l'
+CHANGE_LANGUAGE = 'cl'
+MAIN_MENU = 'm'
+SUBJECT = 's'
+TEST_MODE = 't'
+ANSWER = 'a'
+NEXT = 'n'
+PREV = 'p'
+RESTART = 'r'
+ADMIN_PANEL = 'ap'
+ADMIN_BROADCAST = 'ab'
+ADMIN_STATISTICS = 'as'
+ADMIN_USERS = 'au'
+ADMIN_RELOAD = 'ar'
+ADMIN_PROFILE = 'pc'
+ADMIN_MEMORY = 'pm'
+
+# Log va metrikalardagi o'qiladigan nomlar
+ROUTE_NAMES = {
+    LANGUAGE: 'language',
+    CHANGE_LANGUAGE: 'change_language',
+    MAIN_MENU: 'main_menu',
+    SUBJECT: 'subject',
+    TEST_MODE: 'test_mode',
+    ANSWER: 'answer',
+    NEXT: 'next',
+    PREV: 'prev',
+    RESTART: 'restart',
+    ADMIN_PANEL: 'admin_panel',
+    ADMIN_BROADCAST: 'admin_broadcast',
+    ADMIN_STATISTICS: 'admin_statistics',
+    ADMIN_USERS: 'admin_users',
+    ADMIN_RELOAD: 'admin_reload',
+    ADMIN_PROFILE: 'admin_profile',
+    ADMIN_MEMORY: 'admin_memory'
+}
+
+MODES = {'r': 'random', 's': 'sequential'}
+MODE_CODES = {mode: code for code, mode in MODES.items()}
+
+# Eski format: aniq qiymatlar va prefikslar
+LEGACY_EXACT = {
+    'change_language': CHANGE_LANGUAGE,
+    'main_menu': MAIN_MENU,
+    'back_to_menu': MAIN_MENU,
+    'next': NEXT,
+    'prev': PREV,
+    'restart': RESTART,
+    'admin_panel': ADMIN_PANEL,
+    'admin_broadcast': ADMIN_BROADCAST,
+    'admin_statistics': ADMIN_STATISTICS,
+    'admin_users': ADMIN_USERS,
+    'admin_reload': ADMIN_RELOAD
+}
+LEGACY_PREFIX = {
+    'lang_': LANGUAGE,
+    'subject_': SUBJECT,
+    'answer_': ANSWER
+}
+
+Route = Tuple[str, tuple]
+RouteCallback = Callable[..., Awaitable]
+# Ruxsat tekshiruvi: rad etilsa foydalanuvchiga ko'rsatiladigan matn, aks holda None
+RouteGuard = Callable[[Update], Optional[str]]
+TimingHook = Callable[[str, float, Optional[BaseException]], None]
+
+
+def encode(route: str, *args) -> str:
+    """Marshrut va argumentlardan callback_data yasash"""
+    return SEP.join((VERSION, route) + tuple(str(a) for a in args))
+
+
+def test_mode_data(mode: str, subject: str) -> str:
+    return encode(TEST_MODE, MODE_CODES[mode], subject)
+
+
+class Registry:
+    """Ruxsat etilgan fanlar, tillar va variantlar (bir marta quriladi)"""
+    __slots__ = ('subjects', 'languages', 'options')
+
+    def __init__(self, subjects: Iterable[str], languages: Iterable[str], options: int = 4):
+        self.subjects = frozenset(subjects)
+        self.languages = frozenset(languages)
+        self.options = options
+
+    def validate(self, route: str, args: tuple) -> Optional[tuple]:
+        """Argumentlarni tekshirish va kerakli turga keltirish; yaroqsiz bo'lsa None"""
+        if route == LANGUAGE:
+            return args if len(args) == 1 and args[0] in self.languages else None
+        if route == SUBJECT:
+            return args if len(args) == 1 and args[0] in self.subjects else None
+        if route == TEST_MODE:
+            if len(args) != 2 or args[0] not in MODES or args[1] not in self.subjects:
+                return None
+            return MODES[args[0]], args[1]
+        if route == ANSWER:
+            if len(args) != 1 or not args[0].isdigit() or int(args[0]) >= self.options:
+                return None
+            return (int(args[0]),)
+        return () if not args else None
+
+
+def _decode_legacy(data: str) -> Optional[Route]:
+    route = LEGACY_EXACT.get(data)
+    if route is not None:
+        return route, ()
+    if data.startswith('testmode_'):
+        # testmode_<rejim>_<fan>, fan nomida ham '_' bo'lishi mumkin
+        parts = data.split('_', 2)
+        if len(parts) == 3 and parts[1] in MODE_CODES:
+            return TEST_MODE, (MODE_CODES[parts[1]], parts[2])
+        return None
+    for prefix, route in LEGACY_PREFIX.items():
+        if data.startswith(prefix):
+            return route, (data[len(prefix):],)
+    return None
+
+
+class Router:
+    """Marshrut kodi -> handler jadvali"""
+
+    def __init__(self, registry: Registry, cache_size: int = 4096):
+        self.registry = registry
+        self._routes: Dict[str, RouteCallback] = {}
+        self._guards: Dict[str, RouteGuard] = {}
+        self._hooks: List[TimingHook] = [self._log_slow]
+        self.decode = functools.lru_cache(maxsize=cache_size)(self._decode)
+
+    def route(self, code: str, guard: Optional[RouteGuard] = None):
+        """Dekorator: marshrut uchun handler ro'yxatdan o'tkazish.
+
+        guard rad etsa, so'rovga uning matni bilan javob beriladi va handler
+        chaqirilmaydi (callback so'roviga faqat bir marta javob berish mumkin).
+        """
+        def register(callback: RouteCallback) -> RouteCallback:
+            self._routes[code] = callback
+            if guard is not None:
+                self._guards[code] = guard
+            return callback
+        return register
+
+    def add_hook(self, hook: TimingHook):
+        """Har bir marshrutdan keyin (kod, davomiylik, xatolik) bilan chaqiriladi"""
+        self._hooks.append(hook)
+
+    def _decode(self, data: str) -> Optional[Route]:
+        if data.startswith(VERSION + SEP):
+            parts = data.split(SEP)
+            decoded = (parts[1], tuple(parts[2:])) if len(parts) > 1 else None
+        else:
+            decoded = _decode_legacy(data)
+        if decoded is None or decoded[0] not in self._routes:
+            return None
+        args = self.registry.validate(*decoded)
+        if args is None:
+            return None
+        return decoded[0], args
+
+    def _matches(self, code: str, data: object) -> bool:
+        if not isinstance(data, str):
+            return False
+        decoded = self.decode(data)
+        return decoded is not None and decoded[0] == code
+
+    def _is_unknown(self, data: object) -> bool:
+        return not isinstance(data, str) or self.decode(data) is None
+
+    def _wrap(self, code: str, callback: RouteCallback, guard: Optional[RouteGuard] = None):
+        async def handle(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            query = update.callback_query
+            started = time.perf_counter()
+            error = None
+            try:
+                denial = guard(update) if guard is not None else None
+                await query.answer(denial)
+                if denial is not None:
+                    return
+                _, args = self.decode(query.data)
+                await callback(update, context, *args)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                for hook in self._hooks:
+                    try:
+                        hook(code, elapsed, error)
+                    except Exception as e:
+                        logger.error(f"Marshrut hook xatolik ({code}): {e}")
+        return handle
+
+    async def _unknown(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # Eskirgan yoki buzilgan tugma - faqat "soat"ni to'xtatamiz
+        logger.warning(f"Noma'lum callback: {update.callback_query.data!r}")
+        await update.callback_query.answer()
+
+    def handlers(self) -> List[CallbackQueryHandler]:
+        """Har bir marshrut uchun alohida handler + noma'lum tugmalar uchun oxirgisi"""
+        self.decode.cache_clear()
+        handlers = [
+            CallbackQueryHandler(self._wrap(code, callback, self._guards.get(code)), pattern=functools.partial(self._matches, code))
+            for code, callback in self._routes.items()
+        ]
+        handlers.append(CallbackQueryHandler(self._unknown, pattern=self._is_unknown))
+        return handlers
+
+    @staticmethod
+    def _log_slow(code: str, elapsed: float, error: Optional[BaseException]):
+        if elapsed >= ROUTE_SLOW_THRESHOLD:
+            logger.warning(f"Sekin marshrut {code}: {elapsed * 1000:.0f} ms")
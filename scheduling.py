@@ -0,0 +1,139 @@
+"""Update'larni parallel qayta ishlash va kechiktirilgan o'tishlar.
+
+PerUserUpdateProcessor turli foydalanuvchilarning update'larini parallel
+bajaradi, bitta foydalanuvchinikini esa kelish tartibida ketma-ket. Navbatda
+turgan update bajarish slotini egallamaydi: avval foydalanuvchi lock'i, keyin
+processorning o'z semafori olinadi - bitta tez bosayotgan foydalanuvchi
+boshqalarni to'sib qo'ya olmaydi. PTB semafori (konstruktor orqali) faqat
+qabul qilingan update'lar sonini cheklaydi.
+TransitionScheduler handler ichidagi `asyncio.sleep` o'rniga ishlatiladi:
+o'tish taymerga qo'yiladi va handler darhol tugaydi.
+"""
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def update_key(update: object) -> Optional[int]:
+    """Update qaysi foydalanuvchiga tegishli (tartib kaliti)"""
+    if isinstance(update, Update):
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+    return None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Foydalanuvchilar orasida parallel, bitta foydalanuvchi ichida ketma-ket"""
+
+    def __init__(self, max_concurrent_updates: int,
+                 preload: Optional[Callable[[int], Awaitable]] = None,
+                 max_pending_per_user: int = 0,
+                 max_queued_updates: int = 1024):
+        # PTB semafori: qabul qilingan (navbatdagi + bajarilayotgan) update'lar
+        super().__init__(max_concurrent_updates + max_queued_updates)
+        # Bir vaqtda bajariladiganlar - foydalanuvchi lock'idan keyin olinadi
+        self.max_running_updates = max_concurrent_updates
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._users: Dict[int, int] = {}
+        # Bitta foydalanuvchining navbatdagi update'lari chegarasi (0 - cheklanmagan)
+        self.max_pending_per_user = max_pending_per_user
+        self.dropped = 0
+        # Handlerdan oldin foydalanuvchi ma'lumotlarini (masalan sessiyani) yuklash uchun
+        self._preload = preload
+
+    @asynccontextmanager
+    async def user_lock(self, key: Optional[int]):
+        """Bitta foydalanuvchi uchun navbat (lock'lar kerak bo'lmaganda o'chiriladi)"""
+        if key is None:
+            yield
+            return
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                del self._locks[key]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        """Avval foydalanuvchi navbati, keyin bajarish sloti"""
+        key = update_key(update)
+        if key is not None and self.max_pending_per_user and \
+                self._users.get(key, 0) >= self.max_pending_per_user:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(f"{key} navbati to'la ({self._users[key]}), update tashlandi (jami {self.dropped})")
+            coroutine.close()
+            return
+        async with self.user_lock(key):
+            async with self._slots:
+                if self._preload is not None and key is not None:
+                    try:
+                        await self._preload(key)
+                    except Exception as e:
+                        logger.error(f"Preload xatolik ({key}): {e}")
+                await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+class TransitionScheduler:
+    """Foydalanuvchi uchun bitta kechiktirilgan o'tish (yangisi eskisini almashtiradi)"""
+
+    def __init__(self, processor: PerUserUpdateProcessor):
+        self._processor = processor
+        self._pending: Dict[int, asyncio.TimerHandle] = {}
+        self._tasks = set()
+
+    def schedule(self, key: int, delay: float, callback: Callable[[], Awaitable]):
+        self.cancel(key)
+        loop = asyncio.get_running_loop()
+        self._pending[key] = loop.call_later(delay, self._fire, key, callback)
+
+    def cancel(self, key: int):
+        handle = self._pending.pop(key, None)
+        if handle is not None:
+            handle.cancel()
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _fire(self, key: int, callback: Callable[[], Awaitable]):
+        self._pending.pop(key, None)
+        task = asyncio.get_running_loop().create_task(self._run(key, callback))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: int, callback: Callable[[], Awaitable]):
+        # O'tish ham shu foydalanuvchi update'lari bilan bitta navbatda bajariladi
+        try:
+            async with self._processor.user_lock(key):
+                await callback()
+        except Exception as e:
+            logger.error(f"Rejalashtirilgan o'tishda xatolik ({key}): {e}")
+
+    async def shutdown(self):
+        """Kutilayotgan taymerlarni bekor qilish, ishlayotganlarini kutish"""
+        for handle in self._pending.values():
+            handle.cancel()
+        self._pending.clear()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
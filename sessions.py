@@ -0,0 +1,383 @@
+"""Foydalanuvchi sessiyalari ombori.
+
+Xotiradagi LRU dict oldingi qatlam bo'lib ishlaydi, o'zgargan sessiyalar esa
+fon rejimida (write-behind) backend'ga yoziladi. O'qish uchun peek(), o'zgartirish
+uchun get()/get_or_create() yoki peek() + mark_dirty() - faqat o'zgargan sessiya
+qayta serializatsiya qilinadi. Bot qayta ishga tushganda
+hech narsa oldindan yuklanmaydi - sessiya foydalanuvchining birinchi
+murojaatida backend'dan tiklanadi.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import db
+import question_bank
+import storage
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = float(os.getenv('SESSION_FLUSH_INTERVAL', 2.0))
+# Ishlatilmagan sessiya xotirada qancha turadi (soniya) va xotiradagi sessiyalar chegarasi
+SESSION_TTL = float(os.getenv('SESSION_TTL', 6 * 3600))
+MAX_RESIDENT = int(os.getenv('SESSION_MAX_RESIDENT', 50000))
+
+UNANSWERED = -1
+INVALID_ANSWER = -2
+
+
+class UserSession:
+    """Ixcham sessiya: savollar o'rniga umumiy bankdagi indekslar va packed massivlar.
+
+    order    - bankdagi savol indekslari (random: array('I'), sequential: range)
+    answers  - har bir savolga tanlangan variant (array('b'), -1 = javob berilmagan)
+    correct  - to'g'ri javoblar bitset'i (bytearray)
+    """
+    __slots__ = ('language', 'state', 'subject', 'test_mode', 'bank', 'order',
+                 'current_question', 'correct_answers', 'answers', 'correct')
+
+    def __init__(self, language: str = 'uz', state: str = 'menu'):
+        self.language = language
+        self.state = state
+        self.subject = None
+        self.test_mode = None
+        self.bank = None
+        self.order = ()
+        self.current_question = 0
+        self.correct_answers = 0
+        self.answers = None
+        self.correct = None
+
+    def start_quiz(self, bank: question_bank.QuestionBank, test_mode: str, order):
+        self.subject = bank.subject
+        self.test_mode = test_mode
+        self.bank = bank  # snapshot: bank yangilansa ham shu test eski savollar bilan davom etadi
+        self.order = order
+        self.current_question = 0
+        self.correct_answers = 0
+        self.answers = array('b', [UNANSWERED]) * len(order)
+        self.correct = bytearray((len(order) + 7) // 8)
+        self.state = 'quiz'
+
+    @property
+    def total(self) -> int:
+        return len(self.order)
+
+    def question(self, index: int):
+        return self.bank.questions[self.order[index]]
+
+    def is_correct(self, index: int) -> bool:
+        return bool(self.correct[index >> 3] & (1 << (index & 7)))
+
+    def record_answer(self, index: int, answer: Optional[int], is_correct: bool):
+        if self.is_correct(index):
+            self.correct_answers -= 1
+        self.answers[index] = answer if answer is not None and 0 <= answer < 127 else INVALID_ANSWER
+        if is_correct:
+            self.correct[index >> 3] |= 1 << (index & 7)
+            self.correct_answers += 1
+        else:
+            self.correct[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    def clear_answer(self, index: int):
+        if self.is_correct(index):
+            self.correct_answers -= 1
+            self.correct[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+        self.answers[index] = UNANSWERED
+
+    def to_dict(self) -> dict:
+        """Saqlash uchun - savollar bank indeksi emas, qid bilan (bank o'zgarsa ham mos keladi)"""
+        data = {'language': self.language, 'state': self.state}
+        if self.bank is not None:
+            questions = self.bank.questions
+            data.update({
+                'subject': self.subject,
+                'test_mode': self.test_mode,
+                'question_ids': [questions[i]['id'] for i in self.order],
+                'current_question': self.current_question,
+                'answers': self.answers.tolist(),
+                'correct': self.correct.hex()
+            })
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'UserSession':
+        session = cls(data.get('language', 'uz'), data.get('state', 'menu'))
+        question_ids = data.get('question_ids')
+        if question_ids is None or not data.get('subject'):
+            return session
+        bank = question_bank.get_bank(data['subject'])
+        indices = [bank.index_of(qid) for qid in question_ids]
+        if None in indices:
+            # Savollar banki o'zgargan - tugallanmagan testni tiklab bo'lmaydi
+            session.state = 'menu'
+            return session
+        if data.get('test_mode') == 'sequential' and indices == list(range(len(bank))):
+            order = range(len(bank))
+        else:
+            order = array('I', indices)
+        session.start_quiz(bank, data.get('test_mode'), order)
+        session.state = data.get('state', 'quiz')
+        session.current_question = data.get('current_question', 0)
+        if 'correct' in data:
+            session.answers = array('b', data['answers'])
+            session.correct = bytearray.fromhex(data['correct'])
+            session.correct_answers = sum(bin(b).count('1') for b in session.correct)
+        else:
+            # Eski format: answers - {'user_answer', 'is_correct'} dict'lar ro'yxati
+            for i, answer in enumerate(data.get('answers') or []):
+                if answer:
+                    session.record_answer(i, answer.get('user_answer'), answer.get('is_correct'))
+        return session
+
+
+def serialize(session: UserSession) -> str:
+    return json.dumps(session.to_dict(), ensure_ascii=False)
+
+
+def deserialize(raw: str) -> UserSession:
+    return UserSession.from_dict(json.loads(raw))
+
+
+class SQLiteSessionBackend:
+    """Sessiyalarni bot_data.db'dagi sessions jadvalida saqlash"""
+
+    def load(self, user_id: int) -> Optional[str]:
+        return db.load_session(user_id)
+
+    def save_many(self, rows: List[tuple]):
+        db.save_sessions(rows)
+
+
+class SessionStore:
+    """Xotira + write-behind persistence; dict'ga o'xshash interfeys.
+
+    Xotirada turgan sessiyalar soni chegaralangan: SESSION_TTL soniya
+    ishlatilmagan sessiyalar va SESSION_MAX_RESIDENT dan oshgan eng eski
+    (LRU) sessiyalar xotiradan chiqariladi. Chiqarilgan sessiya diskka
+    yoziladi va foydalanuvchi qaytib kelganda avtomatik tiklanadi.
+    """
+
+    def __init__(self, backend=None, flush_interval: float = FLUSH_INTERVAL,
+                 ttl: float = SESSION_TTL, max_resident: int = MAX_RESIDENT):
+        self.backend = backend or SQLiteSessionBackend()
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self.max_resident = max_resident
+        # LRU tartibida: eng eski murojaat boshida
+        self._sessions: 'OrderedDict[int, UserSession]' = OrderedDict()
+        self._last_access: Dict[int, float] = {}
+        self._absent = set()  # backend'da yo'qligi aniqlangan foydalanuvchilar
+        self._dirty = set()
+        self._spilled: Dict[int, str] = {}  # chiqarilgan, lekin hali diskka yozilmagan sessiyalar
+        self._flush_task = None
+        self.evictions_ttl = 0
+        self.evictions_lru = 0
+        self.reloads = 0
+
+    # --- rehydration ---
+    def _resident(self, user_id: int, session: UserSession) -> UserSession:
+        self._sessions[user_id] = session
+        self._sessions.move_to_end(user_id)
+        self._last_access[user_id] = time.monotonic()
+        self._absent.discard(user_id)
+        if len(self._sessions) > self.max_resident:
+            self._evict_lru()
+        return session
+
+    def _fetch(self, user_id: int) -> Optional[str]:
+        raw = self._spilled.pop(user_id, None)
+        if raw is not None:
+            # Hali yozilmagan nusxa - qayta tiklangach yana yozish navbatiga
+            self._dirty.add(user_id)
+            return raw
+        return self.backend.load(user_id)
+
+    def _load(self, user_id: int) -> Optional[UserSession]:
+        session = self._sessions.get(user_id)
+        if session is not None:
+            self._sessions.move_to_end(user_id)
+            self._last_access[user_id] = time.monotonic()
+            return session
+        if user_id in self._absent:
+            return None
+        try:
+            raw = self._fetch(user_id)
+            session = deserialize(raw) if raw else None
+        except Exception as e:
+            logger.error(f"Sessiyani tiklashda xatolik ({user_id}): {e}")
+            session = None
+        if session is None:
+            self._mark_absent(user_id)
+            return None
+        self.reloads += 1
+        return self._resident(user_id, session)
+
+    def _mark_absent(self, user_id: int):
+        # Manfiy kesh ham chegaralangan
+        if len(self._absent) >= self.max_resident:
+            self._absent.clear()
+        self._absent.add(user_id)
+
+    async def preload(self, user_id: int):
+        """Sessiyani event loop'dan tashqarida oldindan yuklash (update kelganda)"""
+        if user_id is None or user_id in self._sessions or user_id in self._absent:
+            return
+        if user_id in self._spilled:
+            self._load(user_id)
+            return
+        raw = await storage.run(self.backend.load, user_id)
+        if user_id in self._sessions or user_id in self._spilled:
+            return
+        if raw:
+            try:
+                session = await storage.run(deserialize, raw)
+                if user_id not in self._sessions:
+                    self.reloads += 1
+                    self._resident(user_id, session)
+                return
+            except Exception as e:
+                logger.error(f"Sessiyani tiklashda xatolik ({user_id}): {e}")
+        self._mark_absent(user_id)
+
+    # --- dict interfeysi ---
+    def __contains__(self, user_id: int) -> bool:
+        return self._load(user_id) is not None
+
+    def __getitem__(self, user_id: int) -> UserSession:
+        """Faqat o'qish uchun (yozish navbatiga qo'ymaydi)"""
+        session = self._load(user_id)
+        if session is None:
+            raise KeyError(user_id)
+        return session
+
+    def __setitem__(self, user_id: int, session: UserSession):
+        self._spilled.pop(user_id, None)
+        self._resident(user_id, session)
+        self._dirty.add(user_id)
+
+    def peek(self, user_id: int, default=None):
+        """Sessiyani o'qish uchun olish (yozish navbatiga qo'ymaydi)"""
+        session = self._load(user_id)
+        return default if session is None else session
+
+    def get(self, user_id: int, default=None):
+        """Sessiyani o'zgartirish uchun olish - yozish navbatiga qo'yiladi"""
+        session = self._load(user_id)
+        if session is None:
+            return default
+        self._dirty.add(user_id)
+        return session
+
+    def mark_dirty(self, user_id: int):
+        """peek() bilan olingan sessiya joyida o'zgartirilgandan keyin"""
+        if user_id in self._sessions:
+            self._dirty.add(user_id)
+
+    def get_or_create(self, user_id: int) -> UserSession:
+        session = self.get(user_id)
+        if session is None:
+            session = UserSession()
+            self[user_id] = session
+        return session
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._sessions)
+
+    # --- eviction ---
+    def _evict(self, user_id: int):
+        session = self._sessions.pop(user_id)
+        self._last_access.pop(user_id, None)
+        if user_id in self._dirty:
+            self._dirty.discard(user_id)
+            self._spilled[user_id] = serialize(session)
+
+    def _evict_lru(self):
+        while len(self._sessions) > self.max_resident:
+            user_id = next(iter(self._sessions))
+            self._evict(user_id)
+            self.evictions_lru += 1
+
+    def evict_idle(self) -> int:
+        """TTL'dan ko'p ishlatilmagan sessiyalarni xotiradan chiqarish"""
+        deadline = time.monotonic() - self.ttl
+        evicted = 0
+        # OrderedDict LRU tartibida - birinchi yangi sessiyada to'xtaymiz
+        while self._sessions:
+            user_id = next(iter(self._sessions))
+            if self._last_access.get(user_id, 0) > deadline:
+                break
+            self._evict(user_id)
+            evicted += 1
+        self.evictions_ttl += evicted
+        return evicted
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'resident': len(self._sessions),
+            'dirty': len(self._dirty),
+            'spilled_pending': len(self._spilled),
+            'evictions_ttl': self.evictions_ttl,
+            'evictions_lru': self.evictions_lru,
+            'reloads': self.reloads
+        }
+
+    # --- write-behind ---
+    def _collect(self) -> List[tuple]:
+        now = datetime.now().isoformat()
+        rows = {}
+        spilled, self._spilled = self._spilled, {}
+        for user_id, raw in spilled.items():
+            rows[user_id] = (user_id, raw, now)
+        dirty, self._dirty = self._dirty, set()
+        for user_id in dirty:
+            session = self._sessions.get(user_id)
+            if session is not None:
+                rows[user_id] = (user_id, serialize(session), now)
+        return list(rows.values())
+
+    async def flush(self):
+        """O'zgargan va chiqarilgan sessiyalarni backend'ga yozish"""
+        # Serializatsiya event loop'da (sessiyalar shu yerda o'zgaradi), yozish esa executor'da
+        rows = self._collect()
+        if rows:
+            try:
+                await storage.run(self.backend.save_many, rows)
+            except Exception as e:
+                logger.error(f"Sessiyalarni saqlashda xatolik: {e}")
+                # Keyingi urinishda qayta yoziladi (yangiroq nusxa bo'lsa, u ustun)
+                for user_id, raw, _ in rows:
+                    if user_id not in self._sessions:
+                        self._spilled.setdefault(user_id, raw)
+                    else:
+                        self._dirty.add(user_id)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self.evict_idle():
+                logger.info(f"Ishlatilmagan sessiyalar chiqarildi: {self.stats()}")
+            await self.flush()
+
+    def start(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def shutdown(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
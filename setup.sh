@@ -5,18 +5,23 @@ echo "🚀 Telegram Bot tezkor o'rnatish boshlandi..."
 
 # 1. Dependencies o'rnatish
 echo "📦 Kutubxonalar o'rnatilmoqda..."
-pip3.10 install --user python-telegram-bot==21.7 python-dotenv==1.0.0 flask==3.0.0
+pip3.10 install --user python-telegram-bot==21.7 python-dotenv==1.0.0 aiohttp==3.10.10
 
 # 2. Database yaratish
 echo "🗄️ Database yaratilmoqda..."
 python3.10 db.py
 
-# 3. Webhook o'rnatish (tokenni o'zingizniki bilan almashtiring)
-echo "🔗 Webhook o'rnatilmoqda..."
-BOT_TOKEN="8327938988:AAFN5p-C1_x4XPJ3gaBPu5xboqF33NZ0hAw"
-USERNAME="yourusername"  # O'zingizning PythonAnywhere username
+# 3. Savollar banklarini tekshirish va questions.bin ga kompilyatsiya qilish
+echo "📚 questions.bin yaratilmoqda..."
+python3.10 compile_questions.py
 
-curl "https://api.telegram.org/bot${BOT_TOKEN}/setWebhook?url=https://${USERNAME}.pythonanywhere.com/webhook"
+# 4. Webhook sozlamalari (setWebhook'ni bot o'zi ishga tushganda chaqiradi)
+USERNAME="yourusername"  # O'zingizning PythonAnywhere username
+echo "🔗 .env ga webhook sozlamalari yozilmoqda..."
+cat >> .env <<EOF
+BOT_MODE=webhook
+WEBHOOK_URL=https://${USERNAME}.pythonanywhere.com
+EOF
 
-echo "✅ Setup tugallandi! Web app ni reload qiling."
+echo "✅ Setup tugallandi! Botni ishga tushiring: python3.10 bot_new.py"
 echo "🤖 Bot manzili: https://${USERNAME}.pythonanywhere.com"
\ No newline at end of file
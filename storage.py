@@ -0,0 +1,83 @@
+"""db.py funksiyalarining async ko'rinishi.
+
+Har bir so'rov alohida thread pool'da bajariladi, shuning uchun async
+handlerlar `await storage.get_stats_summary()` kabi chaqiradi va event loop
+SQLite I/O paytida bloklanmaydi.
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+import db
+
+STORAGE_WORKERS = int(os.getenv('STORAGE_WORKERS', 4))
+
+_executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=STORAGE_WORKERS, thread_name_prefix='storage')
+    return _executor
+
+
+async def run(func: Callable, *args, **kwargs) -> Any:
+    """Ixtiyoriy sinxron funksiyani storage executor'ida bajarish"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def init_db():
+    return await run(db.init_db)
+
+
+async def load_questions_from_json(path: str, subject: str) -> int:
+    return await run(db.load_questions_from_json, path, subject)
+
+
+async def get_random_questions(subject: str, n: int) -> List[Dict[str, Any]]:
+    return await run(db.get_random_questions, subject, n)
+
+
+async def get_all_questions(subject: str) -> List[Dict[str, Any]]:
+    return await run(db.get_all_questions, subject)
+
+
+async def count_questions(subject: str) -> int:
+    return await run(db.count_questions, subject)
+
+
+async def log_activity(user_id: int, username: str, first_name: str, activity: str, subject: str = None,
+                       timestamp: str = None):
+    return await run(db.log_activity, user_id, username, first_name, activity, subject, timestamp)
+
+
+async def log_activities(rows: List[tuple]):
+    return await run(db.log_activities, rows)
+
+
+async def get_stats_summary():
+    return await run(db.get_stats_summary)
+
+
+async def get_all_users():
+    return await run(db.get_all_users)
+
+
+async def set_user_language(user_id: int, language: str):
+    return await run(db.set_user_language, user_id, language)
+
+
+async def get_user_language(user_id: int):
+    return await run(db.get_user_language, user_id)
+
+
+def shutdown():
+    """Executor'ni to'xtatish (navbatdagi so'rovlar bajarilib bo'lgach)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -0,0 +1,166 @@
+"""Webhook rejimi va health endpoint uchun ichki aiohttp server.
+
+BOT_MODE=webhook bo'lsa Telegram update'larni POST qiladi: so'rov secret
+token bo'yicha tekshiriladi va darhol `application.update_queue`ga qo'yiladi.
+/healthz ikkala rejimda ham ishlaydi (load balancer va Docker uchun).
+
+To'xtashda server avval "draining" holatiga o'tadi: yangi update'larga va
+/healthz'ga 503 qaytaradi (Telegram keyinroq qayta yuboradi, balanser boshqa
+nusxaga yo'naltiradi), navbatdagi update'lar qayta ishlanib bo'lgach to'xtaydi.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import signal
+from typing import Optional
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+PORT = int(os.getenv('PORT', 8080))
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+# Tashqi manzil (masalan https://bot.example.com); bo'sh bo'lsa setWebhook chaqirilmaydi
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 40))
+# To'xtashda navbatdagi update'larni kutish chegarasi (soniya)
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv('WEBHOOK_DRAIN_TIMEOUT', 10))
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def default_secret(token: str) -> str:
+    """Token'dan barqaror secret (barcha nusxalarda bir xil bo'ladi)"""
+    return hashlib.sha256(f"webhook:{token}".encode()).hexdigest()
+
+
+class BotServer:
+    """Webhook qabul qiluvchi, /healthz va /metrics endpointli HTTP server"""
+
+    def __init__(self, application: Application, webhook: bool, secret: Optional[str] = None,
+                 host: str = WEBHOOK_LISTEN, port: int = PORT, path: str = WEBHOOK_PATH):
+        self.application = application
+        self.webhook = webhook
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self.path = path
+        self.draining = False
+        self.app = web.Application()
+        self.app.router.add_get('/healthz', self.handle_health)
+        if metrics.ENABLED:
+            self.app.router.add_get('/metrics', self.handle_metrics)
+        if webhook:
+            self.app.router.add_post(path, self.handle_update)
+        self._runner: Optional[web.AppRunner] = None
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if self.secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), self.secret):
+            return web.Response(status=403)
+        if self.draining:
+            # Telegram 2xx bo'lmagan javobdan keyin update'ni qayta yuboradi
+            return web.Response(status=503)
+        try:
+            data = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return web.Response(status=400)
+        # To'g'ri JSON, lekin update emas ([] yoki 1) - 5xx bo'lsa Telegram qayta-qayta yuboradi
+        if not isinstance(data, dict) or not isinstance(data.get('update_id'), int):
+            return web.Response(status=400)
+        try:
+            update = Update.de_json(data, self.application.bot)
+        except (TypeError, ValueError, KeyError) as e:
+            logger.warning(f"Update'ni o'qib bo'lmadi: {e}")
+            return web.Response(status=400)
+        await self.application.update_queue.put(update)
+        return web.Response()
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        status = 'draining' if self.draining else 'ok'
+        return web.json_response({
+            'status': status,
+            'mode': 'webhook' if self.webhook else 'polling',
+            'pending_updates': self.application.update_queue.qsize()
+        }, status=503 if self.draining else 200)
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=metrics.render().encode('utf-8'), headers={'Content-Type': metrics.CONTENT_TYPE})
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"HTTP server {self.host}:{self.port} da ishga tushdi")
+
+    async def drain(self, timeout: float = WEBHOOK_DRAIN_TIMEOUT):
+        """Yangi update qabul qilishni to'xtatib, navbat bo'shashini kutish"""
+        self.draining = True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.application.update_queue.qsize() and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def serve_webhook(application: Application, server: BotServer):
+    """Application'ni webhook rejimida ishga tushirib, signalgacha kutish
+
+    Server o'zi post_init/post_shutdown ichida ishga tushiriladi va to'xtatiladi
+    (polling rejimida ham /healthz uchun xuddi shunday).
+    """
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows'da signal handler yo'q - Ctrl+C KeyboardInterrupt bilan to'xtatadi
+            pass
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    try:
+        if WEBHOOK_URL:
+            await application.bot.set_webhook(
+                url=WEBHOOK_URL.rstrip('/') + server.path,
+                secret_token=server.secret,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=WEBHOOK_MAX_CONNECTIONS
+            )
+            logger.info(f"Webhook o'rnatildi: {WEBHOOK_URL.rstrip('/')}{server.path}")
+        else:
+            logger.warning("WEBHOOK_URL berilmagan - setWebhook chaqirilmadi")
+        await stop_event.wait()
+    finally:
+        # Avval yangi update'larni to'xtatish, keyin navbatdagilarni tugatish.
+        # Webhook o'chirilmaydi: boshqa nusxalar ishlashda davom etishi mumkin.
+        await server.drain()
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def run_webhook(application: Application, server: BotServer):
+    try:
+        asyncio.run(serve_webhook(application, server))
+    except KeyboardInterrupt:
+        pass